@@ -0,0 +1,136 @@
+import os
+import json
+import shutil
+import hashlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# ioctl asking Linux to share the extents of one file with another (cp --reflink)
+_FICLONE = 0x40049409
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Returns the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(src, dst):
+    """Clones src into a new file dst sharing its blocks; raises OSError where unsupported"""
+    if fcntl is None:
+        raise OSError("reflink not supported")
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.unlink(dst)
+            raise
+
+
+def link_file(src, dst):
+    """Makes dst a hard link to src, else a reflink, else a copy, replacing dst in one rename."""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    for share in (os.link, _reflink, shutil.copyfile):
+        try:
+            share(src, tmp)
+            break
+        except OSError:
+            if share is shutil.copyfile:
+                raise
+    os.replace(tmp, dst)
+
+
+def list_files(output_folder, paths):
+    """Expands output paths relative to output_folder into the relative paths of the files they hold"""
+    files = []
+    for path in paths:
+        full = os.path.join(output_folder, path)
+        if os.path.isfile(full):
+            files.append(path)
+        elif os.path.isdir(full):
+            for root, _, names in os.walk(full):
+                files += sorted(os.path.relpath(os.path.join(root, name), output_folder) for name in names)
+    return files
+
+
+def clear_outputs(output_folder, paths):
+    """Removes every file below a stage's output paths before it runs again.
+
+    A rerun then leaves no stale files, e.g. the STLs of turbines no longer
+    in the case or the .stl of a case now written as .stl.gz, and never
+    writes into an object linked from a store.
+    """
+    for path in list_files(output_folder, paths):
+        os.unlink(os.path.join(output_folder, path))
+
+
+class ArtifactStore:
+    """Content-addressed store of generated files shared by the cases of a sweep.
+
+    objects/<sha256> holds each distinct file once; stages/<key>.json
+    maps a stage key (see pipeline.stage_key) to the relative paths and
+    hashes of the files that stage wrote. Case files are hard links into
+    objects/, or reflinks or copies where the file system cannot link, so
+    they share the object's data: anything that changes a case file must
+    write a new file and rename it over the link, as case_output and
+    foam_parser.patch_file do, never write into it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.stages = os.path.join(root, "stages")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.stages, exist_ok=True)
+
+    def _record(self, key):
+        return os.path.join(self.stages, f"{key}.json")
+
+    def materialize(self, key, output_folder):
+        """Links the files stored for a stage key into output_folder; returns False if the key is not stored."""
+        try:
+            with open(self._record(key), "r") as f:
+                files = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        objects = {path: os.path.join(self.objects, sha) for path, sha in files.items()}
+        if not all(os.path.isfile(obj) for obj in objects.values()):
+            return False
+        for path, obj in objects.items():
+            link_file(obj, os.path.join(output_folder, path))
+        return True
+
+    def ingest(self, key, output_folder, paths):
+        """Stores the files a stage wrote under output paths, replacing each by a link to its shared object."""
+        files = {}
+        for path in list_files(output_folder, paths):
+            full = os.path.join(output_folder, path)
+            sha = file_sha256(full)
+            obj = os.path.join(self.objects, sha)
+            if not os.path.exists(obj):
+                try:
+                    # The case file becomes the object; another process may store it first
+                    os.link(full, obj)
+                except FileExistsError:
+                    pass
+                except OSError:
+                    # No hard links here: keep a copy as the object
+                    link_file(full, obj)
+            if not os.path.samefile(full, obj):
+                link_file(obj, full)
+            files[path] = sha
+
+        record = self._record(key)
+        with open(f"{record}.{os.getpid()}.tmp", "w") as f:
+            json.dump(files, f, indent=1, sort_keys=True)
+        os.replace(f"{record}.{os.getpid()}.tmp", record)
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import load_runner
+
+
+def get_options():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time the per-turbine dictionary writers against the number of turbines.")
+    parser.add_argument("--nturb", type=int, nargs="+", default=[100, 1000, 10000, 50000], help="Turbine counts to time.")
+    return parser.parse_args()
+
+
+def writers():
+    """Returns (name, function(nturb, output_folder)) for the streamed dictionaries."""
+    snappy = load_runner("generate_snappyhexmeshdict")
+    bc = load_runner("generate_bc")
+    createpatch = load_runner("generate_createpatchdict")
+    return [
+        ("snappyHexMeshDict", lambda nturb, folder: snappy.generate_snappy_hex_mesh_dict(nturb, 0.0, 6.5, 1.46, folder)),
+        ("U", lambda nturb, folder: bc.generate_U(nturb, folder, 1.94)),
+        ("createPatchDict", lambda nturb, folder: createpatch.generate_createpatchdict(nturb, folder)),
+    ]
+
+
+def main():
+    args = get_options()
+    output_folder = tempfile.mkdtemp(prefix="bench_dict_writers_")
+    try:
+        print(f"{'dictionary':>18} {'nturb':>6} {'time [s]':>10} {'per turbine [us]':>17} {'peak [MB]':>10} {'file [MB]':>10}")
+        for name, write in writers():
+            for nturb in args.nturb:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    write(nturb, output_folder)
+                    elapsed = time.perf_counter() - start
+
+                    tracemalloc.start()
+                    write(nturb, output_folder)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(output_folder) for f in files)
+                print(f"{name:>18} {nturb:>6} {elapsed:>10.3f} {1e6 * elapsed / nturb:>17.2f} {peak / 1e6:>10.2f} {size / 1e6:>10.1f}")
+                shutil.rmtree(output_folder)
+                os.makedirs(output_folder)
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import STAGES, normalize_case, run_pipeline
+from foam_parser import case_files, parse, read_foam_text
+
+
+def get_options():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time foam_parser on every generated dictionary; tests/test_foam_parser.py checks the round-trips.")
+    parser.add_argument("--nturb", type=int, nargs="+", default=[1, 3, 1000], help="Turbine counts of the generated cases.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed parses per file; the fastest counts.")
+    return parser.parse_args()
+
+
+def make_case(output_folder, nturb):
+    """Returns the runner_all.py parameters of a dictionaries-only case."""
+    return normalize_case(dict(
+        output_folder=output_folder, nturb=nturb, dx=0, dy=6.5, diameter=1.46, max_cells=135,
+        n_subdomains=570, rps=13.3, vel=1.94, p=0, omega=0.1, k=0.06, nut=0,
+        stl_format="ascii", jobs=1, compress_level=0, merge_refinement=False,
+        decimate_cell_size=0, fit_tolerance=0, feature_angle=0,
+    ))
+
+
+def main():
+    args = get_options()
+    work_dir = tempfile.mkdtemp(prefix="bench_foam_parser_")
+    stages = [stage.name for stage in STAGES if stage.name != "prepare_geometry"]
+    try:
+        print(f"{'file':>38} {'nturb':>6} {'size [MB]':>10} {'parse [s]':>10} {'MB/s':>8}")
+        for nturb in args.nturb:
+            folder = os.path.join(work_dir, f"case_{nturb}")
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                run_pipeline(make_case(folder, nturb), stages=stages)
+
+            for name in case_files(folder):
+                text = read_foam_text(os.path.join(folder, name))
+                times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    parse(text)
+                    times.append(time.perf_counter() - start)
+                size = len(text) / 1e6
+                print(f"{name:>38} {nturb:>6} {size:>10.2f} {min(times):>10.4f} {size / min(times):>8.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
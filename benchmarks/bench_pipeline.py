@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import run_pipeline
+from runner_all import run_isolated
+
+
+def get_options():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time per-case generation in-process against one python subprocess per generator.")
+    parser.add_argument("--cases", type=int, default=50, help="Number of cases generated in-process.")
+    parser.add_argument("--isolated_cases", type=int, default=3, help="Number of cases generated through subprocesses.")
+    parser.add_argument("--nturb", type=int, default=2, help="Number of turbines.")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent in-process stages.")
+    return parser.parse_args()
+
+
+def make_case(output_folder, nturb):
+    """Returns the runner_all.py parameters for one case."""
+    return dict(
+        output_folder=output_folder, nturb=nturb, dx=0, dy=6.5, diameter=1.46, max_cells=135,
+        n_subdomains=570, rps=13.3, vel=1.94, p=0, omega=0.1, k=0.06, nut=0,
+        stl_format="ascii", jobs=1, compress_level=0, merge_refinement=False,
+        decimate_cell_size=0, fit_tolerance=0, feature_angle=0,
+    )
+
+
+def time_cases(run, n_cases, nturb):
+    """Returns the mean wall time of run(case) over n_cases fresh case folders.
+
+    Runs in an empty folder, so prepare_geometry finds no STLs and the time is
+    the dictionary generation plus the cost of starting the generators.
+    Output, including that of subprocesses, is silenced.
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    cwd = os.getcwd()
+    sys.stdout.flush()
+    saved_stdout = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.chdir(work_dir)
+        os.dup2(devnull, 1)
+        start = time.perf_counter()
+        for i in range(n_cases):
+            run(make_case(f"case_{i}", nturb))
+        sys.stdout.flush()
+        return (time.perf_counter() - start) / n_cases
+    finally:
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
+        os.close(devnull)
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    args = get_options()
+
+    # Warm-up: the first in-process case pays for importing the generators
+    in_process_run = lambda case: run_pipeline(case, workers=args.workers)
+    time_cases(in_process_run, 1, args.nturb)
+
+    in_process = time_cases(in_process_run, args.cases, args.nturb)
+    isolated = time_cases(run_isolated, args.isolated_cases, args.nturb)
+
+    print(f"{'mode':>12} {'cases':>6} {'per case [ms]':>14}")
+    print(f"{'in-process':>12} {args.cases:>6} {1000 * in_process:>14.1f}")
+    print(f"{'isolated':>12} {args.isolated_cases:>6} {1000 * isolated:>14.1f}")
+    print(f"speedup: {isolated / in_process:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import load_runner
+
+
+def get_options():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time prepare_geometry.copy_stls against the number of turbines.")
+    parser.add_argument("--stl_folder", type=str, default="Geometry", help="Path to folder containing the base STL files.")
+    parser.add_argument("--nturb", type=int, nargs="+", default=[1, 2, 5, 10, 25, 50], help="Turbine counts to time.")
+    parser.add_argument("--dx", type=float, default=0, help="Downstream spacing as a multiple of turbine diameter.")
+    parser.add_argument("--dy", type=float, default=6.5, help="Crosswind spacing as a multiple of turbine diameter.")
+    parser.add_argument("--diameter", type=float, default=1.46, help="Turbine diameter (in meters).")
+    parser.add_argument("--stl_format", type=str, choices=["ascii", "binary"], default="ascii", help="Format of the written STL files.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes writing turbine copies.")
+    return parser.parse_args()
+
+
+def main():
+    args = get_options()
+    prepare_geometry = load_runner("prepare_geometry")
+
+    print(f"{'nturb':>6} {'time [s]':>10} {'per turbine [ms]':>17} {'output [MB]':>12}")
+    for nturb in args.nturb:
+        output_folder = tempfile.mkdtemp(prefix="bench_geometry_") + "/"
+        try:
+            start = time.perf_counter()
+            prepare_geometry.copy_stls(
+                stl_folder=args.stl_folder,
+                output_folder=output_folder,
+                nturb=nturb,
+                dx=args.dx,
+                dy=args.dy,
+                diameter=args.diameter,
+                stl_format=args.stl_format,
+                jobs=args.jobs,
+            )
+            elapsed = time.perf_counter() - start
+
+            size = 0
+            for root, _, files in os.walk(output_folder):
+                size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        finally:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+        print(f"{nturb:>6} {elapsed:>10.3f} {1000 * elapsed / nturb:>17.1f} {size / 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import STAGES, load_runner, normalize_case, run_pipeline
+
+load_runner("prepare_geometry")
+from stl_io import Surface, facet_normals, write_stl
+
+
+BASE_STLS = [
+    "BladesAndHub",
+    "AMI",
+    "AMI_Refinement",
+    "AMI_Refinement_Additional",
+    "BladeWakeRefinement",
+    "Features",
+    "HubRefinement",
+    "LeadingEdge",
+    "TipTrailingEdge",
+]
+
+
+def get_options():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Time every generator stage and the full pipeline across farm sizes against a baseline.")
+    parser.add_argument("--nturb", type=int, nargs="+", default=[1, 10, 100, 1000], help="Turbine counts to run.")
+    parser.add_argument("--facets", type=int, default=200, help="Approximate number of facets of each synthetic base STL.")
+    parser.add_argument("--stl_format", type=str, choices=["ascii", "binary"], default="binary", help="Format of the written STL files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the fastest counts.")
+    parser.add_argument("--baseline", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"),
+                        help="Baseline results to compare against.")
+    parser.add_argument("--save_baseline", action="store_true", help="Store this run's results as the baseline instead of comparing.")
+    parser.add_argument("--time_threshold", type=float, default=0.25, help="Allowed relative slow-down against the baseline.")
+    parser.add_argument("--memory_threshold", type=float, default=0.25, help="Allowed relative growth of peak memory against the baseline.")
+    parser.add_argument("--min_time", type=float, default=0.02, help="Absolute slack in seconds, so millisecond stages do not fail on noise.")
+    return parser.parse_args()
+
+
+def synthetic_surface(n_facets, name, radius=1.0):
+    """Returns a closed, outward-oriented UV sphere with about n_facets facets as a one-solid Surface."""
+    rings = max(3, int(round(np.sqrt(n_facets / 4.0))))
+    segments = 2 * rings
+
+    theta = np.linspace(0, np.pi, rings + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    ring_points = radius * np.stack((np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)), axis=-1).reshape(-1, 3)
+    points = np.vstack(([0, 0, radius], ring_points, [0, 0, -radius]))
+    south = len(points) - 1
+
+    def ring(i, j):
+        return 1 + i * segments + j % segments
+
+    j = np.arange(segments)
+    facets = [np.stack((np.zeros(segments, dtype=np.int64), ring(0, j), ring(0, j + 1)), axis=1)]
+    for i in range(rings - 2):
+        facets.append(np.stack((ring(i, j), ring(i + 1, j), ring(i + 1, j + 1)), axis=1))
+        facets.append(np.stack((ring(i, j), ring(i + 1, j + 1), ring(i, j + 1)), axis=1))
+    facets.append(np.stack((ring(rings - 2, j), np.full(segments, south), ring(rings - 2, j + 1)), axis=1))
+    facets = np.concatenate(facets).astype(np.int64)
+
+    return Surface(points, facets, facet_normals(points, facets), [(name, 0, len(facets))])
+
+
+def write_geometry(stl_folder, n_facets):
+    """Writes one synthetic ASCII STL per base surface into stl_folder."""
+    os.makedirs(stl_folder, exist_ok=True)
+    for stem in BASE_STLS:
+        write_stl(synthetic_surface(n_facets, stem), os.path.join(stl_folder, f"{stem}.stl"))
+
+
+def make_case(work_dir, nturb, stl_format):
+    """Returns the runner_all.py parameters of the benchmark case."""
+    return normalize_case(dict(
+        output_folder=os.path.join(work_dir, "case"), stl_folder=os.path.join(work_dir, "Geometry"),
+        cache_dir=os.path.join(work_dir, "cache"), nturb=nturb, dx=0, dy=6.5, diameter=1.46,
+        max_cells=135, n_subdomains=570, rps=13.3, vel=1.94, p=0, omega=0.1, k=0.06, nut=0,
+        stl_format=stl_format, jobs=1, compress_level=0, merge_refinement=False,
+        decimate_cell_size=0, fit_tolerance=0, feature_angle=0,
+    ))
+
+
+def bench(run, repeat):
+    """Returns the fastest wall time of run() over repeat calls and its peak traced memory in MB."""
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        # A separate traced call, so tracemalloc's overhead stays out of the times
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"time_s": round(min(times), 6), "peak_mb": round(peak / 1024 ** 2, 3)}
+
+
+def run_suite(args, work_dir):
+    """Returns {"<stage>@<nturb>": {"time_s", "peak_mb"}} for every stage and the full pipeline."""
+    write_geometry(os.path.join(work_dir, "Geometry"), args.facets)
+    results = {}
+    for nturb in args.nturb:
+        case = make_case(work_dir, nturb, args.stl_format)
+        shutil.rmtree(case["output_folder"], ignore_errors=True)
+        os.makedirs(case["output_folder"])
+
+        for stage in STAGES:
+            results[f"{stage.name}@{nturb}"] = bench(lambda: stage.run(case), args.repeat)
+            print(f"{stage.name:>20} {nturb:>6} {results[f'{stage.name}@{nturb}']['time_s']:>10.4f}")
+
+        results[f"pipeline@{nturb}"] = bench(lambda: run_pipeline(case), args.repeat)
+        print(f"{'pipeline':>20} {nturb:>6} {results[f'pipeline@{nturb}']['time_s']:>10.4f}")
+    return results
+
+
+def compare(results, baseline, args):
+    """Returns a message per benchmark exceeding its baseline time or memory by more than the thresholds."""
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        allowed_time = reference["time_s"] * (1 + args.time_threshold) + args.min_time
+        if result["time_s"] > allowed_time:
+            failures.append(f"{name}: {result['time_s']:.4f}s against baseline {reference['time_s']:.4f}s")
+        allowed_memory = reference["peak_mb"] * (1 + args.memory_threshold) + 1.0
+        if result["peak_mb"] > allowed_memory:
+            failures.append(f"{name}: {result['peak_mb']:.1f}MB against baseline {reference['peak_mb']:.1f}MB")
+    return failures
+
+
+def main():
+    args = get_options()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(f"no baseline at {args.baseline}, record one with --save_baseline")
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        print(f"{'stage':>20} {'nturb':>6} {'time [s]':>10}")
+        results = run_suite(args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"(I) baseline written to: {args.baseline}")
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    failures = compare(results, baseline, args)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(f"{len(failures)} benchmarks exceeded the baseline in {args.baseline}")
+    print(f"(I) all {len(results)} benchmarks within the thresholds of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
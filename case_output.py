@@ -0,0 +1,208 @@
+import io
+import os
+import time
+import tarfile
+import threading
+import contextlib
+
+
+class DirectoryOutput:
+    """Writes files under root on disk, each under a temporary name renamed into place.
+
+    The rename replaces an existing file instead of writing into it, so a
+    case file hard-linked from an ArtifactStore is unlinked, not changed.
+    """
+
+    def __init__(self, root=""):
+        self.root = root
+
+    def write(self, path, blocks, binary=False, buffer_size=1 << 16):
+        """Writes the text (bytes with binary) blocks as the file path relative to root."""
+        output_file = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        tmp_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, "wb" if binary else "w", buffering=buffer_size) as f:
+                for block in blocks:
+                    f.write(block)
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def read(self, path):
+        with open(os.path.join(self.root, path), "rb") as f:
+            return f.read()
+
+    def sizes(self, paths):
+        """Returns the size of every file at or below the relative paths, by path."""
+        sizes = {}
+        for path in paths:
+            full = os.path.join(self.root, path)
+            if os.path.isfile(full):
+                sizes[path] = os.path.getsize(full)
+            elif os.path.isdir(full):
+                for root, _, names in os.walk(full):
+                    for name in sorted(names):
+                        file = os.path.join(root, name)
+                        sizes[os.path.join(path, os.path.relpath(file, full))] = os.path.getsize(file)
+        return sizes
+
+    def close(self):
+        pass
+
+
+class MemoryOutput:
+    """Keeps every written file in files, a dict of relative path to bytes; nothing touches the disk."""
+
+    def __init__(self):
+        self.files = {}
+
+    def write(self, path, blocks, binary=False, buffer_size=0):
+        data = b"".join(blocks) if binary else "".join(blocks).encode()
+        self.files[path.replace(os.sep, "/")] = data
+
+    def read(self, path):
+        return self.files[path.replace(os.sep, "/")]
+
+    def sizes(self, paths):
+        return _sizes_below(((path, len(data)) for path, data in self.files.items()), paths)
+
+    def close(self):
+        pass
+
+
+class TarOutput:
+    """Streams every written file into a tar archive as it is produced.
+
+    target is a file name or a writable binary stream such as
+    sys.stdout.buffer; with a name the compression follows its suffix:
+    .tar, .tar.gz/.tgz, .tar.xz or .tar.zst (the latter needs the zstandard
+    package). Members are stored under prefix/, typically the case folder's
+    name. A member's size must be known before it is written, so each file is
+    held in memory until it is complete, but never the whole case. Members up
+    to keep_bytes stay readable for later stages, e.g. searchablePrimitives.json.
+    """
+
+    def __init__(self, target, prefix="", compression=None, keep_bytes=1 << 20):
+        if compression is None:
+            compression = self.compression_of(target) if isinstance(target, str) else ""
+        self.prefix = prefix
+        self.keep_bytes = keep_bytes
+        self._kept = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._owned = []
+
+        if compression == "zst":
+            try:
+                import zstandard
+            except ImportError:
+                raise Exception("ERROR: writing .tar.zst archives needs the zstandard package (pip install zstandard)")
+
+        stream = open(target, "wb") if isinstance(target, str) else target
+        if isinstance(target, str):
+            self._owned.append(stream)
+        if compression == "zst":
+            stream = zstandard.ZstdCompressor().stream_writer(stream, closefd=False)
+            self._owned.insert(0, stream)
+            compression = ""
+        self._tar = tarfile.open(fileobj=stream, mode=f"w|{compression}")
+
+    @staticmethod
+    def compression_of(name):
+        """Returns the tarfile compression of an archive name: "", "gz", "xz" or "zst"."""
+        for suffixes, compression in (((".tar.gz", ".tgz"), "gz"), ((".tar.xz", ".txz"), "xz"), ((".tar.zst", ".tzst"), "zst")):
+            if name.endswith(suffixes):
+                return compression
+        if name.endswith(".tar") or name == "-":
+            return ""
+        raise Exception(f"ERROR: unknown archive type of {name}, expected .tar, .tar.gz, .tar.xz or .tar.zst")
+
+    def write(self, path, blocks, binary=False, buffer_size=0):
+        data = b"".join(blocks) if binary else "".join(blocks).encode()
+        path = path.replace(os.sep, "/")
+        info = tarfile.TarInfo(f"{self.prefix}/{path}" if self.prefix else path)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+            self._sizes[path] = len(data)
+            if len(data) <= self.keep_bytes:
+                self._kept[path] = data
+
+    def read(self, path):
+        return self._kept[path.replace(os.sep, "/")]
+
+    def sizes(self, paths):
+        with self._lock:
+            return _sizes_below(list(self._sizes.items()), paths)
+
+    def close(self):
+        """Finishes the archive; the target stream is closed only if it was opened here."""
+        with self._lock:
+            self._tar.close()
+            for stream in self._owned:
+                stream.close()
+            self._owned = []
+
+
+def _sizes_below(sizes, paths):
+    """Returns the (path, size) pairs of files written at or below any of the relative paths, as a dict"""
+    prefixes = [os.path.normpath(path).replace(os.sep, "/") for path in paths]
+    return {path: size for path, size in sizes
+            if any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)}
+
+
+_DISK = DirectoryOutput()
+_outputs = {}
+_outputs_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def output_to(output_folder, backend):
+    """Routes every file written under output_folder to backend while the context is active."""
+    root = os.path.abspath(output_folder)
+    with _outputs_lock:
+        if root in _outputs:
+            raise Exception(f"ERROR: {output_folder} already has an output backend")
+        _outputs[root] = backend
+    try:
+        yield backend
+    finally:
+        with _outputs_lock:
+            del _outputs[root]
+
+
+def resolve(path):
+    """Returns the backend of a file path and the path relative to it; unrouted paths go to disk as given."""
+    if _outputs:
+        full = os.path.abspath(path)
+        for root, backend in list(_outputs.items()):
+            if full.startswith(root + os.sep):
+                return backend, os.path.relpath(full, root)
+    return _DISK, path
+
+
+def on_disk(path):
+    """Returns True when files written under path go to the disk."""
+    return isinstance(resolve(os.path.join(path, "_"))[0], DirectoryOutput)
+
+
+def output_sizes(output_folder, paths):
+    """Returns the sizes of the files written at or below paths relative to output_folder.
+
+    The files are looked up in output_folder's backend, so a case kept in
+    memory or streamed into an archive reports what was written to it.
+    """
+    backend, relative = resolve(os.path.join(output_folder, "_"))
+    folder = os.path.dirname(relative)
+    return backend.sizes([os.path.join(folder, path) for path in paths])
+
+
+def read_output(path):
+    """Returns the bytes of a file written earlier in the case, from whichever backend holds it."""
+    backend, relative = resolve(path)
+    return backend.read(relative)
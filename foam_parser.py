@@ -0,0 +1,446 @@
+import os
+import re
+import argparse
+
+from foam_writer import Dimensions, FoamDict, FoamList, NonUniform, Tokens, Uniform, format_value, write_blocks
+
+
+def _word_pattern(depth=6):
+    """A word: no whitespace or punctuation, but balanced parentheses inside, e.g. div((nuEff*dev2(T(grad(U)))))"""
+    inner = r'[^\s(){}\[\];"]'
+    paren = r"\(" + inner + r"*\)"
+    for _ in range(depth - 1):
+        paren = r"\((?:" + inner + "|" + paren + r")*\)"
+    return r'[^\s(){}\[\];"/](?:' + inner + "|" + paren + ")*"
+
+
+# Whitespace and comments; a line comment always runs to the end of its line
+_SKIP = r"(?:\s+|//[^\n]*(?![^\n])|/\*.*?\*/)*"
+
+# One token per match after the whitespace and comments before it: a string, a punctuation
+# character or a word; any other character becomes a token of its own, which the parser rejects.
+# The empty token at the end keeps trailing comments from being split by backtracking.
+_TOKEN = re.compile(_SKIP + r'("(?:[^"\\]|\\.)*"|[{}()\[\];]|' + _word_pattern() + r"|\S|\Z)", re.S)
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\Z")
+_NONUNIFORM = re.compile(r"nonuniform\s+List<(scalar|vector)>\s*(\d+)\s*\(")
+_BINARY_HEADER = re.compile(r"FoamFile\s*\{[^}]*\bformat\s+binary\s*;")
+_VECTOR_LIST_END = re.compile(r"\)\s*\)")
+_EMPTY_LIST_END = re.compile(r"\s*\)")
+
+_PUNCT = frozenset("{}()[];")
+_NUMBER_START = frozenset("0123456789+-.")
+# First characters of tokens that are not plain words or numbers
+_SPECIAL_START = frozenset('{}()[];"/')
+
+
+class FoamParseError(ValueError):
+    """Raised for text that is not an OpenFOAM dictionary; the message gives the offset."""
+
+
+def _read_nonuniform(text, match, binary):
+    """Returns the NonUniform field of a _NONUNIFORM match and the offset after its closing parenthesis"""
+    import numpy as np
+
+    components = 3 if match.group(1) == "vector" else 1
+    n = int(match.group(2))
+    begin = match.end()
+
+    if binary:
+        end = begin + 8 * components * n
+        if text[end:end + 1] != ")":
+            raise FoamParseError(f"binary list of {n} values at offset {match.start()} is not closed")
+        values = np.frombuffer(text[begin:end].encode("latin-1"), dtype=np.float64)
+        end += 1
+    elif components == 1:
+        end = text.find(")", begin)
+        if end < 0:
+            raise FoamParseError(f"list at offset {match.start()} is not closed")
+        values = np.array(text[begin:end].split(), dtype=np.float64)
+        end += 1
+    else:
+        close = (_VECTOR_LIST_END.search if n else _EMPTY_LIST_END.match)(text, begin)
+        if close is None:
+            raise FoamParseError(f"list at offset {match.start()} is not closed")
+        body = text[begin:close.start() + 1] if n else ""
+        values = np.array(body.replace("(", " ").replace(")", " ").split(), dtype=np.float64)
+        end = close.end()
+
+    if values.size != n * components:
+        raise FoamParseError(f"list at offset {match.start()} holds {values.size // components} values, not {n}")
+    return NonUniform(values.reshape(n, 3) if components == 3 else values), end
+
+
+def _find_nonuniform(text, pos):
+    """Returns the next _NONUNIFORM match from pos, found with str.find so plain dictionaries are scanned once"""
+    while True:
+        pos = text.find("nonuniform", pos)
+        if pos < 0:
+            return None
+        match = _NONUNIFORM.match(text, pos)
+        if match is not None and (pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] == "_")):
+            return match
+        pos += 1
+
+
+def tokenize(text, offsets=False):
+    """Returns the tokens of an OpenFOAM file, and with offsets their (start, end) in the text.
+
+    Tokens are the text of words, strings and punctuation, except that each
+    non-uniform field list, ASCII or binary, is read with numpy into one
+    NonUniform token, so large fields never go through the tokenizer.
+    """
+    binary = _BINARY_HEADER.search(text) is not None
+    tokens, spans = [], []
+    pos = 0
+    while True:
+        match = _find_nonuniform(text, pos)
+        stop = len(text) if match is None else match.start()
+        if offsets:
+            for token in _TOKEN.finditer(text, pos, stop):
+                tokens.append(token.group(1))
+                spans.append(token.span(1))
+        else:
+            tokens += _TOKEN.findall(text, pos, stop)
+        while tokens and tokens[-1] == "":
+            tokens.pop()
+            if offsets:
+                spans.pop()
+        if match is None:
+            return (tokens, spans) if offsets else tokens
+
+        field, pos = _read_nonuniform(text, match, binary)
+        tokens.append(field)
+        spans.append((match.start(), pos))
+
+
+class _Parser:
+    """Recursive-descent parser over a token list.
+
+    With offsets, spans maps the path of every dictionary entry, e.g.
+    ("boundaryField", "inlet", "type"), to the (start, end) offsets of its
+    value in the text, so single values can be patched in place.
+    """
+
+    def __init__(self, tokens, offsets=None):
+        self.tokens = tokens
+        self.tokens.append(None)
+        self.offsets = offsets
+        self.spans = {}
+        self.i = 0
+
+    def error(self, message, i=None):
+        i = self.i if i is None else i
+        where = f" at offset {self.offsets[i][0]}" if self.offsets and i < len(self.offsets) else f" at token {i}"
+        raise FoamParseError(message + where)
+
+    def entries(self, path, closing):
+        """Parses entries up to the closing "}" (None: the end of the text) and returns them
+
+        path is None inside lists, whose dictionaries have no path and so no spans.
+        """
+        tokens = self.tokens
+        entries = []
+        while True:
+            key = tokens[self.i]
+            self.i += 1
+            if key == closing:
+                return entries
+            if key is None:
+                self.error("unexpected end of file, missing '}'")
+            if key.__class__ is not str or key in _PUNCT or key[0] == "/":
+                self.error(f"unexpected {key!r}", self.i - 1)
+
+            entry_path = None if path is None or self.offsets is None else path + (key,)
+            first = self.i
+            if key[0] == "#":
+                # Directives take one argument and no semicolon
+                value = self.item()
+            elif tokens[first] == "{":
+                self.i += 1
+                value = FoamDict(self.entries(entry_path, "}"))
+            else:
+                value = self.value()
+                if entry_path is not None:
+                    # The value's tokens, without the semicolon
+                    self._span(entry_path, first, self.i - 2)
+                entries.append((key, value))
+                continue
+
+            if entry_path is not None:
+                self._span(entry_path, first, self.i - 1)
+            entries.append((key, value))
+
+    def _span(self, path, first, last):
+        if last < first:
+            start = self.offsets[first][0]
+            self.spans[path] = (start, start)
+        else:
+            self.spans[path] = (self.offsets[first][0], self.offsets[last][1])
+
+    def value(self):
+        """Parses the values of an entry up to and including its semicolon"""
+        tokens = self.tokens
+        items = []
+        while tokens[self.i] != ";":
+            if tokens[self.i] is None:
+                self.error("unexpected end of file, missing ';'")
+            items.append(self.item())
+        self.i += 1
+
+        if not items:
+            return None
+        if len(items) == 1:
+            return items[0]
+        if len(items) == 2 and items[0] == "uniform":
+            return Uniform(items[1])
+        return Tokens(items)
+
+    def item(self):
+        """Parses one value: a number, word, string, list, dimensions, anonymous dictionary or non-uniform field"""
+        tokens = self.tokens
+        token = tokens[self.i]
+        self.i += 1
+        if token.__class__ is not str:
+            if token is None:
+                self.error("unexpected end of file")
+            return token
+        first = token[0]
+        if first not in _SPECIAL_START:
+            if first in _NUMBER_START and _NUMBER.match(token):
+                return int(token) if token.lstrip("+-").isdigit() else float(token)
+            return token
+        if token == "(":
+            items = []
+            while tokens[self.i] != ")":
+                if tokens[self.i] is None:
+                    self.error("unexpected end of file, missing ')'")
+                items.append(self.item())
+            self.i += 1
+            return FoamList(items)
+        if token == "[":
+            items = []
+            while tokens[self.i] != "]":
+                if tokens[self.i] is None:
+                    self.error("unexpected end of file, missing ']'")
+                items.append(self.item())
+            self.i += 1
+            return Dimensions(items)
+        if token == "{":
+            return FoamDict(self.entries(None, "}"))
+        if token[0] == '"':
+            if len(token) < 2 or token[-1] != '"':
+                self.error("unterminated string", self.i - 1)
+            return token
+        self.error(f"unexpected {token!r}", self.i - 1)
+
+
+def parse(text, spans=False):
+    """Parses the text of an OpenFOAM dictionary or field into a FoamDict.
+
+    Binary files must be passed decoded as latin-1, as read_foam_text does,
+    so the raw lists keep their bytes. With spans, also returns the value
+    span of every entry path (see _Parser).
+    """
+    if spans:
+        tokens, offsets = tokenize(text, offsets=True)
+        parser = _Parser(tokens, offsets)
+    else:
+        parser = _Parser(tokenize(text))
+    tree = FoamDict(parser.entries((), None))
+    return (tree, parser.spans) if spans else tree
+
+
+def read_foam_text(path):
+    """Returns a file's text decoded byte for byte, so binary lists and offsets survive."""
+    with open(path, "rb") as f:
+        return f.read().decode("latin-1")
+
+
+def read_foam_file(path):
+    """Parses an OpenFOAM file into a FoamDict."""
+    return parse(read_foam_text(path))
+
+
+def split_path(path):
+    """Splits "boundaryField/inlet/type" into its keys; tuples pass through"""
+    return tuple(path.split("/")) if isinstance(path, str) else tuple(path)
+
+
+def lookup(tree, path):
+    """Returns the value at a "/"-separated path of keys; the last of repeated keys wins, as in OpenFOAM."""
+    value = tree
+    for key in split_path(path):
+        if not isinstance(value, FoamDict):
+            raise KeyError(f"{'/'.join(split_path(path))}: {key} is not inside a dictionary")
+        matches = [v for k, v in value.entries if k == key]
+        if not matches:
+            raise KeyError(f"{'/'.join(split_path(path))}: no entry {key}")
+        value = matches[-1]
+    return value
+
+
+def to_plain(value):
+    """Returns a value as nested tuples of numbers and strings, so parsed and generated values compare with ==."""
+    if isinstance(value, FoamDict):
+        return ("{}",) + tuple((key, to_plain(v)) for key, v in value.entries)
+    if isinstance(value, (FoamList, tuple, list)):
+        return ("()",) + tuple(to_plain(v) for v in getattr(value, "items", value))
+    if isinstance(value, Tokens):
+        return tuple(to_plain(v) for v in value.items)
+    if isinstance(value, Dimensions):
+        return ("[]",) + tuple(to_plain(v) for v in value.exponents)
+    if isinstance(value, Uniform):
+        return ("uniform", to_plain(value.value))
+    if isinstance(value, NonUniform):
+        return ("nonuniform", value.values.shape, tuple(value.values.ravel().tolist()))
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _occurrences(entries):
+    """Returns the values of each key, keys in order of first appearance"""
+    grouped = {}
+    for key, value in entries:
+        grouped.setdefault(key, []).append(value)
+    return grouped
+
+
+def diff(a, b, path=()):
+    """Returns (path, a value, b value) for every entry that differs between two parsed dictionaries.
+
+    Dictionaries are compared key by key, everything else as a whole;
+    a value missing on one side is None. Repeated keys, such as several
+    #include lines, are paired in order and named key[n] in the path.
+    """
+    a_entries = _occurrences(a.entries)
+    b_entries = _occurrences(b.entries)
+    changes = []
+    for key in list(a_entries) + [k for k in b_entries if k not in a_entries]:
+        olds, news = a_entries.get(key, []), b_entries.get(key, [])
+        count = max(len(olds), len(news))
+        for n in range(count):
+            name = f"{key}[{n}]" if count > 1 else key
+            missing = n >= len(olds) or n >= len(news)
+            old = olds[n] if n < len(olds) else None
+            new = news[n] if n < len(news) else None
+            if isinstance(old, FoamDict) and isinstance(new, FoamDict):
+                changes += diff(old, new, path + (name,))
+            elif missing or to_plain(old) != to_plain(new):
+                changes.append(("/".join(path + (name,)), old, new))
+    return changes
+
+
+def patch_text(text, updates):
+    """Returns the text with the values at the given paths replaced, every other byte unchanged.
+
+    updates maps "/"-separated paths to new values: text is inserted as is,
+    anything else is written with foam_writer.format_value.
+    """
+    _, spans = parse(text, spans=True)
+    replacements = []
+    for path, value in updates.items():
+        keys = split_path(path)
+        if keys not in spans:
+            raise KeyError(f"{'/'.join(keys)}: no such entry")
+        start, end = spans[keys]
+        if text[start:start + 1] == "{":
+            raise ValueError(f"{'/'.join(keys)} is a dictionary; patch its entries instead")
+        replacements.append((start, end, value if isinstance(value, str) else format_value(value)))
+
+    for start, end, value in sorted(replacements, reverse=True):
+        text = text[:start] + value + text[end:]
+    parse(text)
+    return text
+
+
+def patch_file(path, updates):
+    """Patches values of an OpenFOAM file (see patch_text), replacing it in one rename.
+
+    The rename leaves the old file's data alone, so patching a case file
+    that is a link into an ArtifactStore does not change the stored object.
+    """
+    text = patch_text(read_foam_text(path), updates)
+    write_blocks(path, [text.encode("latin-1")], binary=True)
+
+
+def case_files(case_folder):
+    """Returns the relative paths of the dictionaries and fields of a case"""
+    files = []
+    for sub in ("0", "constant", "system"):
+        folder = os.path.join(case_folder, sub)
+        if os.path.isdir(folder):
+            files += sorted(os.path.join(sub, name) for name in os.listdir(folder)
+                            if os.path.isfile(os.path.join(folder, name)))
+    return files
+
+
+def diff_paths(a, b):
+    """Returns (file, path, a value, b value) differences between two files or two case folders."""
+    if os.path.isfile(a):
+        return [("", *change) for change in diff(read_foam_file(a), read_foam_file(b))]
+
+    a_files, b_files = case_files(a), case_files(b)
+    changes = []
+    for name in a_files + [f for f in b_files if f not in a_files]:
+        if name not in b_files or name not in a_files:
+            changes.append((name, "", "present" if name in a_files else None, "present" if name in b_files else None))
+        else:
+            changes += [(name, *change) for change in diff(read_foam_file(os.path.join(a, name)), read_foam_file(os.path.join(b, name)))]
+    return changes
+
+
+def _show(value):
+    if value is None:
+        return "<missing>"
+    if isinstance(value, FoamDict):
+        return "{...}"
+    if isinstance(value, NonUniform):
+        return f"nonuniform ({len(value.values)} values)"
+    return format_value(value)
+
+
+def get_options():
+    """Parse and return command-line options."""
+    parser = argparse.ArgumentParser(description="Read, compare and patch OpenFOAM dictionaries without regenerating the case.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    get = commands.add_parser("get", help="Print the value at a path, e.g. boundaryField/inlet/type.")
+    get.add_argument("file", type=str, help="OpenFOAM file to read.")
+    get.add_argument("path", type=str, help="'/'-separated keys of the entry.")
+
+    patch = commands.add_parser("set", help="Replace values in place, leaving the rest of the file untouched.")
+    patch.add_argument("file", type=str, help="OpenFOAM file to patch.")
+    patch.add_argument("updates", type=str, nargs="+", help="path=value pairs, the value written as given.")
+
+    compare = commands.add_parser("diff", help="Print the entries that differ between two files or two case folders.")
+    compare.add_argument("a", type=str, help="First file or case folder.")
+    compare.add_argument("b", type=str, help="Second file or case folder.")
+    return parser.parse_args()
+
+
+def main():
+    args = get_options()
+
+    if args.command == "get":
+        print(_show(lookup(read_foam_file(args.file), args.path)))
+
+    elif args.command == "set":
+        updates = {}
+        for update in args.updates:
+            if "=" not in update:
+                raise Exception(f"ERROR: expected path=value, got {update}")
+            path, value = update.split("=", 1)
+            updates[path] = value
+        patch_file(args.file, updates)
+        print(f"(I) {len(updates)} values patched in: {args.file}")
+
+    elif args.command == "diff":
+        changes = diff_paths(args.a, args.b)
+        for name, path, old, new in changes:
+            print(f"{name}{':' if name and path else ''}{path}: {_show(old)} -> {_show(new)}")
+        print(f"(I) {len(changes)} differences")
+
+
+if __name__ == "__main__":
+    main()
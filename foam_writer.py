@@ -0,0 +1,305 @@
+import sys
+from numbers import Integral, Real
+
+from case_output import resolve
+
+
+BANNER = r"""/*--------------------------------*- C++ -*----------------------------------*\
+| =========                 |                                                 |
+| \\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
+|  \\    /   O peration     | Version:  v2312                                 |
+|   \\  /    A nd           | Website:  www.openfoam.com                      |
+|    \\/     M anipulation  |                                                 |
+\*---------------------------------------------------------------------------*/
+"""
+
+SEPARATOR = "// ************************************************************************* //\n"
+
+# What binary lists are written as: labels are never binary here, scalars are float64
+BINARY_ARCH = f"{'LSB' if sys.byteorder == 'little' else 'MSB'};label=32;scalar=64"
+
+
+class FoamDict:
+    """An OpenFOAM dictionary: (keyword, value) entries in order.
+
+    entries may be a generator, e.g. of per-turbine patches, which is consumed
+    while the file is written. key_width pads keywords to a column as
+    OpenFOAM's own files do; 0 separates keyword and value by one space.
+    """
+
+    __slots__ = ("entries", "key_width")
+
+    def __init__(self, entries=(), key_width=0):
+        self.entries = entries
+        self.key_width = key_width
+
+
+class FoamList:
+    """A list, written inline as (a b c); with multiline, or when it holds dictionaries, one item per line."""
+
+    __slots__ = ("items", "multiline")
+
+    def __init__(self, items, multiline=False):
+        self.items = items
+        self.multiline = multiline
+
+
+class Tokens:
+    """Several values of one entry, written separated by spaces, e.g. Gauss linear."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class Dimensions:
+    """Dimension exponents [kg m s K mol A cd]."""
+
+    __slots__ = ("exponents",)
+
+    def __init__(self, exponents):
+        self.exponents = exponents
+
+
+class Uniform:
+    """A uniform field value: a scalar or a vector."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class NonUniform:
+    """A per-cell or per-face field value: n scalars or an (n, 3) array of vectors."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        import numpy as np  # only fields with per-cell values need numpy
+        self.values = np.asarray(values, dtype=np.float64)
+
+
+class Repeat:
+    """Entries (or items of a list holding dictionaries) written once per row, e.g. the entries of every turbine.
+
+    The entries are serialized once, with %(name)s style placeholders in their
+    keys and values (%(name)r for a float), and then filled from each row, a
+    dict of the values differing between rows. Thousands of per-turbine entries
+    then cost one string formatting each. A literal % in the entries is written %%.
+    rows may be a generator; it is consumed while the file is written.
+    """
+
+    __slots__ = ("entries", "rows", "_templates")
+
+    def __init__(self, entries, rows):
+        self.entries = entries
+        self.rows = rows
+        self._templates = {}
+
+    def template(self, pad, key_width, is_list, blank_lines):
+        """Returns the text of the entries at indent pad, placeholders unfilled"""
+        layout = (pad, key_width, is_list, blank_lines)
+        if layout not in self._templates:
+            self._templates[layout] = "".join(_blocks(self.entries, pad, key_width, is_list, blank_lines, "ascii"))
+        return self._templates[layout]
+
+
+def format_value(value):
+    """Returns the ASCII text of a keyword's value."""
+    # The exact built-in types first: the numbers ABCs are slow to check
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type is float:
+        return repr(value)
+    if value_type is int:
+        return str(value)
+    if value_type is bool:
+        return "true" if value else "false"
+    if value_type is tuple or value_type is list or value_type is FoamList:
+        return "(" + " ".join(map(format_value, value if value_type is not FoamList else value.items)) + ")"
+    if value_type is Tokens:
+        return " ".join(map(format_value, value.items))
+    if value_type is Uniform:
+        return "uniform " + format_value(value.value)
+    if value_type is Dimensions:
+        return "[" + " ".join(map(format_value, value.exponents)) + "]"
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Integral):
+        return str(int(value))
+    if isinstance(value, Real):
+        return repr(float(value))
+    if isinstance(value, (tuple, list)):
+        return "(" + " ".join(map(format_value, value)) + ")"
+    raise TypeError(f"cannot write {type(value).__name__} to an OpenFOAM file")
+
+
+def nonuniform_blocks(field, file_format="ascii"):
+    """Yields a NonUniform value: one entry per line in ASCII, the raw native-endian doubles in binary."""
+    values = field.values
+    list_type = "vector" if values.ndim == 2 else "scalar"
+    if file_format == "binary":
+        yield f"nonuniform List<{list_type}> {len(values)}("
+        yield values.tobytes()
+        yield ")"
+        return
+
+    yield f"nonuniform List<{list_type}> \n{len(values)}\n(\n"
+    if list_type == "vector":
+        yield ("(%.9g %.9g %.9g)\n" * len(values)) % tuple(values.ravel().tolist())
+    else:
+        yield ("%.9g\n" * len(values)) % tuple(values.tolist())
+    yield ")\n"
+
+
+def _keyword(key, key_width):
+    """The keyword padded to key_width, then the space before the value"""
+    return key.ljust(key_width - 1) + " " if key_width else key + " "
+
+
+def serialize(foam_dict, file_format="ascii", indent=0, blank_lines=False):
+    """Yields the text (and, in binary, bytes) of a FoamDict's entries, nested dictionaries indented by 4.
+
+    blank_lines separates the entries by an empty line, as at the top level of a field file.
+    Lines are gathered into blocks of about FLUSH_LINES lines, so a generator of
+    thousands of entries is still written a block at a time.
+    """
+    return _blocks(foam_dict.entries, " " * indent, foam_dict.key_width, False, blank_lines, file_format)
+
+
+def _blocks(entries, pad, key_width, is_list, blank_lines, file_format):
+    """Yields the blocks of dictionary entries (or, with is_list, of the items of a list holding dictionaries) at indent pad"""
+    out = []
+    # The dictionaries (and lists of dictionaries) being written, innermost last:
+    # their remaining entries, indent, key width, whether they are a list, blank_lines and closing line
+    stack = [(iter(entries), pad, key_width, is_list, blank_lines, "")]
+    while stack:
+        entries, pad, key_width, is_list, blank, _ = stack[-1]
+        for entry in entries:
+            if type(entry) is Repeat:
+                template = entry.template(pad, key_width, is_list, blank)
+                for row in entry.rows:
+                    out.append(template % row)
+                    if len(out) >= FLUSH_ROWS:
+                        yield "".join(out)
+                        out.clear()
+                continue
+
+            if is_list:
+                if type(entry) is FoamDict:
+                    out.append(f"{pad}{{\n")
+                    stack.append((iter(entry.entries), pad + "    ", entry.key_width, False, False, f"{pad}}}\n"))
+                    break
+                out.append(f"{pad}{format_value(entry)}\n")
+                continue
+
+            key, value = entry
+            value_type = type(value)
+            if value_type is FoamDict:
+                out.append(f"{pad}{key}\n{pad}{{\n")
+                stack.append((iter(value.entries), pad + "    ", value.key_width, False, False,
+                              f"{pad}}}\n\n" if blank else f"{pad}}}\n"))
+                break
+            if value is None:
+                out.append(f"{pad}{key};\n")
+            elif key.startswith("#"):
+                # Directives such as #include "file" take no semicolon
+                out.append(f"{pad}{key} {format_value(value)}\n")
+            elif value_type is FoamList:
+                items = value.items
+                if type(items) is list or type(items) is tuple:
+                    holds_dicts = any(type(item) is FoamDict or type(item) is Repeat for item in items)
+                else:
+                    # A generator of items is told apart by its first item
+                    items = iter(items)
+                    first = next(items, None)
+                    holds_dicts = type(first) is FoamDict or type(first) is Repeat
+                    items = _chain([] if first is None else [first], items)
+                if holds_dicts or value.multiline:
+                    out.append(f"{pad}{key}\n{pad}(\n")
+                    stack.append((iter(items), pad + "    ", 0, True, False,
+                                  f"{pad});\n\n" if blank else f"{pad});\n"))
+                    break
+                out.append(f"{pad}{_keyword(key, key_width)}{format_value(FoamList(items))};\n")
+            elif value_type is NonUniform:
+                out.append(f"{pad}{_keyword(key, key_width)}")
+                if file_format == "binary":
+                    yield "".join(out)
+                    out.clear()
+                    yield from nonuniform_blocks(value, file_format)
+                else:
+                    out.extend(nonuniform_blocks(value, file_format))
+                out.append(";\n")
+            else:
+                out.append(f"{pad}{_keyword(key, key_width)}{format_value(value)};\n")
+            if blank:
+                out.append("\n")
+            if len(out) >= FLUSH_LINES:
+                yield "".join(out)
+                out.clear()
+        else:
+            out.append(stack.pop()[5])
+    if out:
+        yield "".join(out)
+
+
+# Lines, or filled-in Repeat rows of several lines each, serialize gathers before it yields them as one block
+FLUSH_LINES = 512
+FLUSH_ROWS = 64
+
+
+def foam_header(object_name, foam_class="dictionary", file_format="ascii", location=None):
+    """Returns the banner and FoamFile header of an OpenFOAM file, ending with the separator line.
+
+    The format entry is the format the body is written in; binary files also
+    declare the arch their binary lists are written with.
+    """
+    entries = [("version", "2.0"), ("format", file_format)]
+    if file_format == "binary":
+        entries.append(("arch", f'"{BINARY_ARCH}"'))
+    entries.append(("class", foam_class))
+    if location is not None:
+        entries.append(("location", f'"{location}"'))
+    entries.append(("object", object_name))
+
+    header = "".join(serialize(FoamDict([("FoamFile", FoamDict(entries, key_width=12))])))
+    return BANNER + header + SEPARATOR
+
+
+def write_foam_file(output_file, object_name, body, foam_class="dictionary", file_format="ascii", location=None):
+    """Writes a FoamDict body under its header, streaming it block by block.
+
+    The header's format entry always names the format the body is written in.
+    """
+    if file_format not in ("ascii", "binary"):
+        raise ValueError(f"unknown OpenFOAM file format: {file_format}")
+
+    blocks = [foam_header(object_name, foam_class, file_format, location), "\n"]
+    blocks = _chain(blocks, serialize(body, file_format, blank_lines=True), [SEPARATOR])
+    if file_format == "binary":
+        blocks = (block if isinstance(block, bytes) else block.encode() for block in blocks)
+    write_blocks(output_file, blocks, binary=file_format == "binary")
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+def write_blocks(output_file, blocks, buffer_size=1 << 16, binary=False):
+    """Writes an iterable of text blocks (bytes with binary) as output_file.
+
+    Blocks are written as they are produced, so a dictionary with thousands
+    of per-turbine entries is never joined into one string. The file goes to
+    the output backend of its case folder (see case_output): on disk it is
+    written under a temporary name and renamed into place, so readers never
+    see half a dictionary and a file hard-linked elsewhere is replaced, not
+    overwritten.
+    """
+    backend, path = resolve(output_file)
+    backend.write(path, blocks, binary=binary, buffer_size=buffer_size)
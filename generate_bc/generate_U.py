@@ -1,94 +1,42 @@
 import os
+import sys
+import itertools
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Uniform, write_foam_file
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      binary;
-    arch        "LSB;label=32;scalar=64";
-    class       volVectorField;
-    location    "0";
-    object      {dictName};
-}}
-
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_U(nturb, output_folder, vel):
-    """Generates 0 file"""
-
-    bc = get_header_string("U")
-
-    bc += f"""
-dimensions      [0 1 -1 0 0 0 0];
-internalField   uniform (0   {vel}   0);
-
-boundaryField
-{{
-    boundaries
-    {{
-        type symmetry;
-    }}
-    inlet
-    {{
-        type fixedValue;
-        value $internalField;
-    }}
-    outlet
-    {{
-        type inletOutlet;
-        inletValue uniform (0 0 0);
-        value uniform (0 0 0);
-    }}
-
-"""
 
+def turbine_patches_U(nturb, vel):
+    """Yields the boundary conditions of each turbine's blade and AMI patches"""
     for i in range(nturb):
-        bc += f"""
-
-    BladesAndHub_{i}
-    {{
-        type movingWallVelocity;
-        value uniform (0 0 0);
-    }}
-    
-    AMI_turb{i}_1
-    {{
-        type cyclicAMI;
-        value $internalField;
-    }}
-    
-    AMI_turb{i}_2
-    {{
-        type cyclicAMI;
-        value $internalField;
-    }}
-"""
-    bc += """
-}
-"""
+        yield f"BladesAndHub_{i}", FoamDict([("type", "movingWallVelocity"), ("value", Uniform((0, 0, 0)))])
+        yield f"AMI_turb{i}_1", FoamDict([("type", "cyclicAMI"), ("value", "$internalField")])
+        yield f"AMI_turb{i}_2", FoamDict([("type", "cyclicAMI"), ("value", "$internalField")])
+
+
+def generate_U_field(nturb, vel):
+    """Returns the U (velocity) field; the turbine patches are produced while it is written"""
+    boundary = [
+        ("boundaries", FoamDict([("type", "symmetry")])),
+        ("inlet", FoamDict([("type", "fixedValue"), ("value", "$internalField")])),
+        ("outlet", FoamDict([("type", "inletOutlet"), ("inletValue", Uniform((0, 0, 0))), ("value", Uniform((0, 0, 0)))])),
+    ]
+    return FoamDict([
+        ("dimensions", Dimensions([0, 1, -1, 0, 0, 0, 0])),
+        ("internalField", Uniform((0, vel, 0))),
+        ("boundaryField", FoamDict(itertools.chain(boundary, turbine_patches_U(nturb, vel)))),
+    ], key_width=16)
+
+
+def generate_U(nturb, output_folder, vel, file_format="ascii"):
+    """Generates 0 file"""
 
     # Write to file
     output_folder += "/0/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "U")
 
-    with open(output_file, "w") as f:
-        f.write(bc)
+    write_foam_file(output_file, "U", generate_U_field(nturb, vel), foam_class="volVectorField",
+                    file_format=file_format, location="0")
 
     print(f"(I) U created at: {output_file}")
-
-
@@ -1,90 +1,42 @@
 import os
+import sys
+import itertools
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Uniform, write_foam_file
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      binary;
-    arch        "LSB;label=32;scalar=64";
-    class       volScalarField;
-    location    "0";
-    object      {dictName};
-}}
-
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_k(nturb, output_folder, k):
-    """Generates 0 file"""
-
-    bc = get_header_string("k")
-
-    bc += f"""
-dimensions      [0 2 -2 0 0 0 0];
-internalField   uniform {k};
-
-boundaryField
-{{
-    boundaries
-    {{
-        type symmetry;
-    }}
-    inlet
-    {{
-        type fixedValue;
-        value uniform {k};
-    }}
-    outlet
-    {{
-        type inletOutlet;
-        inletValue uniform {k};
-        value uniform {k};
-    }}
-
-"""
 
+def turbine_patches_k(nturb, k):
+    """Yields the boundary conditions of each turbine's blade and AMI patches"""
     for i in range(nturb):
-        bc += f"""
-
-    BladesAndHub_{i}
-    {{
-        type kqRWallFunction;
-        value uniform {k};
-    }}
-    AMI_turb{i}_1
-    {{
-        type cyclicAMI;
-    }}
-    AMI_turb{i}_2
-    {{
-        type cyclicAMI;
-    }}
-"""
-    bc += """
-}
-"""
+        yield f"BladesAndHub_{i}", FoamDict([("type", "kqRWallFunction"), ("value", Uniform(k))])
+        yield f"AMI_turb{i}_1", FoamDict([("type", "cyclicAMI")])
+        yield f"AMI_turb{i}_2", FoamDict([("type", "cyclicAMI")])
+
+
+def generate_k_field(nturb, k):
+    """Returns the k (turbulent kinetic energy) field; the turbine patches are produced while it is written"""
+    boundary = [
+        ("boundaries", FoamDict([("type", "symmetry")])),
+        ("inlet", FoamDict([("type", "fixedValue"), ("value", Uniform(k))])),
+        ("outlet", FoamDict([("type", "inletOutlet"), ("inletValue", Uniform(k)), ("value", Uniform(k))])),
+    ]
+    return FoamDict([
+        ("dimensions", Dimensions([0, 2, -2, 0, 0, 0, 0])),
+        ("internalField", Uniform(k)),
+        ("boundaryField", FoamDict(itertools.chain(boundary, turbine_patches_k(nturb, k)))),
+    ], key_width=16)
+
+
+def generate_k(nturb, output_folder, k, file_format="ascii"):
+    """Generates 0 file"""
 
     # Write to file
     output_folder += "/0/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "k")
 
-    with open(output_file, "w") as f:
-        f.write(bc)
+    write_foam_file(output_file, "k", generate_k_field(nturb, k), foam_class="volScalarField",
+                    file_format=file_format, location="0")
 
     print(f"(I) k created at: {output_file}")
-
-
@@ -1,91 +1,42 @@
 import os
+import sys
+import itertools
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Uniform, write_foam_file
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      binary;
-    arch        "LSB;label=32;scalar=64";
-    class       volScalarField;
-    location    "0";
-    object      {dictName};
-}}
-
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_nut(nturb, output_folder, nut):
-    """Generates 0 file"""
-
-    bc = get_header_string("nut")
-
-    bc += f"""
-dimensions      [0 2 -1 0 0 0 0];
-internalField   uniform {nut};
-
-boundaryField
-{{
-    boundaries
-    {{
-        type symmetry;
-    }}
-    inlet
-    {{
-        type calculated;
-        value uniform {nut};
-    }}
-    outlet
-    {{
-        type calculated;
-        value uniform {nut};
-    }}
-
-"""
 
+def turbine_patches_nut(nturb, nut):
+    """Yields the boundary conditions of each turbine's blade and AMI patches"""
     for i in range(nturb):
-        bc += f"""
-
-    BladesAndHub_{i}
-    {{
-        type nutkWallFunction;
-        value uniform {nut};
-    }}
-    AMI_turb{i}_1
-    {{
-        type cyclicAMI;
-        value uniform {nut};
-    }}
-    AMI_turb{i}_2
-    {{
-        type cyclicAMI;
-        value uniform {nut};
-    }}
-"""
-    bc += """
-}
-"""
+        yield f"BladesAndHub_{i}", FoamDict([("type", "nutkWallFunction"), ("value", Uniform(nut))])
+        yield f"AMI_turb{i}_1", FoamDict([("type", "cyclicAMI"), ("value", Uniform(nut))])
+        yield f"AMI_turb{i}_2", FoamDict([("type", "cyclicAMI"), ("value", Uniform(nut))])
+
+
+def generate_nut_field(nturb, nut):
+    """Returns the nut (turbulent viscosity) field; the turbine patches are produced while it is written"""
+    boundary = [
+        ("boundaries", FoamDict([("type", "symmetry")])),
+        ("inlet", FoamDict([("type", "calculated"), ("value", Uniform(nut))])),
+        ("outlet", FoamDict([("type", "calculated"), ("value", Uniform(nut))])),
+    ]
+    return FoamDict([
+        ("dimensions", Dimensions([0, 2, -1, 0, 0, 0, 0])),
+        ("internalField", Uniform(nut)),
+        ("boundaryField", FoamDict(itertools.chain(boundary, turbine_patches_nut(nturb, nut)))),
+    ], key_width=16)
+
+
+def generate_nut(nturb, output_folder, nut, file_format="ascii"):
+    """Generates 0 file"""
 
     # Write to file
     output_folder += "/0/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "nut")
 
-    with open(output_file, "w") as f:
-        f.write(bc)
+    write_foam_file(output_file, "nut", generate_nut_field(nturb, nut), foam_class="volScalarField",
+                    file_format=file_format, location="0")
 
     print(f"(I) nut created at: {output_file}")
-
-
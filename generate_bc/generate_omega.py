@@ -1,89 +1,42 @@
 import os
+import sys
+import itertools
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Uniform, write_foam_file
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      binary;
-    arch        "LSB;label=32;scalar=64";
-    class       volScalarField;
-    location    "0";
-    object      {dictName};
-}}
-
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_omega(nturb, output_folder, omega):
-    """Generates 0 file"""
-
-    bc = get_header_string("omega")
-
-    bc += f"""
-dimensions      [0 0 -1 0 0 0 0];
-internalField   uniform {omega};
-
-boundaryField
-{{
-    boundaries
-    {{
-        type symmetry;
-    }}
-    inlet
-    {{
-        type fixedValue;
-        value uniform {omega};
-    }}
-    outlet
-    {{
-        type fixedValue;
-        value uniform {omega};
-    }}
-
-"""
 
+def turbine_patches_omega(nturb, omega):
+    """Yields the boundary conditions of each turbine's blade and AMI patches"""
     for i in range(nturb):
-        bc += f"""
-
-    BladesAndHub_{i}
-    {{
-        type omegaWallFunction;
-        value uniform {omega};
-    }}
-    AMI_turb{i}_1
-    {{
-        type cyclicAMI;
-    }}
-    AMI_turb{i}_2
-    {{
-        type cyclicAMI;
-    }}
-"""
-    bc += """
-}
-"""
+        yield f"BladesAndHub_{i}", FoamDict([("type", "omegaWallFunction"), ("value", Uniform(omega))])
+        yield f"AMI_turb{i}_1", FoamDict([("type", "cyclicAMI")])
+        yield f"AMI_turb{i}_2", FoamDict([("type", "cyclicAMI")])
+
+
+def generate_omega_field(nturb, omega):
+    """Returns the omega (specific dissipation rate) field; the turbine patches are produced while it is written"""
+    boundary = [
+        ("boundaries", FoamDict([("type", "symmetry")])),
+        ("inlet", FoamDict([("type", "fixedValue"), ("value", Uniform(omega))])),
+        ("outlet", FoamDict([("type", "fixedValue"), ("value", Uniform(omega))])),
+    ]
+    return FoamDict([
+        ("dimensions", Dimensions([0, 0, -1, 0, 0, 0, 0])),
+        ("internalField", Uniform(omega)),
+        ("boundaryField", FoamDict(itertools.chain(boundary, turbine_patches_omega(nturb, omega)))),
+    ], key_width=16)
+
+
+def generate_omega(nturb, output_folder, omega, file_format="ascii"):
+    """Generates 0 file"""
 
     # Write to file
     output_folder += "/0/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "omega")
 
-    with open(output_file, "w") as f:
-        f.write(bc)
+    write_foam_file(output_file, "omega", generate_omega_field(nturb, omega), foam_class="volScalarField",
+                    file_format=file_format, location="0")
 
     print(f"(I) omega created at: {output_file}")
-
-
@@ -1,89 +1,42 @@
 import os
+import sys
+import itertools
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Uniform, write_foam_file
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      binary;
-    arch        "LSB;label=32;scalar=64";
-    class       volScalarField;
-    location    "0";
-    object      {dictName};
-}}
-
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_p(nturb, output_folder, p):
-    """Generates 0 file"""
-
-    bc = get_header_string("p")
-
-    bc += f"""
-dimensions      [0 2 -2 0 0 0 0];
-
-internalField   uniform {p};
-
-boundaryField
-{{
-    boundaries
-    {{
-        type symmetry;
-    }}
-    inlet
-    {{
-        type zeroGradient;
-    }}
-    outlet
-    {{
-        type fixedValue;
-        value uniform 0;
-    }}
-"""
 
+def turbine_patches_p(nturb, p):
+    """Yields the boundary conditions of each turbine's blade and AMI patches"""
     for i in range(nturb):
-        bc += f"""
-
-    BladesAndHub_{i}
-    {{
-        type zeroGradient;
-    }}
-    AMI_turb{i}_1
-    {{
-        type cyclicAMI;
-        value uniform 0;
-    }}
-    AMI_turb{i}_2
-    {{
-        type cyclicAMI;
-        value uniform 0;
-    }}
-"""
-    bc += """
-}
-"""
+        yield f"BladesAndHub_{i}", FoamDict([("type", "zeroGradient")])
+        yield f"AMI_turb{i}_1", FoamDict([("type", "cyclicAMI"), ("value", Uniform(0))])
+        yield f"AMI_turb{i}_2", FoamDict([("type", "cyclicAMI"), ("value", Uniform(0))])
+
+
+def generate_p_field(nturb, p):
+    """Returns the p (kinematic pressure) field; the turbine patches are produced while it is written"""
+    boundary = [
+        ("boundaries", FoamDict([("type", "symmetry")])),
+        ("inlet", FoamDict([("type", "zeroGradient")])),
+        ("outlet", FoamDict([("type", "fixedValue"), ("value", Uniform(0))])),
+    ]
+    return FoamDict([
+        ("dimensions", Dimensions([0, 2, -2, 0, 0, 0, 0])),
+        ("internalField", Uniform(p)),
+        ("boundaryField", FoamDict(itertools.chain(boundary, turbine_patches_p(nturb, p)))),
+    ], key_width=16)
+
+
+def generate_p(nturb, output_folder, p, file_format="ascii"):
+    """Generates 0 file"""
 
     # Write to file
     output_folder += "/0/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "p")
 
-    with open(output_file, "w") as f:
-        f.write(bc)
+    write_foam_file(output_file, "p", generate_p_field(nturb, p), foam_class="volScalarField",
+                    file_format=file_format, location="0")
 
     print(f"(I) p created at: {output_file}")
-
-
@@ -15,6 +15,8 @@ def get_options():
     parser.add_argument("--omega", type=float, required=True, help="turbulence omega")
     parser.add_argument("--k", type=float, required=True, help="turbulence k")
     parser.add_argument("--nut", type=float, required=True, help="turbulence nut")
+    parser.add_argument("--format", type=str, choices=["ascii", "binary"], default="ascii",
+                        help="Format of the written fields; binary only changes non-uniform values.")
     parser.add_argument("--output_folder", type=str, default="runfolder", help="Folder to save snappyHexMeshDict.")
     return parser.parse_args()
 
@@ -26,31 +28,36 @@ def main():
     generate_U(
         nturb=args.nturb,
         vel=args.vel,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        file_format=args.format
     )
     # Generate p
     generate_p(
         nturb=args.nturb,
         p=args.p,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        file_format=args.format
     )
     # Generate omega
     generate_omega(
         nturb=args.nturb,
         omega=args.omega,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        file_format=args.format
     )
     # Generate k
     generate_k(
         nturb=args.nturb,
         k=args.k,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        file_format=args.format
     )
     # Generate nut
     generate_nut(
         nturb=args.nturb,
         nut=args.nut,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        file_format=args.format
     )
 
 
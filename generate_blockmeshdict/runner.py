@@ -1,5 +1,11 @@
 import os
+import sys
 import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, FoamList, Tokens, write_foam_file
+from turbine_layout import DOMAIN_MARGINS, farm_domain
 
 
 def get_options():
@@ -11,139 +17,213 @@ def get_options():
     parser.add_argument("--diameter", type=float, required=True, help="Turbine diameter (in meters).")
     parser.add_argument("--max_cells", type=int, required=True, help="Maximum number of cells in the largest dimension.")
     parser.add_argument("--output_folder", type=str, default="runfolder", help="Folder to save blockMesh.")
+    parser.add_argument("--core_margin", type=float, default=0,
+                        help="Grade the mesh outside a core box this many diameters around the turbines' geometry and wakes (0 writes one uniform block).")
+    parser.add_argument("--growth", type=float, default=1.2, help="Largest size ratio of neighbouring cells in the graded blocks.")
+    parser.add_argument("--max_ratio", type=float, default=8, help="Largest graded cell size as a multiple of the core cell size.")
+    parser.add_argument("--layout", type=str, choices=["line", "staggered"], default="line", help="Turbine layout, see turbine_layout.turbine_positions.")
+    parser.add_argument("--stl_folder", type=str, default="Geometry", help="Path to folder containing the base STL files the domain is fitted around.")
+    parser.add_argument("--cache_dir", type=str, default=".geometry_cache", help="Folder caching the parsed base STL arrays. Pass an empty string to disable.")
+    for side, margin in DOMAIN_MARGINS.items():
+        parser.add_argument(f"--{side}_margin", type=float, default=margin, help=f"Clearance between the turbines and the {side} domain boundaries, in diameters.")
     return parser.parse_args()
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_blockMeshDict(nturb, dx, dy, diameter, max_cells, output_folder):
-    """Generates a blockMeshDict with uniform cubic cells."""
-    D = diameter
-    upwind_length = 5 * D
-    downwind_length = 10 * D + dy * D * (nturb - 1)
-    lateral_width = 5 * D + dx * D * (nturb - 1)
-    height = 5 * D
-
-    # Determine the largest dimension
-    domain_length = downwind_length + upwind_length
-    largest_dimension = max(lateral_width, domain_length, height)
+def block_mesh_size(domain, max_cells):
+    """Returns the uniform cell size and the cell counts nx, ny, nz of the background mesh of a farm_domain.
+
+    max_cells cells cover the domain's largest dimension.
+    """
+    extents = domain["hi"] - domain["lo"]
 
     # Calculate uniform cell size
-    cell_size = largest_dimension / max_cells
+    cell_size = float(extents.max()) / max_cells
 
     # Calculate number of cells in each direction
-    nx = round(lateral_width / cell_size)
-    ny = round(domain_length / cell_size)
-    nz = round(height / cell_size)
+    nx, ny, nz = (round(float(extent) / cell_size) for extent in extents)
+
+    return dict(cell_size=cell_size, nx=nx, ny=ny, nz=nz)
+
+
+def graded_segment(length, cell_size, growth=1.2, max_ratio=8):
+    """Returns the cells and total expansion ratio of a block whose cells grow away from cell_size over length.
+
+    The fewest cells whose geometric sizes start at cell_size, fill length and
+    grow by at most growth from cell to cell, up to max_ratio times cell_size.
+    The ratio is last cell over first, >= 1, as blockMesh's simpleGrading reads it.
+    """
+    uniform = max(round(length / cell_size), 1)
+    cells = length / cell_size
+    for n in range(2, uniform):
+        # Per-cell growth r with 1 + r + ... + r^(n-1) = cells, by bisection
+        lo, hi = 1.0, cells
+        for _ in range(60):
+            r = (lo + hi) / 2
+            if (r ** n - 1) / (r - 1) < cells:
+                lo = r
+            else:
+                hi = r
+        if r <= growth and r ** (n - 1) <= max_ratio:
+            return n, r ** (n - 1)
+    return uniform, 1.0
+
+
+def axis_blocks(lo, hi, core_lo, core_hi, cell_size, growth=1.2, max_ratio=8):
+    """Returns the block bounds along one axis and, per block, its cells and simpleGrading ratio.
+
+    The core [core_lo, core_hi] keeps cell_size; the blocks between it and the
+    domain bounds grade to coarser cells outwards. A side closer to the domain
+    bound than one cell gets no graded block.
+    """
+    core_lo = lo if core_lo - lo < cell_size else core_lo
+    core_hi = hi if hi - core_hi < cell_size else core_hi
+    bounds = [lo]
+    blocks = []
+    if core_lo > lo:
+        n, ratio = graded_segment(core_lo - lo, cell_size, growth, max_ratio)
+        bounds.append(core_lo)
+        blocks.append((n, 1 / ratio))
+    bounds.append(core_hi)
+    blocks.append((max(round((core_hi - core_lo) / cell_size), 1), 1.0))
+    if core_hi < hi:
+        n, ratio = graded_segment(hi - core_hi, cell_size, growth, max_ratio)
+        bounds.append(hi)
+        blocks.append((n, ratio))
+    return bounds, blocks
+
+
+def graded_axes(domain, max_cells, core_margin, growth=1.2, max_ratio=8):
+    """Returns axis_blocks along x, y and z for a core box core_margin diameters around every turbine's geometry.
+
+    The geometry is the farm_domain's geometry box (STLs and wake refinement)
+    at each turbine, the box domain_bounds adds its margins to.
+    """
+    cell_size = block_mesh_size(domain, max_cells)["cell_size"]
+    margin = core_margin * domain["diameter"]
+    positions = np.asarray(domain["positions"], dtype=np.float64).reshape(-1, 3)
+    core_lo = positions.min(axis=0) + domain["geometry_lo"] - margin
+    core_hi = positions.max(axis=0) + domain["geometry_hi"] + margin
+    return [axis_blocks(lo, hi, float(c_lo), float(c_hi), cell_size, growth, max_ratio)
+            for lo, hi, c_lo, c_hi in zip(domain["lo"].tolist(), domain["hi"].tolist(), core_lo, core_hi)]
+
+
+def block_mesh_cells(domain, max_cells, core_margin=0, growth=1.2, max_ratio=8):
+    """Returns the cell count of the background mesh, uniform or, with core_margin > 0, graded."""
+    if core_margin <= 0:
+        size = block_mesh_size(domain, max_cells)
+        return size["nx"] * size["ny"] * size["nz"]
+    cells = 1
+    for _, blocks in graded_axes(domain, max_cells, core_margin, growth, max_ratio):
+        cells *= sum(n for n, _ in blocks)
+    return cells
+
+
+def format_ratio(ratio):
+    """A simpleGrading expansion ratio, 1 for uniform cells"""
+    return "1" if ratio == 1 else f"{ratio:.6g}"
+
+
+def graded_mesh(axes):
+    """Returns the vertices, hex blocks and boundary faces of the multi-block mesh of graded_axes.
+
+    Vertex (i, j, k) of the bounds grid is numbered i + nx * (j + ny * k);
+    every boundary face is listed outward-pointing.
+    """
+    (xs, x_blocks), (ys, y_blocks), (zs, z_blocks) = axes
+    nx, ny = len(xs), len(ys)
+
+    def v(i, j, k):
+        return i + nx * (j + ny * k)
+
+    vertices = [(x, y, z) for z in zs for y in ys for x in xs]
+    hexes = []
+    for c, (n_z, r_z) in enumerate(z_blocks):
+        for b, (n_y, r_y) in enumerate(y_blocks):
+            for a, (n_x, r_x) in enumerate(x_blocks):
+                corners = (v(a, b, c), v(a + 1, b, c), v(a + 1, b + 1, c), v(a, b + 1, c),
+                           v(a, b, c + 1), v(a + 1, b, c + 1), v(a + 1, b + 1, c + 1), v(a, b + 1, c + 1))
+                hexes.append((corners, (n_x, n_y, n_z), (r_x, r_y, r_z)))
+
+    I, J, K = len(x_blocks), len(y_blocks), len(z_blocks)
+    inlet = [(v(a, 0, c), v(a + 1, 0, c), v(a + 1, 0, c + 1), v(a, 0, c + 1)) for c in range(K) for a in range(I)]
+    outlet = [(v(a, J, c), v(a, J, c + 1), v(a + 1, J, c + 1), v(a + 1, J, c)) for c in range(K) for a in range(I)]
+    boundaries = [(v(I, b, c), v(I, b + 1, c), v(I, b + 1, c + 1), v(I, b, c + 1)) for c in range(K) for b in range(J)]
+    boundaries += [(v(0, b, c), v(0, b, c + 1), v(0, b + 1, c + 1), v(0, b + 1, c)) for c in range(K) for b in range(J)]
+    boundaries += [(v(a, b, K), v(a + 1, b, K), v(a + 1, b + 1, K), v(a, b + 1, K)) for b in range(J) for a in range(I)]
+    boundaries += [(v(a, b, 0), v(a, b + 1, 0), v(a + 1, b + 1, 0), v(a + 1, b, 0)) for b in range(J) for a in range(I)]
+    return vertices, hexes, dict(inlet=inlet, outlet=outlet, boundaries=boundaries)
+
+
+def generate_blockMeshDict(nturb, dx, dy, diameter, max_cells, output_folder, core_margin=0, growth=1.2, max_ratio=8,
+                           layout="line", stl_folder="", cache_dir=None, margins=None):
+    """Generates a blockMeshDict: one block of cubic cells, or with core_margin > 0 a graded core and outer blocks.
+
+    The domain is the box around every turbine's geometry (the STLs in
+    stl_folder and the wake refinement, placed by turbine_positions) plus
+    margins, in diameters, overriding DOMAIN_MARGINS by name.
+    With core_margin > 0 the cubic cells only fill a core box reaching that
+    many diameters around the same turbine geometry and wakes. Up to 26 outer
+    blocks around it (none on a side where the core reaches the domain bound)
+    grade to cells up to max_ratio times coarser towards the inlet, outlet
+    and symmetry planes, growing by at most growth from cell to cell.
+    """
+    domain = farm_domain(nturb, dx, dy, diameter, layout, stl_folder, cache_dir, margins)
+    (x_lo, y_lo, z_lo), (x_hi, y_hi, z_hi) = domain["lo"].tolist(), domain["hi"].tolist()
+    size = block_mesh_size(domain, max_cells)
+    cell_size, nx, ny, nz = size["cell_size"], size["nx"], size["ny"], size["nz"]
 
     print(f"    (II) Cell size: {cell_size:.3f}m, Resolutions: nx={nx}, ny={ny}, nz={nz}")
 
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "blockMeshDict")
 
-
-    # Define vertices
-    vertices = [
-        (-lateral_width / 2, -upwind_length, -height / 2),
-        (lateral_width / 2, -upwind_length, -height / 2),
-        (lateral_width / 2, downwind_length, -height / 2),
-        (-lateral_width / 2, downwind_length, -height / 2),
-        (-lateral_width / 2, -upwind_length, height / 2),
-        (lateral_width / 2, -upwind_length, height / 2),
-        (lateral_width / 2, downwind_length, height / 2),
-        (-lateral_width / 2, downwind_length, height / 2),
-    ]
-    nl = "\n"
-    # Create blockMeshDict content
-    blockMeshDict = get_header_string("blockMeshDict")
-    
-    blockMeshDict += f"""\
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      blockMeshDict;
-}}
-
-scale   1;
-
-vertices
-(
-{"".join(f"    ({v[0]} {v[1]} {v[2]}){nl}" for v in vertices)}
-);
-
-blocks
-(
-    hex (0 1 2 3 4 5 6 7) ({nx} {ny} {nz}) simpleGrading (1 1 1)
-);
-
-edges
-(
-);
-
-boundary
-(
-    inlet
-    {{
-        type patch;
-        faces
-        (
-            (0 1 5 4)
-        );
-    }}
-    outlet
-    {{
-        type patch;
-        faces
-        (
-            (3 7 6 2)
-        );
-    }}
-    boundaries
-    {{
-        type symmetry;
-        faces
-        (
-            (1 2 6 5)
-            (0 4 7 3)
-            (4 5 6 7)
-            (0 1 2 3)
-        );
-    }}
-);
-"""
+    if core_margin > 0:
+        vertices, hexes, patches = graded_mesh(graded_axes(domain, max_cells, core_margin, growth, max_ratio))
+        cells = block_mesh_cells(domain, max_cells, core_margin, growth, max_ratio)
+        print(f"    (II) Graded background mesh: {len(hexes)} blocks, {cells} cells instead of {nx * ny * nz} "
+              f"({100 * (1 - cells / (nx * ny * nz)):.1f}% fewer)")
+    else:
+        # Define vertices
+        vertices = [
+            (x_lo, y_lo, z_lo),
+            (x_hi, y_lo, z_lo),
+            (x_hi, y_hi, z_lo),
+            (x_lo, y_hi, z_lo),
+            (x_lo, y_lo, z_hi),
+            (x_hi, y_lo, z_hi),
+            (x_hi, y_hi, z_hi),
+            (x_lo, y_hi, z_hi),
+        ]
+        hexes = [((0, 1, 2, 3, 4, 5, 6, 7), (nx, ny, nz), (1, 1, 1))]
+        patches = dict(
+            inlet=[(0, 1, 5, 4)],
+            outlet=[(3, 7, 6, 2)],
+            boundaries=[(1, 2, 6, 5), (0, 4, 7, 3), (4, 5, 6, 7), (0, 1, 2, 3)],
+        )
+
+    blockMeshDict = FoamDict([
+        ("scale", 1),
+        ("vertices", FoamList(vertices, multiline=True)),
+        ("blocks", FoamList([Tokens(["hex", corners, cells, "simpleGrading", tuple(map(format_ratio, ratios))])
+                             for corners, cells, ratios in hexes], multiline=True)),
+        ("edges", FoamList([], multiline=True)),
+        ("boundary", FoamList(boundary_patches(patches), multiline=True)),
+    ], key_width=8)
 
     # Write to file
-    os.makedirs(output_folder, exist_ok=True)
-
-    with open(output_file, "w") as f:
-        f.write(blockMeshDict)
+    write_foam_file(output_file, "blockMeshDict", blockMeshDict)
 
     print(f"(I) blockMesh created at: {output_file}")
 
 
+def boundary_patches(patches):
+    """The boundary list items of the inlet, outlet and symmetry patches: each name followed by its dictionary"""
+    items = []
+    for name, patch_type in (("inlet", "patch"), ("outlet", "patch"), ("boundaries", "symmetry")):
+        items.append(name)
+        items.append(FoamDict([("type", patch_type), ("faces", FoamList(patches[name], multiline=True))]))
+    return items
+
+
 def main():
     args = get_options()
 
@@ -154,7 +234,14 @@ def main():
         dy=args.dy,
         diameter=args.diameter,
         max_cells=args.max_cells,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        core_margin=args.core_margin,
+        growth=args.growth,
+        max_ratio=args.max_ratio,
+        layout=args.layout,
+        stl_folder=args.stl_folder,
+        cache_dir=args.cache_dir,
+        margins={side: getattr(args, f"{side}_margin") for side in DOMAIN_MARGINS},
     )
 
 
@@ -1,6 +1,10 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, FoamList, write_foam_file
+
 def get_options():
     """
     Parse command-line arguments.
@@ -10,106 +14,54 @@ def get_options():
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-    return header_string
-
-
 def generate_controldict(output_folder):
     """
     Generates fvSolution dict
     """
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "controlDict")
 
-    fvSol = get_header_string("controlDict")
-
-    fvSol += """
-
-
-application     pimpleFoam;
-
-startFrom       latestTime;
-
-startTime       0;
-
-stopAt          endTime;
-
-endTime         30;
-
-deltaT          1e-7;
-
-writeControl    adjustable;
-
-writeInterval   0.1;
-
-purgeWrite      0;
-
-writeFormat     binary;
-
-writePrecision  6;
-
-writeCompression off;
-
-timeFormat      general;
-
-timePrecision   6;
-
-runTimeModifiable true;
-
-adjustTimeStep  yes;
-
-maxCo           10.0;
-
-functions
-{
-    #includeFunc Q
-
-    AMIWeights1
-{
-    // Mandatory entries
-    type             AMIWeights;
-    libs             (fieldFunctionObjects);
-    writeFields     true;
-
-    // Optional (inherited) entries
-    writePrecision   10;
-    writeToFile      true;
-    useUserTime      false;
-
-    region          region0;
-    enabled         true;
-    log             true;
-    timeStart       0;
-    timeEnd         1000;
-    executeControl  timeStep;
-    executeInterval 1;
-    writeControl    writeTime;
-    writeInterval  -1;
-}
-}
-"""
-
-    with open(output_file, "w") as file:
-        file.write(fvSol)
+    controlDict = FoamDict([
+        ("application", "pimpleFoam"),
+        ("startFrom", "latestTime"),
+        ("startTime", 0),
+        ("stopAt", "endTime"),
+        ("endTime", 30),
+        ("deltaT", 1e-7),
+        ("writeControl", "adjustable"),
+        ("writeInterval", 0.1),
+        ("purgeWrite", 0),
+        ("writeFormat", "binary"),
+        ("writePrecision", 6),
+        ("writeCompression", "off"),
+        ("timeFormat", "general"),
+        ("timePrecision", 6),
+        ("runTimeModifiable", True),
+        ("adjustTimeStep", "yes"),
+        ("maxCo", 10.0),
+        ("functions", FoamDict([
+            ("#includeFunc", "Q"),
+            ("AMIWeights1", FoamDict([
+                ("type", "AMIWeights"),
+                ("libs", FoamList(["fieldFunctionObjects"])),
+                ("writeFields", True),
+                ("writePrecision", 10),
+                ("writeToFile", True),
+                ("useUserTime", False),
+                ("region", "region0"),
+                ("enabled", True),
+                ("log", True),
+                ("timeStart", 0),
+                ("timeEnd", 1000),
+                ("executeControl", "timeStep"),
+                ("executeInterval", 1),
+                ("writeControl", "writeTime"),
+                ("writeInterval", -1),
+            ], key_width=17)),
+        ])),
+    ], key_width=16)
+
+    write_foam_file(output_file, "controlDict", controlDict)
 
     print(f"(I) fvSolution created at: {output_file}")
 
@@ -1,6 +1,10 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, FoamList, Repeat, write_foam_file
+
 
 def get_options():
     """Parse and return command-line options."""
@@ -10,85 +14,48 @@ def get_options():
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+def ami_patch(name, neighbour, source):
+    """Returns one side of a turbine's cyclicAMI patch pair, made from the faces of patch source"""
+    return FoamDict([
+        ("name", name),
+        ("patchInfo", FoamDict([
+            ("type", "cyclicAMI"),
+            ("matchTolerance", 0.1),
+            ("neighbourPatch", neighbour),
+            ("transform", "noOrdering"),
+            ("lowWeightCorrection", 0.05),
+        ], key_width=16)),
+        ("constructFrom", "patches"),
+        ("patches", FoamList([source])),
+    ], key_width=16)
+
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
+def ami_patches(nturb):
+    """Returns the master and slave AMI patch of every turbine, filled in while they are written"""
+    pair = [
+        ami_patch("AMI_turb%(i)s_1", "AMI_turb%(i)s_2", "AMI_%(i)s"),
+        ami_patch("AMI_turb%(i)s_2", "AMI_turb%(i)s_1", "AMI_%(i)s_slave"),
+    ]
+    return [Repeat(pair, (dict(i=i) for i in range(nturb)))]
 
-    return header_string
+
+def generate_createpatchdict_body(nturb):
+    """Returns the createPatchDict: the AMI patch pair of every turbine"""
+    return FoamDict([
+        ("pointSync", False),
+        ("patches", FoamList(ami_patches(nturb))),
+    ])
 
 
 def generate_createpatchdict(nturb, output_folder):
     """Generates createpatchdict"""
 
-    createpatchdict = get_header_string("createPatchDict")
-
-    createpatchdict += """
-pointSync false;
-
-patches
-(
-"""
-    for i in range(nturb):
-        createpatchdict += f"""
-    {{
-        //- Master side patch
-        name            AMI_turb{i}_1;
-        patchInfo
-        {{
-            type            cyclicAMI;
-            matchTolerance  0.1;
-            neighbourPatch  AMI_turb{i}_2;
-            transform       noOrdering;
-	    lowWeightCorrection 0.05;
-        }}
-        constructFrom patches;
-        patches (AMI_{i});
-    }}
-
-    {{
-        //- Slave side patch
-        name            AMI_turb{i}_2;
-        patchInfo
-        {{
-            type            cyclicAMI;
-            matchTolerance  0.1;
-            neighbourPatch  AMI_turb{i}_1;
-            transform       noOrdering;
-	    lowWeightCorrection 0.05;
-        }}
-        constructFrom patches;
-        patches (AMI_{i}_slave);
-    }}
-
-"""
-    createpatchdict += """
-);
-"""
-
     # Write to file
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
 
     output_file = os.path.join(output_folder, "createPatchDict")
 
-    with open(output_file, "w") as f:
-        f.write(createpatchdict)
+    write_foam_file(output_file, "createPatchDict", generate_createpatchdict_body(nturb))
 
     print(f"(I) createPatch created at: {output_file}")
 
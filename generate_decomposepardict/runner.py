@@ -1,67 +1,64 @@
+
 import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, write_foam_file
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-
-    return header_string
-
-
-def generate_decomposeParDict(output_folder, n_subdomains):
-    """
-    Generates a decomposeParDict file with the specified number of subdomains.
-    """
-    decomposeParDict_content = get_header_string("decomposeParDict")
 
-    decomposeParDict_content +=f"""
+def subdomain_count(n_cells, cells_per_rank, node_cores=1):
+    """Returns the multiple of node_cores whose ranks hold closest to cells_per_rank of n_cells cells, at least one node."""
+    n_nodes = max(round(n_cells / cells_per_rank / node_cores), 1)
+    return n_nodes * node_cores
 
-numberOfSubdomains {n_subdomains};
 
-method          scotch;
+def decomposeParDict_body(n_subdomains):
+    """Returns a decomposeParDict splitting the mesh into n_subdomains"""
+    return FoamDict([("numberOfSubdomains", n_subdomains), ("method", "scotch")], key_width=16)
 
 
-// ************************************************************************* //
-"""
+def generate_decomposeParDict(output_folder, n_subdomains, mesh_subdomains=0):
+    """
+    Generates the decomposeParDict of the solver with n_subdomains and the
+    decomposeParDict.mesh of snappyHexMesh with mesh_subdomains (0 for n_subdomains).
+
+    The meshing steps read theirs with -decomposeParDict system/decomposeParDict.mesh.
+    """
     output_folder += "system/"
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "decomposeParDict")
+    for name, count in (("decomposeParDict", n_subdomains), ("decomposeParDict.mesh", mesh_subdomains or n_subdomains)):
+        output_file = os.path.join(output_folder, name)
 
-    with open(output_file, "w") as file:
-        file.write(decomposeParDict_content)
+        write_foam_file(output_file, "decomposeParDict", decomposeParDict_body(count))
 
-    print(f"(I) decomposeParDict created at: {output_file}")
+        print(f"(I) {name} created at: {output_file}")
+        print(f"    (II) numberOfSubdomains {count}")
 
 
 def get_options():
     """
     Parse command-line arguments.
     """
-    parser = argparse.ArgumentParser(description="Generate decomposeParDict for parallel meshing.")
+    parser = argparse.ArgumentParser(description="Generate decomposeParDict for parallel meshing and solving.")
     parser.add_argument("--output_folder", type=str, default="runfolder/", help="Folder to save decomposeParDict.")
-    parser.add_argument("--n_subdomains", type=int, required=True, help="Number of subdomains for decomposition.")
+    parser.add_argument("--n_subdomains", type=int, default=0, help="Number of subdomains for solving.")
+    parser.add_argument("--mesh_subdomains", type=int, default=0, help="Number of subdomains for meshing, 0 for n_subdomains.")
+    parser.add_argument("--n_cells", type=int, default=0, help="Predicted mesh size (see mesh_estimate.py) to choose the subdomain counts from instead.")
+    parser.add_argument("--cells_per_rank", type=int, default=50000, help="Cells per solver rank the counts chosen from --n_cells aim at.")
+    parser.add_argument("--mesh_cells_per_rank", type=int, default=200000, help="Cells per snappyHexMesh rank the counts chosen from --n_cells aim at.")
+    parser.add_argument("--node_cores", type=int, default=1, help="Cores per node; the counts chosen from --n_cells are multiples of it.")
     return parser.parse_args()
 
 
 def main():
     args = get_options()
-    generate_decomposeParDict(args.output_folder, args.n_subdomains)
+    n_subdomains, mesh_subdomains = args.n_subdomains, args.mesh_subdomains
+    if args.n_cells > 0:
+        n_subdomains = n_subdomains or subdomain_count(args.n_cells, args.cells_per_rank, args.node_cores)
+        mesh_subdomains = mesh_subdomains or subdomain_count(args.n_cells, args.mesh_cells_per_rank, args.node_cores)
+    if n_subdomains <= 0:
+        raise Exception("ERROR: give --n_subdomains, or --n_cells to choose it from")
+    generate_decomposeParDict(args.output_folder, n_subdomains, mesh_subdomains)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, FoamList, Repeat, write_foam_file
+from turbine_layout import turbine_positions
+
 
 def get_options():
     """Parse and return command-line options."""
@@ -11,68 +16,39 @@ def get_options():
     parser.add_argument("--rps", type=float, required=True, help="Rotation of turbine in rps.")
     parser.add_argument("--output_folder", type=str, default="runfolder", help="Folder to save snappyHexMeshDict.")
     parser.add_argument("--diameter", type=float, required=True, help= "Turbine Diameter")
+    parser.add_argument("--layout", type=str, choices=["line", "staggered"], default="line", help="Turbine layout, see turbine_layout.turbine_positions.")
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-
-    return header_string
+def turbine_motions(nturb, dx, dy, rps, diameter, layout="line"):
+    """Returns the rotating motion of each turbine about its hub, filled in while it is written"""
+    motion = [("turbine_%(i)s", FoamDict([
+        ("solidBodyMotionFunction", "rotatingMotion"),
+        ("rotatingMotionCoeffs", FoamDict([
+            ("origin", ("%(x)r", "%(y)r", 0)),
+            ("axis", (0, 1, 0)),
+            ("omega", rps),
+        ])),
+    ]))]
+    rows = (dict(i=i, x=x, y=y) for i, (x, y, _) in enumerate(turbine_positions(nturb, dx, dy, diameter, layout)))
+    return [Repeat(motion, rows)]
 
 
-def generate_dynamicmeshdict(nturb, dx, dy, rps, output_folder, diameter):
+def generate_dynamicmeshdict(nturb, dx, dy, rps, output_folder, diameter, layout="line"):
     """Generates dynamicMeshDict with same RPM for nturb"""
 
-    dynamicmeshdict = get_header_string("dynamicMeshDict")
-
     output_folder += "/constant/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "dynamicMeshDict")
 
-    dynamicmeshdict += """
-dynamicFvMesh dynamicMotionSolverFvMesh;
-motionSolverLibs (fvMotionSolvers);
-motionSolver multiSolidBodyMotionSolver;
-multiSolidBodyMotionSolverCoeffs
-{
-"""
-    for i in range(nturb):
-        dynamicmeshdict += f"""
-    turbine_{i}
-    {{
-        solidBodyMotionFunction rotatingMotion;
-        rotatingMotionCoeffs
-        {{
-            origin ({dx*i*diameter} {dy*i*diameter} 0);
-            axis (0 1 0);
-            omega {rps};
-        }}
-    }}
-"""
-    dynamicmeshdict += "}\n"
+    dynamicmeshdict = FoamDict([
+        ("dynamicFvMesh", "dynamicMotionSolverFvMesh"),
+        ("motionSolverLibs", FoamList(["fvMotionSolvers"])),
+        ("motionSolver", "multiSolidBodyMotionSolver"),
+        ("multiSolidBodyMotionSolverCoeffs", FoamDict(turbine_motions(nturb, dx, dy, rps, diameter, layout))),
+    ])
 
     # Write to file
-    os.makedirs(output_folder, exist_ok=True)
-
-    with open(output_file, "w") as f:
-        f.write(dynamicmeshdict)
+    write_foam_file(output_file, "dynamicMeshDict", dynamicmeshdict)
 
     print(f"(I) dynamicMeshDict created at: {output_file}")
 
@@ -86,7 +62,8 @@ def main():
         dy=args.dy,
         rps=args.rps,
         output_folder=args.output_folder,
-        diameter=args.diameter
+        diameter=args.diameter,
+        layout=args.layout,
     )
 
 
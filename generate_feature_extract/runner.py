@@ -1,106 +1,72 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, Repeat, serialize, write_blocks, write_foam_file
+
 
 def get_options():
     """Parse and return command-line options."""
     parser = argparse.ArgumentParser(description="Generate snappyHexMeshDict for a multi-turbine setup.")
     parser.add_argument("--nturb", type=int, required=True, help="Number of turbines.")
     parser.add_argument("--output_folder", type=str, default="runfolder", help="Folder to save snappyHexMeshDict.")
+    parser.add_argument("--stl_ext", type=str, default=".stl", help="Extension of the turbine surfaces in constant/triSurface (.stl or .stl.gz).")
+    parser.add_argument("--merge_refinement", action="store_true", help="Refinement-only surfaces are single files with one region per turbine (prepare_geometry --merge_refinement).")
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
+def extract_entry(surface):
+    """Returns the entry extracting the features of a surface with the shared defaults"""
+    return surface, FoamDict([("#include", '"surfaceFeatureExtractDictDefaults"')])
 
-    return header_string
 
+def generate_surf_feat_ext_dict_body(nturb, stl_ext=".stl", merge_refinement=False):
+    """Returns the surfaceFeatureExtractDict; the surfaces of every turbine are filled in while it is written"""
+    names = ["BladesAndHub"] if merge_refinement else ["BladesAndHub", "AMI_Refinement_Additional", "Features", "HubRefinement"]
+    entries = [Repeat([extract_entry(f"{name}_%(i)s{stl_ext}") for name in names], (dict(i=i) for i in range(nturb)))]
 
-def generate_surf_feat_ext_dict(nturb, output_folder):
-    """Generate surfaceFeatureExtractDict for a multi-turbine setup."""
-    features = get_header_string("surfaceFeatureExtractDict")
-
-    for i in range(nturb):
-        features += f"""
-BladesAndHub_{i}.stl
-{{
-    #include "surfaceFeatureExtractDictDefaults"
-}}
-AMI_Refinement_Additional_{i}.stl
-{{
-    #include "surfaceFeatureExtractDictDefaults"
-}}
-Features_{i}.stl
-{{
-    #include "surfaceFeatureExtractDictDefaults"
-}}
-HubRefinement_{i}.stl
-{{
-    #include "surfaceFeatureExtractDictDefaults"
-}}
-    """
-
-    features += """
-writeObj yes;"""
+    if merge_refinement:
+        # The merged surfaces hold every turbine, so each is extracted once
+        for surface_name in ["AMI_Refinement_Additional", "Features", "HubRefinement"]:
+            entries.append(extract_entry(f"{surface_name}{stl_ext}"))
 
+    entries.append(("writeObj", "yes"))
+    return FoamDict(entries)
 
 
+def generate_surf_feat_ext_dict(nturb, output_folder, stl_ext=".stl", merge_refinement=False):
+    """Generate surfaceFeatureExtractDict for a multi-turbine setup."""
 
     # Write to file
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "surfaceFeatureExtractDict")
-    with open(output_file, "w") as f:
-        f.write(features)
+    write_foam_file(output_file, "surfaceFeatureExtractDict", generate_surf_feat_ext_dict_body(nturb, stl_ext=stl_ext, merge_refinement=merge_refinement))
 
     print(f"(I) surfaceFeatureExtractDict created at: {output_file}")
 
+    features_default = FoamDict([
+        ("extractionMethod", "extractFromSurface"),
+        ("includedAngle", 150),
+        ("trimFeatures", FoamDict([("minElem", 10)], key_width=16)),
+    ], key_width=20)
 
-
-    features_default = """
-extractionMethod    extractFromSurface;
-includedAngle       150;
-
-trimFeatures
-{
-    minElem         10;
-}
-
-"""
-    # Write to file
-    os.makedirs(output_folder, exist_ok=True)
+    # Write to file; the defaults are #included, so they take no header
     output_file = os.path.join(output_folder, "surfaceFeatureExtractDictDefaults")
-    with open(output_file, "w") as f:
-        f.write(features_default)
+    write_blocks(output_file, serialize(features_default, blank_lines=True))
 
     print(f"(I) surfaceFeatureExtractDictDefaults created at: {output_file}")
 
 
-
 def main():
     args = get_options()
 
     # Generate snappyHexMeshDict
     generate_surf_feat_ext_dict(
         nturb=args.nturb,
-        output_folder=args.output_folder
+        output_folder=args.output_folder,
+        stl_ext=args.stl_ext,
+        merge_refinement=args.merge_refinement
     )
 
 
@@ -1,6 +1,10 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, write_foam_file
+
 def get_options():
     """
     Parse command-line arguments.
@@ -10,105 +14,49 @@ def get_options():
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-    return header_string
-
-
 def generate_fvSolution(output_folder):
     """
     Generates fvSolution dict
     """
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "fvSolution")
 
-    fvSol = get_header_string("fvSolution")
-
-    fvSol += """
-
-
-solvers
-{
-    "pcorr.*"
-    {
-        solver          GAMG;
-        tolerance       1e-2;
-        relTol          0;
-        smoother        DICGaussSeidel;
-        cacheAgglomeration no;
-        maxIter         50;
-    }
-
-    p
-    {
-        $pcorr;
-        tolerance       1e-5;
-        relTol          0.01;
-    }
-
-    pFinal
-    {
-        $p;
-        tolerance       1e-6;
-        relTol          0;
-    }
-
-    "(U|k|omega)"
-    {
-        solver          smoothSolver;
-        smoother        symGaussSeidel;
-        tolerance       1e-6;
-        relTol          0.1;
-    }
-
-    "(U|k|omega)Final"
-    {
-        solver          smoothSolver;
-        smoother        symGaussSeidel;
-        tolerance       1e-6;
-        relTol          0;
-    }
-}
-
-PIMPLE
-{
-    correctPhi          no;
-    nOuterCorrectors    5;
-    nCorrectors         3;
-    nNonOrthogonalCorrectors 0;
-}
-
-relaxationFactors
-{
-    "(U|k|omega).*"   0.7;
-}
-
-cache
-{
-    grad(U);
-}
-"""
-
-    with open(output_file, "w") as file:
-        file.write(fvSol)
+    fvSolution = FoamDict([
+        ("solvers", FoamDict([
+            ('"pcorr.*"', FoamDict([
+                ("solver", "GAMG"),
+                ("tolerance", 1e-2),
+                ("relTol", 0),
+                ("smoother", "DICGaussSeidel"),
+                ("cacheAgglomeration", "no"),
+                ("maxIter", 50),
+            ], key_width=16)),
+            ("p", FoamDict([("$pcorr", None), ("tolerance", 1e-5), ("relTol", 0.01)], key_width=16)),
+            ("pFinal", FoamDict([("$p", None), ("tolerance", 1e-6), ("relTol", 0)], key_width=16)),
+            ('"(U|k|omega)"', FoamDict([
+                ("solver", "smoothSolver"),
+                ("smoother", "symGaussSeidel"),
+                ("tolerance", 1e-6),
+                ("relTol", 0.1),
+            ], key_width=16)),
+            ('"(U|k|omega)Final"', FoamDict([
+                ("solver", "smoothSolver"),
+                ("smoother", "symGaussSeidel"),
+                ("tolerance", 1e-6),
+                ("relTol", 0),
+            ], key_width=16)),
+        ])),
+        ("PIMPLE", FoamDict([
+            ("correctPhi", "no"),
+            ("nOuterCorrectors", 5),
+            ("nCorrectors", 3),
+            ("nNonOrthogonalCorrectors", 0),
+        ], key_width=20)),
+        ("relaxationFactors", FoamDict([('"(U|k|omega).*"', 0.7)], key_width=18)),
+        ("cache", FoamDict([("grad(U)", None)])),
+    ])
+
+    write_foam_file(output_file, "fvSolution", fvSolution)
 
     print(f"(I) fvSolution created at: {output_file}")
 
@@ -118,62 +66,30 @@ def generate_fvSchemes(output_folder):
     Generates fvSchemes dict
     """
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "fvSchemes")
 
-    fvScheme = get_header_string("fvSchemes")
-
-    fvScheme += """
-
-
-ddtSchemes
-{
-    default         Euler;
-}
-
-gradSchemes
-{
-    default         Gauss linear;
-    grad(p)         Gauss linear;
-    grad(U)         cellLimited Gauss linear 1;
-}
-
-divSchemes
-{
-    default         none;
-
-    div(phi,U)      Gauss linearUpwind grad(U);
-
-    turbulence      Gauss upwind;
-    div(phi,k)      $turbulence;
-    div(phi,omega) $turbulence;
-
-    div((nuEff*dev2(T(grad(U))))) Gauss linear;
-}
-
-laplacianSchemes
-{
-    default         Gauss linear limited corrected 0.33;
-}
-
-interpolationSchemes
-{
-    default         linear;
-}
-
-snGradSchemes
-{
-    default         limited corrected 0.33;
-}
-
-wallDist
-{
-    method          meshWave;
-}
-"""
-
-    with open(output_file, "w") as file:
-        file.write(fvScheme)
+    fvSchemes = FoamDict([
+        ("ddtSchemes", FoamDict([("default", "Euler")], key_width=16)),
+        ("gradSchemes", FoamDict([
+            ("default", "Gauss linear"),
+            ("grad(p)", "Gauss linear"),
+            ("grad(U)", "cellLimited Gauss linear 1"),
+        ], key_width=16)),
+        ("divSchemes", FoamDict([
+            ("default", "none"),
+            ("div(phi,U)", "Gauss linearUpwind grad(U)"),
+            ("turbulence", "Gauss upwind"),
+            ("div(phi,k)", "$turbulence"),
+            ("div(phi,omega)", "$turbulence"),
+            ("div((nuEff*dev2(T(grad(U)))))", "Gauss linear"),
+        ], key_width=16)),
+        ("laplacianSchemes", FoamDict([("default", "Gauss linear limited corrected 0.33")], key_width=16)),
+        ("interpolationSchemes", FoamDict([("default", "linear")], key_width=16)),
+        ("snGradSchemes", FoamDict([("default", "limited corrected 0.33")], key_width=16)),
+        ("wallDist", FoamDict([("method", "meshWave")], key_width=16)),
+    ])
+
+    write_foam_file(output_file, "fvSchemes", fvSchemes)
 
     print(f"(I) fvSchemes created at: {output_file}")
 
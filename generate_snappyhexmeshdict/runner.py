@@ -1,6 +1,24 @@
 import os
+import sys
+import json
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, FoamList, Repeat, format_value, write_foam_file
+from case_output import read_output
+from turbine_layout import WAKE_DIAMETER, WAKE_LENGTH, turbine_positions
+
+
+# Castellated mesh refinement, also read by mesh_estimate.py: "mode inside" region
+# levels, (min max) surface levels, feature edge levels and surface layers
+REGION_LEVELS = {"AMI": 4, "LeadingEdge": 5, "TipTrailingEdge": 9, "Turb_WakeRefinement": 4, "BladeWakeRefinement": 4}
+SURFACE_LEVELS = {"AMI": (1, 5), "BladesAndHub": (8, 8)}
+FEATURE_LEVELS = {"BladesAndHub": 4, "AMI_Refinement_Additional": 4, "Features": 6, "HubRefinement": 6}
+SURFACE_LAYERS = {"BladesAndHub": 5}
+N_CELLS_BETWEEN_LEVELS = 3
+MAX_LOCAL_CELLS = 10000000
+MAX_GLOBAL_CELLS = 40000000
+
 
 def get_options():
     """Parse and return command-line options."""
@@ -10,383 +28,300 @@ def get_options():
     parser.add_argument("--dy", type=float, required=True, help="Crosswind spacing as a multiple of turbine diameter.")
     parser.add_argument("--diameter", type=float, required=True, help="Turbine diameter (in meters).")
     parser.add_argument("--output_folder", type=str, default="runfolder", help="Folder to save snappyHexMeshDict.")
+    parser.add_argument("--stl_ext", type=str, default=".stl", help="Extension of the turbine surfaces in constant/triSurface (.stl or .stl.gz).")
+    parser.add_argument("--merge_refinement", action="store_true", help="Refinement-only surfaces are single files with one region per turbine (prepare_geometry --merge_refinement).")
+    parser.add_argument("--layout", type=str, choices=["line", "staggered"], default="line", help="Turbine layout, see turbine_layout.turbine_positions.")
+    parser.add_argument("--max_level", type=int, default=0, help="Lower every finer refinement level to this level (0 keeps the levels).")
+    parser.add_argument("--primitives", type=str, default="", help="searchablePrimitives.json written by prepare_geometry --fit_tolerance.")
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
+def cap_levels(levels, max_level=0):
+    """Returns a copy of a level table with every level above max_level lowered to it; 0 keeps the levels"""
+    if not max_level:
+        return dict(levels)
+    return {name: tuple(min(l, max_level) for l in level) if isinstance(level, tuple) else min(level, max_level)
+            for name, level in levels.items()}
 
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
 
-    return header_string
+def get_snappy_preamble():
+    """Returns the entries switching the meshing phases on/off"""
+    return [
+        ("castellatedMesh", True),
+        ("snap", True),
+        ("addLayers", True),
+        ("mergeTolerance", 1e-6),
+    ]
 
 
-def get_snappy_preamble():
-    """Returns a string meshing options on/off"""
-    preamble_string = """castellatedMesh true;
-snap true;
-addLayers true;
-mergeTolerance 1e-6;
-"""
+def generate_merged_geometry(surface_name, nturb, stl_ext=".stl"):
+    """Returns the geometry entry of a surface holding one region per turbine, written by prepare_geometry --merge_refinement"""
+    regions = Repeat([(f"{surface_name}_%(i)s", FoamDict([("name", f"{surface_name}_%(i)s")]))], (dict(i=i) for i in range(nturb)))
+    return f"{surface_name}{stl_ext}", FoamDict([("type", "triSurfaceMesh"), ("regions", FoamDict([regions]))])
 
-    return preamble_string
 
+def load_primitives(path):
+    """Reads the per-turbine searchable primitives written by prepare_geometry --fit_tolerance"""
+    if not path:
+        return {}
+    return json.loads(read_output(path))
 
-def generate_snappy_geometry(nturb, dx, dy, D):
-    """Generate snappyHexMeshDict geometry section"""
 
-    geometry = f"""
-geometry
-{{
-    """
-    # Generate Geometry section for each turbine
-    for i in range(nturb):
-        x_start = i * dx * D  # Turbine's approximate x-position
-        y_start = i * dy * D  # Turbine's y-position for crosswind placement
-
-        # STL-based geometries
-        geometry += f"""
-
-
-    BladesAndHub_{i}.stl
-    {{
-        type triSurfaceMesh;
-        name BladesAndHub_{i};
-    }}
-    BladeWakeRefinement_{i}.stl
-    {{
-        type triSurfaceMesh;
-    }}
-    LeadingEdge_{i}.stl
-    {{
-        type triSurfaceMesh;
-    }}
-    TipTrailingEdge_{i}.stl
-    {{
-        type triSurfaceMesh;
-    }}
-    AMI_{i}.stl
-    {{
-        type triSurfaceMesh;
-        name AMI_{i};
-        regions
-        {{
-            AMI
-            {{
-                name AMI_{i};
-            }}
-        }}
-    }}
-    AMI_Refinement_{i}.stl
-    {{
-        type triSurfaceMesh;
-    }}
-    Turb_WakeRefinement_{i}
-    {{
-        type searchableCylinder;
-        point1 ({dx*(i)*D} {dy*(i)*D} 0);
-        point2 ({dx*(i)*D} {dy*(i)*D + 6.5*D} 0.0);
-        radius {1.2*D/2};
-    }}
+def primitive_fields(primitive):
+    """Returns the entries of a searchable box or cylinder fitted to a refinement surface, without its type"""
+    if primitive["type"] == "searchableBox":
+        return [("min", tuple(primitive["min"])), ("max", tuple(primitive["max"]))]
+    return [("point1", tuple(primitive["point1"])), ("point2", tuple(primitive["point2"])), ("radius", primitive["radius"])]
+
+
+def generate_primitive_geometry(name, stem, fits):
+    """Returns the geometry entry, with per-turbine placeholders, of the searchable primitive fitted to surface stem
+
+    fits holds the primitive of every turbine, copies of one fit; turbine_rows fills in their values.
     """
-    geometry += """}
+    if any(fit["type"] != fits[0]["type"] for fit in fits):
+        raise Exception(f"ERROR: the primitives fitted to {stem} are not all of one type")
+    return name, FoamDict([("type", fits[0]["type"])] + [(key, f"%({stem}_{key})s") for key, _ in primitive_fields(fits[0])])
+
+
+def turbine_rows(nturb, dx, dy, D, layout="line", primitives=None):
+    """Yields the values the per-turbine entries differ by, one dict per turbine, for the placeholders of Repeat"""
+    primitives = primitives or {}
+    for i, (x, y, _) in enumerate(turbine_positions(nturb, dx, dy, D, layout)):
+        row = dict(i=i, x=x, y=y, y_wake=y + WAKE_LENGTH*D, y_inside=-0.25+y)
+        for stem, fits in primitives.items():
+            for key, value in primitive_fields(fits[i]):
+                row[f"{stem}_{key}"] = format_value(value)
+        yield row
+
+
+def generate_snappy_geometry(nturb, dx, dy, D, stl_ext=".stl", merge_refinement=False, primitives=None, layout="line"):
+    """Returns the snappyHexMeshDict geometry entries, those of every turbine filled in while they are written
+
+    With merge_refinement the refinement-only surfaces are single files with
+    one region per turbine instead of one file per turbine. Surfaces listed in
+    primitives are declared as their fitted searchable box/cylinder instead.
     """
+    primitives = primitives or {}
+
+    # STL-based geometries
+    turbine = [(f"BladesAndHub_%(i)s{stl_ext}", FoamDict([("type", "triSurfaceMesh"), ("name", "BladesAndHub_%(i)s")]))]
+    if "BladeWakeRefinement" in primitives:
+        turbine.append(generate_primitive_geometry("BladeWakeRefinement_%(i)s", "BladeWakeRefinement", primitives["BladeWakeRefinement"]))
+    elif not merge_refinement:
+        turbine.append((f"BladeWakeRefinement_%(i)s{stl_ext}", FoamDict([("type", "triSurfaceMesh")])))
+    if not merge_refinement:
+        turbine.append((f"LeadingEdge_%(i)s{stl_ext}", FoamDict([("type", "triSurfaceMesh")])))
+        turbine.append((f"TipTrailingEdge_%(i)s{stl_ext}", FoamDict([("type", "triSurfaceMesh")])))
+    turbine.append((f"AMI_%(i)s{stl_ext}", FoamDict([
+        ("type", "triSurfaceMesh"),
+        ("name", "AMI_%(i)s"),
+        ("regions", FoamDict([("AMI", FoamDict([("name", "AMI_%(i)s")]))])),
+    ])))
+    if not merge_refinement:
+        turbine.append((f"AMI_Refinement_%(i)s{stl_ext}", FoamDict([("type", "triSurfaceMesh")])))
+    turbine.append(("Turb_WakeRefinement_%(i)s", FoamDict([
+        ("type", "searchableCylinder"),
+        ("point1", ("%(x)r", "%(y)r", 0)),
+        ("point2", ("%(x)r", "%(y_wake)r", 0.0)),
+        ("radius", WAKE_DIAMETER*D/2),
+    ])))
+
+    geometry = [Repeat(turbine, turbine_rows(nturb, dx, dy, D, layout, primitives))]
+    if merge_refinement:
+        for surface_name in ["BladeWakeRefinement", "LeadingEdge", "TipTrailingEdge", "AMI_Refinement"]:
+            if surface_name not in primitives:
+                geometry.append(generate_merged_geometry(surface_name, nturb, stl_ext=stl_ext))
     return geometry
 
 
-def generate_ref_reg(nturb):
-    """Called by generate_castellated_mesh. Creates refinement region subsection"""
-    refinement_regions = """
-    refinementRegions
-    {"""
-
-    for i in range(nturb):
-        refinement_regions += f"""
-        AMI_{i}
-        {{
-            mode inside;
-            levels ((1 4));
-        }}
-
-        LeadingEdge_{i}.stl
-        {{
-            mode inside;
-            levels ((1 5));
-        }}
-
-        TipTrailingEdge_{i}.stl
-        {{
-            mode inside;
-            levels ((1 9));
-        }}
-
-       Turb_WakeRefinement_{i}
-        {{
-            mode inside;
-            levels ((1 4));
-        }}
-        
-        BladeWakeRefinement_{i}.stl
-        {{
-            mode inside;
-            levels ((1 4));
-        }}
-        """
-    refinement_regions += """
-    }"""
-
-    return refinement_regions
-
-
-def generate_ref_surf(nturb, dx, dy, D):
-    """Called by generate_castellated_mesh. Creates refinement surfaces subsection"""
-
-    refinement_surfaces = """
-    refinementSurfaces
-    {"""
-
-    for i in range(nturb):
-        refinement_surfaces += f"""
-
-        AMI_{i}
-        {{
-            level (1 5);
-        
-            faceType boundary;
-            cellZone turbine_{i};
-            faceZone turbine_{i};
-            cellZoneInside insidePoint;
-            insidePoint ({dx*(i)*D} {-0.25+dy*D*(i)} -0.18);
-        }}
-        """
-        refinement_surfaces += f"""
-        BladesAndHub_{i}
-        {{
-            level (8 8);
-        }}
+def inside_region(level):
+    """Returns a refinement region refining everything inside it up to level"""
+    return FoamDict([("mode", "inside"), ("levels", FoamList([FoamList([1, level])]))])
 
-    """
-    refinement_surfaces += """
-    }"""
-    return refinement_surfaces
-
-
-def generate_features(nturb):
-    """Generate Explicit feature edge refinement"""
-    features = """
-    features
-    ("""
-
-    for i in range(nturb):
-        features += f"""
-        {{
-            file "BladesAndHub_{i}.eMesh";
-            level 4;
-        }}
-        
-        {{
-            file "AMI_Refinement_Additional_{i}.eMesh";
-            level 4;
-        }}
-        
-        {{
-            file "Features_{i}.eMesh";
-            level 6;
-        }}
-        
-        {{
-            file "HubRefinement_{i}.eMesh";
-            level 6;
-        }}
-"""
-
-    features += """
-    );"""
-
-    return features
-
-
-def generate_castellated_mesh(nturb, dx, dy, D):
-    """Generate casteallted mesh section: surface refinement and region refinement"""
-
-    # Refinement Parameters
-    castellated_mesh = ""
-
-    castellated_mesh += """
-
-castellatedMeshControls
-{    
-    maxLocalCells 10000000;
-    maxGlobalCells 40000000;
-    minRefinementCells 10;
-    maxLoadUnbalance 0.1;
-    nCellsBetweenLevels 3;
-    resolveFeatureAngle 20;
-    locationInMesh (2 10 0);
-    allowFreeStandingZoneFaces true;
-    """
 
-    castellated_mesh += generate_ref_surf(nturb, dx, dy, D)
-    castellated_mesh += "\n"
-    castellated_mesh += generate_ref_reg(nturb)
-    castellated_mesh += "\n"
-    castellated_mesh += generate_features(nturb)
+def generate_ref_reg(nturb, stl_ext=".stl", merge_refinement=False, primitives=None, max_level=0):
+    """Called by generate_castellated_mesh. Returns the refinement region entries"""
+    primitives = primitives or {}
+    region_levels = cap_levels(REGION_LEVELS, max_level)
 
-    castellated_mesh += """
-}
-"""
-    return castellated_mesh
+    turbine = [("AMI_%(i)s", inside_region(region_levels["AMI"]))]
+    if not merge_refinement:
+        turbine.append((f"LeadingEdge_%(i)s{stl_ext}", inside_region(region_levels["LeadingEdge"])))
+        turbine.append((f"TipTrailingEdge_%(i)s{stl_ext}", inside_region(region_levels["TipTrailingEdge"])))
+    turbine.append(("Turb_WakeRefinement_%(i)s", inside_region(region_levels["Turb_WakeRefinement"])))
+    if "BladeWakeRefinement" in primitives or not merge_refinement:
+        # Searchable primitives are named without the STL extension
+        blade_wake = "BladeWakeRefinement_%(i)s" if "BladeWakeRefinement" in primitives else f"BladeWakeRefinement_%(i)s{stl_ext}"
+        turbine.append((blade_wake, inside_region(region_levels["BladeWakeRefinement"])))
 
+    regions = [Repeat(turbine, (dict(i=i) for i in range(nturb)))]
+    if merge_refinement:
+        # One entry covers every turbine's region of the merged surface
+        regions.append((f"LeadingEdge{stl_ext}", inside_region(region_levels["LeadingEdge"])))
+        regions.append((f"TipTrailingEdge{stl_ext}", inside_region(region_levels["TipTrailingEdge"])))
+        if "BladeWakeRefinement" not in primitives:
+            regions.append((f"BladeWakeRefinement{stl_ext}", inside_region(region_levels["BladeWakeRefinement"])))
+    return regions
 
-def generate_snap_controls():
-    """generate snap control section of snappyHexMeshDict"""
-    snap_controls = """
-snapControls
-{
-    nSmoothPatch 2;
-    nSmoothInternal 30;
-    tolerance 5.0;
-    nSolveIter 400;
-    nRelaxIter 10;
-    nFeatureSnapIter 25;
-    implicitFeatureSnap false;
-    explicitFeatureSnap true;
-    multiRegionFeatureSnap true;
-}"""
-
-    return snap_controls
 
+def generate_ref_surf(nturb, dx, dy, D, max_level=0, layout="line"):
+    """Called by generate_castellated_mesh. Returns the refinement surface entries"""
+    surface_levels = cap_levels(SURFACE_LEVELS, max_level)
 
-def generate_addLayers(nturb):
-    """Generate AddLayersControls section of SnappyHexMeshDict"""
-    addLayers = """
-    
-addLayersControls
-{    
-    relativeSizes false;
-    layers
-    {
-"""
-
-    for i in range(nturb):
-        addLayers += f"""
-        BladesAndHub_{i}
-        {{
-            nSurfaceLayers 5;
-            expansionRatio 1.2;
-            firstLayerThickness 0.0001;
-            minThickness 0;
-            
-        }}
-        """
-
-    addLayers += """
-    }
-    
-    expansionRatio 1.2;
-    firstLayerThickness 0.0001;
-    minThickness 0;
-    nGrow 0;
-    featureAngle 180;
-    mergePatchFacesangle 60;
-    maxFaceThicknessRatio 50;
-    slipFeatureAngle 30;
-    layerTerminationAngle -180;
-    nRelaxIter 20;
-    nSmoothSurfaceNormals 12;
-    nSmoothNormals 5;
-    nSmoothThickness 10;
-    maxThicknessToMedialRatio 0.3;
-    minMedialAxisAngle 90;
-    concaveAngle 180;
-    nBufferCellsNoExtrude 0;
-    nLayerIter 60;
-}
-"""
-
-    return addLayers
+    turbine = [
+        ("AMI_%(i)s", FoamDict([
+            ("level", surface_levels["AMI"]),
+            ("faceType", "boundary"),
+            ("cellZone", "turbine_%(i)s"),
+            ("faceZone", "turbine_%(i)s"),
+            ("cellZoneInside", "insidePoint"),
+            ("insidePoint", ("%(x)r", "%(y_inside)r", -0.18)),
+        ])),
+        ("BladesAndHub_%(i)s", FoamDict([("level", surface_levels["BladesAndHub"])])),
+    ]
+    return [Repeat(turbine, turbine_rows(nturb, dx, dy, D, layout))]
 
 
-def generate_mesh_quality():
-    """Generates mesh quality section of SnappyHexMeshDict"""
-    meshQuality = """
-meshQualityControls
-{
-    maxNonOrtho 65;
-    maxBoundarySkewness 4;
-    maxInternalSkewness 4;
-    maxConcave 180;
-    minVol 1e-13;
-    minTetQuality -1;
-    minArea -1;
-    minTwist 0.01;
-    minDeterminant 0.01;
-    minFaceWeight 0.05;
-    minVolRatio 0.01;
-    minTriangleTwist -1;
-    nSmoothScale 4;
-    errorReduction 0.1;
-    relaxed
-    {
-        maxNonOrtho 60;
-    }
-}
-"""
-    return meshQuality
-
-
-def generate_snappy_hex_mesh_dict(nturb, dx, dy, diameter, output_folder):
-    """Generate snappyHexMeshDict for a multi-turbine setup."""
-    D = diameter
-    refinement_diameter = 1.2 * D
-    wake_region_length = 15 * D  # Example wake region length
+def feature_file(name, level):
+    """Returns a features list item refining the edges of an .eMesh file to level"""
+    return FoamDict([("file", f'"{name}.eMesh"'), ("level", level)])
+
 
-    # Create geometry and refinement region definitions
-    geometry = ""
-    refinement_regions = ""
+def generate_features(nturb, merge_refinement=False, max_level=0):
+    """Returns the explicit feature edge refinement list, the files of every turbine filled in while it is written"""
+    feature_levels = cap_levels(FEATURE_LEVELS, max_level)
 
-    snappyHexMeshDict = get_header_string("snappyHexMeshDict") + "\n"
+    turbine = [feature_file("BladesAndHub_%(i)s", feature_levels["BladesAndHub"])]
+    if not merge_refinement:
+        for name in ["AMI_Refinement_Additional", "Features", "HubRefinement"]:
+            turbine.append(feature_file(f"{name}_%(i)s", feature_levels[name]))
 
-    snappyHexMeshDict += get_snappy_preamble()
+    features = [Repeat(turbine, (dict(i=i) for i in range(nturb)))]
+    if merge_refinement:
+        for name in ["AMI_Refinement_Additional", "Features", "HubRefinement"]:
+            features.append(feature_file(name, feature_levels[name]))
+    return FoamList(features)
 
-    snappyHexMeshDict += generate_snappy_geometry(nturb=nturb, dx=dx, dy=dy, D=D)
 
-    snappyHexMeshDict += generate_castellated_mesh(nturb=nturb, dx=dx, dy=dy, D=D)
+def generate_castellated_mesh(nturb, dx, dy, D, stl_ext=".stl", merge_refinement=False, primitives=None, max_level=0, layout="line"):
+    """Returns the castellatedMeshControls: surface refinement and region refinement
+
+    A max_level > 0 lowers every finer refinement level to max_level.
+    """
+    return FoamDict([
+        ("maxLocalCells", MAX_LOCAL_CELLS),
+        ("maxGlobalCells", MAX_GLOBAL_CELLS),
+        ("minRefinementCells", 10),
+        ("maxLoadUnbalance", 0.1),
+        ("nCellsBetweenLevels", N_CELLS_BETWEEN_LEVELS),
+        ("resolveFeatureAngle", 20),
+        ("locationInMesh", (2, 10, 0)),
+        ("allowFreeStandingZoneFaces", True),
+        ("refinementSurfaces", FoamDict(generate_ref_surf(nturb, dx, dy, D, max_level=max_level, layout=layout))),
+        ("refinementRegions", FoamDict(generate_ref_reg(nturb, stl_ext=stl_ext, merge_refinement=merge_refinement, primitives=primitives,
+                                                        max_level=max_level))),
+        ("features", generate_features(nturb, merge_refinement=merge_refinement, max_level=max_level)),
+    ])
 
-    snappyHexMeshDict += generate_snap_controls()
 
-    snappyHexMeshDict += generate_addLayers(nturb=nturb)
+def generate_snap_controls():
+    """Returns the snapControls of snappyHexMeshDict"""
+    return FoamDict([
+        ("nSmoothPatch", 2),
+        ("nSmoothInternal", 30),
+        ("tolerance", 5.0),
+        ("nSolveIter", 400),
+        ("nRelaxIter", 10),
+        ("nFeatureSnapIter", 25),
+        ("implicitFeatureSnap", False),
+        ("explicitFeatureSnap", True),
+        ("multiRegionFeatureSnap", True),
+    ])
 
-    snappyHexMeshDict += generate_mesh_quality()
 
-    # SnappyHexMeshDict content
+def generate_addLayers(nturb):
+    """Returns the addLayersControls of snappyHexMeshDict, with one layers entry per turbine"""
+    layers = [Repeat([("BladesAndHub_%(i)s", FoamDict([
+        ("nSurfaceLayers", SURFACE_LAYERS["BladesAndHub"]),
+        ("expansionRatio", 1.2),
+        ("firstLayerThickness", 0.0001),
+        ("minThickness", 0),
+    ]))], (dict(i=i) for i in range(nturb)))]
+
+    return FoamDict([
+        ("relativeSizes", False),
+        ("layers", FoamDict(layers)),
+        ("expansionRatio", 1.2),
+        ("firstLayerThickness", 0.0001),
+        ("minThickness", 0),
+        ("nGrow", 0),
+        ("featureAngle", 180),
+        ("mergePatchFacesangle", 60),
+        ("maxFaceThicknessRatio", 50),
+        ("slipFeatureAngle", 30),
+        ("layerTerminationAngle", -180),
+        ("nRelaxIter", 20),
+        ("nSmoothSurfaceNormals", 12),
+        ("nSmoothNormals", 5),
+        ("nSmoothThickness", 10),
+        ("maxThicknessToMedialRatio", 0.3),
+        ("minMedialAxisAngle", 90),
+        ("concaveAngle", 180),
+        ("nBufferCellsNoExtrude", 0),
+        ("nLayerIter", 60),
+    ])
 
-    snappyHexMeshDict += """
 
-// ************************************************************************* //
-"""
+def generate_mesh_quality():
+    """Returns the meshQualityControls of snappyHexMeshDict"""
+    return FoamDict([
+        ("maxNonOrtho", 65),
+        ("maxBoundarySkewness", 4),
+        ("maxInternalSkewness", 4),
+        ("maxConcave", 180),
+        ("minVol", 1e-13),
+        ("minTetQuality", -1),
+        ("minArea", -1),
+        ("minTwist", 0.01),
+        ("minDeterminant", 0.01),
+        ("minFaceWeight", 0.05),
+        ("minVolRatio", 0.01),
+        ("minTriangleTwist", -1),
+        ("nSmoothScale", 4),
+        ("errorReduction", 0.1),
+        ("relaxed", FoamDict([("maxNonOrtho", 60)])),
+    ])
+
+
+def generate_snappy_hex_mesh_dict_body(nturb, dx, dy, D, stl_ext=".stl", merge_refinement=False, primitives=None, max_level=0, layout="line"):
+    """Returns the snappyHexMeshDict; the per-turbine entries are filled in while it is written"""
+    return FoamDict(get_snappy_preamble() + [
+        ("geometry", FoamDict(generate_snappy_geometry(nturb=nturb, dx=dx, dy=dy, D=D, stl_ext=stl_ext, merge_refinement=merge_refinement,
+                                                       primitives=primitives, layout=layout))),
+        ("castellatedMeshControls", generate_castellated_mesh(nturb=nturb, dx=dx, dy=dy, D=D, stl_ext=stl_ext, merge_refinement=merge_refinement,
+                                                              primitives=primitives, max_level=max_level, layout=layout)),
+        ("snapControls", generate_snap_controls()),
+        ("addLayersControls", generate_addLayers(nturb=nturb)),
+        ("meshQualityControls", generate_mesh_quality()),
+    ])
+
+
+def generate_snappy_hex_mesh_dict(nturb, dx, dy, diameter, output_folder, stl_ext=".stl", merge_refinement=False, primitives_file="", max_level=0,
+                                  layout="line"):
+    """Generate snappyHexMeshDict for a multi-turbine setup.
+
+    A max_level > 0 caps the refinement levels, e.g. to fit a cell budget (see mesh_estimate.fit_budget).
+    """
+    D = diameter
+    primitives = load_primitives(primitives_file)
 
-    # Write to file
+    # Write to file, streaming the per-turbine entries instead of building one string
     output_folder += "/system/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "snappyHexMeshDict")
-    with open(output_file, "w") as f:
-        f.write(snappyHexMeshDict)
+    write_foam_file(output_file, "snappyHexMeshDict", generate_snappy_hex_mesh_dict_body(nturb, dx, dy, D, stl_ext=stl_ext,
+                                                                                        merge_refinement=merge_refinement, primitives=primitives,
+                                                                                        max_level=max_level, layout=layout))
 
     print(f"(I) snappyHexMeshDict created at: {output_file}")
 
@@ -401,6 +336,11 @@ def main():
         dy=args.dy,
         diameter=args.diameter,
         output_folder=args.output_folder,
+        stl_ext=args.stl_ext,
+        merge_refinement=args.merge_refinement,
+        primitives_file=args.primitives,
+        max_level=args.max_level,
+        layout=args.layout,
     )
 
 
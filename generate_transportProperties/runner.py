@@ -1,6 +1,10 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import Dimensions, FoamDict, Tokens, write_foam_file
+
 def get_options():
     """
     Parse command-line arguments.
@@ -10,51 +14,19 @@ def get_options():
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-    return header_string
-
-
 def generate_tran_prop(output_folder):
     """
     Generates transport properties dict
     """
     output_folder += "/constant/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "transportProperties")
 
-    tran_prop_content = get_header_string("transportProperties")
-
-    tran_prop_content += """
-
-transportModel  Newtonian;
-
-nu              nu [ 0 2 -1 0 0 0 0 ] 1.516e-05;
-
-// ************************************************************************* //
-
-
-"""
+    transportProperties = FoamDict([
+        ("transportModel", "Newtonian"),
+        ("nu", Tokens(["nu", Dimensions([0, 2, -1, 0, 0, 0, 0]), 1.516e-05])),
+    ], key_width=16)
 
-    with open(output_file, "w") as file:
-        file.write(tran_prop_content)
+    write_foam_file(output_file, "transportProperties", transportProperties)
 
     print(f"(I) transportProperties created at: {output_file}")
 
@@ -1,6 +1,10 @@
 import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import FoamDict, write_foam_file
+
 def get_options():
     """
     Parse command-line arguments.
@@ -10,59 +14,23 @@ def get_options():
     return parser.parse_args()
 
 
-def get_header_string(dictName):
-    """Returns a string with the OpenFOAM dict header using the input dictionary name"""
-
-    header_string = f"""/*--------------------------------*- C++ -*----------------------------------*\\
-| =========                 |                                                 |
-| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
-|  \\\\    /   O peration     | Version:  v2312                                 |
-|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
-|    \\\\/     M anipulation  |                                                 |
-\\*---------------------------------------------------------------------------*/
-FoamFile
-{{
-    version     2.0;
-    format      ascii;
-    class       dictionary;
-    object      {dictName};
-}}
-// ************************************************************************* //
-"""
-    return header_string
-
-
 def generate_turb_prop(output_folder):
     """
     Generates turbulence properties dict
     """
     output_folder += "/constant/"
-    os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, "turbulenceProperties")
 
-    tur_prop_content = get_header_string("turbulenceProperties")
-
-    tur_prop_content += """
-
-simulationType      RAS;
-
-RAS
-{
-    RASModel        kOmegaSST;
-
-    turbulence      on;
-
-    printCoeffs     on;
-}
-
-
-// ************************************************************************* //
-
-
-"""
+    turbulenceProperties = FoamDict([
+        ("simulationType", "RAS"),
+        ("RAS", FoamDict([
+            ("RASModel", "kOmegaSST"),
+            ("turbulence", "on"),
+            ("printCoeffs", "on"),
+        ], key_width=16)),
+    ], key_width=20)
 
-    with open(output_file, "w") as file:
-        file.write(tur_prop_content)
+    write_foam_file(output_file, "turbulenceProperties", turbulenceProperties)
 
     print(f"(I) turbulenceProperties created at: {output_file}")
 
@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import marshal
+import cProfile
+from foam_writer import write_blocks
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+REPORT_FIELDS = ["stage", "status", "wall_s", "cpu_s", "peak_rss_mb", "files", "bytes_written"]
+
+
+def _children_cpu():
+    """CPU seconds of the finished child processes, e.g. prepare_geometry's --jobs pool"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB, 0 where unknown."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(run, profile_file=""):
+    """Calls run() and returns its result with the wall time, CPU time and peak RSS it took.
+
+    CPU time is that of the calling thread plus child processes that finished
+    meanwhile; peak RSS is the process high-water mark after the call, so with
+    concurrent stages it bounds rather than isolates a stage's memory.
+    With a profile_file the call runs under cProfile and the stats are written
+    there, like the report, through the output backend of its case folder
+    (see case_output); only one such call may run at a time in a process.
+    """
+    profiler = cProfile.Profile() if profile_file else None
+    children = _children_cpu()
+    cpu = time.thread_time()
+    wall = time.perf_counter()
+
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = run()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            # What Profile.dump_stats writes, sent to the case's output backend
+            profiler.create_stats()
+            write_blocks(profile_file, [marshal.dumps(profiler.stats)], binary=True)
+
+    metrics = {
+        "wall_s": round(time.perf_counter() - wall, 6),
+        "cpu_s": round(time.thread_time() - cpu + _children_cpu() - children, 6),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    return result, metrics
+
+
+def write_report(output_folder, records, name="pipeline_report"):
+    """Writes the stage records as <name>.json and <name>.csv in output_folder; returns the JSON path."""
+    json_file = os.path.join(output_folder, f"{name}.json")
+    write_blocks(json_file, [json.dumps(records, indent=1)])
+
+    table = io.StringIO(newline="")
+    writer = csv.DictWriter(table, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(records)
+    write_blocks(os.path.join(output_folder, f"{name}.csv"), [table.getvalue()])
+
+    return json_file
@@ -0,0 +1,340 @@
+import os
+import math
+import argparse
+import numpy as np
+from pipeline import load_runner
+from turbine_layout import WAKE_DIAMETER, WAKE_LENGTH, farm_domain
+
+
+# Rough memory per cell of snappyHexMesh at its refinement peak and of the
+# pimpleFoam solve, and the cells per core the solver and snappyHexMesh
+# (which scales worse) still run well with
+SNAPPY_BYTES_PER_CELL = 2000
+SOLVER_BYTES_PER_CELL = 1000
+CELLS_PER_CORE = 50000
+MESH_CELLS_PER_CORE = 200000
+
+# Background resolutions (max_cells) fit_budget searches
+MAX_CELLS_RANGE = (50, 1000)
+
+
+def _surface_item(name, kind, level, surface, volume):
+    """An item of refinement_items from a parsed STL"""
+    triangles = surface.triangles()
+    area = 0.5 * np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1).sum()
+    points = np.asarray(surface.points)
+    return dict(name=name, kind=kind, level=level, volume=abs(volume), area=float(area), length=0.0,
+                lo=points.min(axis=0), hi=points.max(axis=0))
+
+
+def refinement_items(stl_folder, diameter, cache_dir=None):
+    """Returns the refinement regions, surfaces and feature edges of one turbine, and the STLs not found.
+
+    Each item is a dict with its kind ("region", "surface" or "feature"), its
+    snappyHexMeshDict level, the volume a region encloses, the area of a region
+    or surface, the length of a feature's edges, and its bounding box lo/hi, all
+    at turbine 0; the other turbines are copies. The levels are the ones
+    generate_snappyhexmeshdict writes.
+    """
+    snappy = load_runner("generate_snappyhexmeshdict")
+    load_runner("prepare_geometry")
+    from stl_cache import load_surface
+    from stl_fit import enclosed_volume
+    from stl_features import extract_features
+
+    surfaces = {}
+    missing = []
+
+    def surface(stem):
+        if stem not in surfaces:
+            path = os.path.join(stl_folder, f"{stem}.stl")
+            surfaces[stem] = load_surface(path, cache_dir=cache_dir) if os.path.exists(path) else None
+            if surfaces[stem] is None:
+                missing.append(f"{stem}.stl")
+        return surfaces[stem]
+
+    items = []
+    for stem, level in snappy.REGION_LEVELS.items():
+        if stem == "Turb_WakeRefinement":
+            radius = WAKE_DIAMETER * diameter / 2
+            length = WAKE_LENGTH * diameter
+            items.append(dict(name=stem, kind="region", level=level, volume=math.pi * radius ** 2 * length,
+                              area=2 * math.pi * radius * (length + radius), length=0.0,
+                              lo=np.array([-radius, 0.0, -radius]), hi=np.array([radius, length, radius])))
+        elif surface(stem) is not None:
+            items.append(_surface_item(stem, "region", level, surfaces[stem], enclosed_volume(surfaces[stem])))
+
+    for stem, (_, level) in snappy.SURFACE_LEVELS.items():
+        if surface(stem) is not None:
+            items.append(_surface_item(stem, "surface", level, surfaces[stem], 0.0))
+
+    for stem, level in snappy.FEATURE_LEVELS.items():
+        if surface(stem) is not None:
+            features = extract_features(surfaces[stem])
+            segments = features.points[features.edges]
+            items.append(dict(name=stem, kind="feature", level=level, volume=0.0, area=0.0,
+                              length=float(np.linalg.norm(segments[:, 1] - segments[:, 0], axis=1).sum()),
+                              lo=features.points.min(axis=0) if len(features.points) else np.zeros(3),
+                              hi=features.points.max(axis=0) if len(features.points) else np.zeros(3)))
+
+    return items, sorted(missing)
+
+
+def _containers(items):
+    """Returns, per item, the index of the smallest item whose box holds its centre at a level not above its own, -1 for none"""
+    level = np.array([item["level"] for item in items])
+    lo = np.array([item["lo"] for item in items]).reshape(-1, 3)
+    hi = np.array([item["hi"] for item in items]).reshape(-1, 3)
+    box = np.prod(hi - lo, axis=1)
+    centre = (lo + hi) / 2
+
+    # inside[c, j]: item c can hold item j
+    inside = np.all((lo[:, None] <= centre[None]) & (centre[None] <= hi[:, None]), axis=2)
+    inside &= (level[:, None] <= level[None]) & (box[:, None] > 0)
+    inside &= (box[:, None] > box[None]) | ((box[:, None] == box[None]) & (level[:, None] < level[None]))
+    np.fill_diagonal(inside, False)
+
+    candidates = np.where(inside, box[:, None], np.inf)
+    return np.where(inside.any(axis=0), candidates.argmin(axis=0), -1)
+
+
+def level_volumes(items, cell_size):
+    """Returns the volume of one turbine refined to each level, the base level 0 holding the volume taken from it.
+
+    An octree estimate: a region holds its enclosed volume at its level, a
+    surface a band two cells thick and a feature a square tube two cells wide.
+    Every item is wrapped in nCellsBetweenLevels cells of each coarser level
+    down to the level of the item holding it, whose own volume shrinks by
+    whatever it holds. Entry 0 is the (positive) volume the turbine takes from
+    the background mesh.
+    """
+    snappy = load_runner("generate_snappyhexmeshdict")
+    n_levels = max([item["level"] for item in items], default=0) + 1
+    h = cell_size / 2.0 ** np.arange(n_levels)
+    buffer = snappy.N_CELLS_BETWEEN_LEVELS * h
+    container = _containers(items) if items else np.zeros(0, dtype=int)
+
+    volumes = np.zeros((len(items), n_levels))
+    for i, item in enumerate(items):
+        L = item["level"]
+        width = 2 * h[L]
+        if item["kind"] == "region":
+            volumes[i, L] = item["volume"]
+            shells = item["area"] * buffer
+        elif item["kind"] == "surface":
+            volumes[i, L] = item["area"] * width
+            shells = 2 * item["area"] * buffer
+        else:
+            volumes[i, L] = item["length"] * width ** 2
+            shells = item["length"] * (4 * width * buffer + 4 * buffer ** 2)
+        floor = items[container[i]]["level"] if container[i] >= 0 else 0
+        volumes[i, floor + 1:L] = shells[floor + 1:L]
+
+    footprint = volumes.sum(axis=1)
+    for i in range(len(items)):
+        c = container[i]
+        if c >= 0:
+            volumes[c, items[c]["level"]] -= footprint[i]
+    volumes = np.maximum(volumes, 0.0)
+
+    per_level = volumes.sum(axis=0)
+    per_level[0] = sum(footprint[i] for i in range(len(items)) if container[i] < 0)
+    return per_level
+
+
+def estimate_cells(items, domain, max_cells, core_margin=0, max_level=0):
+    """Returns the estimated cells per refinement level (index 0 the background mesh) and the layer cells.
+
+    domain is the turbine_layout.farm_domain the background mesh spans.
+    With core_margin the background mesh is the graded one of generate_blockMeshDict,
+    whose core, built around the same STLs and wake the items come from, holds
+    every refinement at the uniform cell size. A max_level > 0
+    caps the levels as generate_snappy_hex_mesh_dict does.
+    """
+    snappy = load_runner("generate_snappyhexmeshdict")
+    if max_level:
+        items = [dict(item, level=min(item["level"], max_level)) for item in items]
+    blockmesh = load_runner("generate_blockmeshdict")
+    nturb = len(domain["positions"])
+    cell_size = blockmesh.block_mesh_size(domain, max_cells)["cell_size"]
+    background = blockmesh.block_mesh_cells(domain, max_cells, core_margin)
+
+    per_level = level_volumes(items, cell_size)
+    cells = nturb * per_level / (cell_size / 2.0 ** np.arange(len(per_level))) ** 3
+    cells[0] = max(background - nturb * per_level[0] / cell_size ** 3, 0.0)
+
+    layers = 0.0
+    for item in items:
+        if item["kind"] == "surface" and item["name"] in snappy.SURFACE_LAYERS:
+            layers += nturb * snappy.SURFACE_LAYERS[item["name"]] * item["area"] / (cell_size / 2.0 ** item["level"]) ** 2
+    return cells, layers
+
+
+def estimate_mesh(nturb, dx, dy, diameter, max_cells, n_subdomains, stl_folder="Geometry", cache_dir=None, cells_per_core=CELLS_PER_CORE,
+                  core_margin=0, max_level=0, layout="line", margins=None, mesh_subdomains=0):
+    """Estimates the snappyHexMesh cell count, the memory per rank and the core count of a case, before any meshing.
+
+    snappyHexMesh runs on mesh_subdomains ranks, 0 for n_subdomains.
+    """
+    snappy = load_runner("generate_snappyhexmeshdict")
+    items, missing = refinement_items(stl_folder, diameter, cache_dir=cache_dir)
+    domain = farm_domain(nturb, dx, dy, diameter, layout, stl_folder, cache_dir, margins)
+    cells, layers = estimate_cells(items, domain, max_cells, core_margin, max_level)
+    total = float(cells.sum() + layers)
+    cells_per_rank = total / n_subdomains
+    mesh_subdomains = mesh_subdomains or n_subdomains
+    return dict(
+        cells_per_level=[int(round(n)) for n in cells],
+        layer_cells=int(round(layers)),
+        total_cells=int(round(total)),
+        n_subdomains=n_subdomains,
+        cells_per_rank=int(round(cells_per_rank)),
+        mesh_subdomains=mesh_subdomains,
+        mesh_cells_per_rank=int(round(total / mesh_subdomains)),
+        snappy_mb_per_rank=total / mesh_subdomains * SNAPPY_BYTES_PER_CELL / 1e6,
+        solver_mb_per_rank=cells_per_rank * SOLVER_BYTES_PER_CELL / 1e6,
+        recommended_cores=max(math.ceil(total / cells_per_core), math.ceil(total / snappy.MAX_LOCAL_CELLS), 1),
+        cells_per_core=cells_per_core,
+        missing=missing,
+    )
+
+
+def estimate_case(case):
+    """estimate_mesh for the runner_all.py parameters of a case."""
+    return estimate_mesh(case["nturb"], case["dx"], case["dy"], case["diameter"], case["max_cells"], case["n_subdomains"],
+                         stl_folder=case.get("stl_folder", "Geometry"), cache_dir=case.get("cache_dir", ".geometry_cache"),
+                         cells_per_core=case.get("cells_per_core") or CELLS_PER_CORE,
+                         core_margin=case.get("core_margin", 0), max_level=case.get("max_level", 0),
+                         layout=case.get("layout", "line"), margins=case.get("domain_margins"),
+                         mesh_subdomains=case.get("mesh_subdomains", 0))
+
+
+def fit_budget(items, domain, budget, core_margin=0, max_cells_range=MAX_CELLS_RANGE):
+    """Returns the max_cells and max_level (0 for the full levels) whose estimated mesh best fills budget cells.
+
+    The finest background resolution within max_cells_range whose estimate
+    stays within the budget wins, by bisection, as the estimate grows with
+    max_cells. Only when even the coarsest background is over budget are the
+    finest refinement levels capped, one level at a time.
+    """
+    def total(max_cells, max_level):
+        cells, layers = estimate_cells(items, domain, max_cells, core_margin, max_level)
+        return cells.sum() + layers
+
+    lo, hi = max_cells_range
+    finest = max([item["level"] for item in items], default=0)
+    for max_level in [0] + list(range(finest - 1, 0, -1)):
+        if total(lo, max_level) > budget:
+            continue
+        if total(hi, max_level) <= budget:
+            return hi, max_level
+        low, high = lo, hi
+        while high - low > 1:
+            middle = (low + high) // 2
+            if total(middle, max_level) <= budget:
+                low = middle
+            else:
+                high = middle
+        return low, max_level
+    raise Exception(f"ERROR: no background resolution of at least {lo} cells and refinement level meets a budget of {budget} cells")
+
+
+def fit_case(case):
+    """Returns case with max_cells and max_level fitted to its cell budget, or case itself without one.
+
+    The budget is cell_budget cells or, with cores > 0, cells_per_core cells on
+    each of cores cores.
+    """
+    if case.get("cell_budget", 0) > 0:
+        budget = case["cell_budget"]
+    elif case.get("cores", 0) > 0:
+        budget = case["cores"] * (case.get("cells_per_core") or CELLS_PER_CORE)
+    else:
+        return case
+
+    stl_folder, cache_dir = case.get("stl_folder", "Geometry"), case.get("cache_dir", ".geometry_cache")
+    items, _ = refinement_items(stl_folder, case["diameter"], cache_dir=cache_dir)
+    domain = farm_domain(case["nturb"], case["dx"], case["dy"], case["diameter"], case.get("layout", "line"), stl_folder, cache_dir,
+                         case.get("domain_margins"))
+    max_cells, max_level = fit_budget(items, domain, budget, case.get("core_margin", 0))
+    print(f"(I) Cell budget {budget:,}: max_cells={max_cells}, " + (f"refinement capped at level {max_level}" if max_level else "full refinement levels"))
+    return dict(case, max_cells=max_cells, max_level=max_level)
+
+
+def fit_subdomains(case):
+    """Returns case with n_subdomains and mesh_subdomains chosen from its estimated mesh, or case itself without node_cores.
+
+    Both are multiples of node_cores whose ranks hold closest to
+    cells_per_core cells when solving and mesh_cells_per_core when meshing.
+    """
+    if case.get("node_cores", 0) <= 0:
+        return case
+
+    decompose = load_runner("generate_decomposepardict")
+    total = estimate_case(case)["total_cells"]
+    n_subdomains = decompose.subdomain_count(total, case.get("cells_per_core") or CELLS_PER_CORE, case["node_cores"])
+    mesh_subdomains = decompose.subdomain_count(total, case.get("mesh_cells_per_core") or MESH_CELLS_PER_CORE, case["node_cores"])
+    print(f"(I) Subdomains for {total:,} cells on {case['node_cores']}-core nodes: {mesh_subdomains} meshing, {n_subdomains} solving")
+    return dict(case, n_subdomains=n_subdomains, mesh_subdomains=mesh_subdomains)
+
+
+def print_estimate(estimate):
+    """Prints an estimate_mesh report and warns about the snappyHexMeshDict cell limits it breaks."""
+    snappy = load_runner("generate_snappyhexmeshdict")
+    print(f"(I) Estimated mesh: {estimate['total_cells']:,} cells")
+    for level, cells in enumerate(estimate["cells_per_level"]):
+        if cells:
+            print(f"    (II) level {level}: {cells:,} cells")
+    if estimate["layer_cells"]:
+        print(f"    (II) layers: {estimate['layer_cells']:,} cells")
+    print(f"    (II) Meshing on {estimate['mesh_subdomains']} ranks: {estimate['mesh_cells_per_rank']:,} cells, "
+          f"{estimate['snappy_mb_per_rank']:.0f} MB snappyHexMesh peak per rank")
+    print(f"    (II) Solving on {estimate['n_subdomains']} ranks: {estimate['cells_per_rank']:,} cells, "
+          f"{estimate['solver_mb_per_rank']:.0f} MB solver per rank")
+    print(f"    (II) Recommended cores: {estimate['recommended_cores']} ({estimate['cells_per_core']:,} cells per core)")
+
+    for stl_file in estimate["missing"]:
+        print(f"Warning: {stl_file} not found, its refinement is not counted")
+    if estimate["total_cells"] > snappy.MAX_GLOBAL_CELLS:
+        print(f"Warning: {estimate['total_cells']:,} cells exceed maxGlobalCells {snappy.MAX_GLOBAL_CELLS}, snappyHexMesh will stop refining early")
+    if estimate["mesh_cells_per_rank"] > snappy.MAX_LOCAL_CELLS:
+        print(f"Warning: {estimate['mesh_cells_per_rank']:,} cells per meshing rank exceed maxLocalCells {snappy.MAX_LOCAL_CELLS}")
+
+
+def get_options():
+    """Parse and return command-line options."""
+    parser = argparse.ArgumentParser(description="Estimate the snappyHexMesh cell count, memory and core count of a wind farm case.")
+    parser.add_argument("--nturb", type=int, required=True, help="Number of turbines.")
+    parser.add_argument("--dx", type=float, required=True, help="Downstream spacing as a multiple of turbine diameter.")
+    parser.add_argument("--dy", type=float, required=True, help="Crosswind spacing as a multiple of turbine diameter.")
+    parser.add_argument("--diameter", type=float, required=True, help="Turbine diameter (in meters).")
+    parser.add_argument("--max_cells", type=int, default=0, help="Maximum number of cells in the largest dimension.")
+    parser.add_argument("--cell_budget", type=int, default=0, help="Fit max_cells (and max_level if needed) to this total cell count instead.")
+    parser.add_argument("--cores", type=int, default=0, help="Fit max_cells to cells_per_core cells on each of this many cores instead.")
+    parser.add_argument("--core_margin", type=float, default=0, help="Core margin of a graded background mesh (generate_blockmeshdict --core_margin).")
+    parser.add_argument("--max_level", type=int, default=0, help="Refinement level cap (generate_snappyhexmeshdict --max_level).")
+    parser.add_argument("--layout", type=str, default="line", choices=["line", "staggered"], help="Turbine layout (see turbine_layout.turbine_positions).")
+    parser.add_argument("--n_subdomains", type=int, default=570, help="Number of processors the case is solved on.")
+    parser.add_argument("--mesh_subdomains", type=int, default=0, help="Number of processors the case is meshed on, 0 for n_subdomains.")
+    parser.add_argument("--node_cores", type=int, default=0, help="Choose both subdomain counts as multiples of this many cores per node instead.")
+    parser.add_argument("--mesh_cells_per_core", type=int, default=MESH_CELLS_PER_CORE, help="Cells per meshing rank the chosen mesh_subdomains aims at.")
+    parser.add_argument("--stl_folder", type=str, default="Geometry", help="Path to folder containing the base STL files.")
+    parser.add_argument("--cache_dir", type=str, default=".geometry_cache", help="Cache of parsed STL files shared with prepare_geometry.")
+    parser.add_argument("--cells_per_core", type=int, default=CELLS_PER_CORE, help="Cells per core the recommended core count and the chosen n_subdomains aim at.")
+    return parser.parse_args()
+
+
+def main():
+    args = get_options()
+    case = dict(nturb=args.nturb, dx=args.dx, dy=args.dy, diameter=args.diameter, max_cells=args.max_cells, max_level=args.max_level,
+                n_subdomains=args.n_subdomains, stl_folder=args.stl_folder, cache_dir=args.cache_dir, cells_per_core=args.cells_per_core,
+                core_margin=args.core_margin, layout=args.layout, cell_budget=args.cell_budget, cores=args.cores,
+                mesh_subdomains=args.mesh_subdomains, node_cores=args.node_cores, mesh_cells_per_core=args.mesh_cells_per_core)
+    case = fit_case(case)
+    if case["max_cells"] <= 0:
+        raise Exception("ERROR: give --max_cells, or --cell_budget or --cores to fit it")
+    print_estimate(estimate_case(fit_subdomains(case)))
+
+
+if __name__ == "__main__":
+    main()
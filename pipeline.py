@@ -0,0 +1,587 @@
+import os
+import sys
+import ast
+import json
+import hashlib
+import threading
+import contextlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from artifact_store import ArtifactStore, clear_outputs
+from instrumentation import measure, write_report
+from case_output import on_disk, output_sizes, output_to
+
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# runner.py modules already imported, keyed on their folder
+_runners = {}
+_runner_locks = {}
+_runners_lock = threading.Lock()
+
+# Per-case record of the key each stage last ran with, see stage_key
+MANIFEST_NAME = ".build_manifest.json"
+
+# Types the generators' argparse options give each case parameter, so
+# in-process values print exactly as they do through the command line
+PARAMETER_TYPES = {
+    "nturb": int,
+    "dx": float,
+    "dy": float,
+    "diameter": float,
+    "max_cells": int,
+    "core_margin": float,
+    "max_level": int,
+    "cell_budget": int,
+    "cores": int,
+    "cells_per_core": int,
+    "n_subdomains": int,
+    "mesh_subdomains": int,
+    "node_cores": int,
+    "mesh_cells_per_core": int,
+    "rps": float,
+    "vel": float,
+    "p": float,
+    "omega": float,
+    "k": float,
+    "nut": float,
+    "jobs": int,
+    "compress_level": int,
+    "decimate_cell_size": float,
+    "fit_tolerance": float,
+    "feature_angle": float,
+}
+
+
+def load_runner(folder):
+    """Imports <repo>/<folder>/runner.py once as module <folder>_runner, with its folder on sys.path for sibling imports."""
+    # One lock per folder, so a slow import (numpy in prepare_geometry) does not hold up the others
+    with _runners_lock:
+        lock = _runner_locks.setdefault(folder, threading.Lock())
+    with lock:
+        if folder not in _runners:
+            _runners[folder] = _import_runner(folder)
+        return _runners[folder]
+
+
+def _import_runner(folder):
+    """Executes <repo>/<folder>/runner.py as a new module"""
+    module_dir = os.path.join(REPO_ROOT, folder)
+    if module_dir not in sys.path:
+        sys.path.insert(0, module_dir)
+    spec = importlib.util.spec_from_file_location(f"{folder}_runner", os.path.join(module_dir, "runner.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def normalize_case(case):
+    """Returns a copy of case with every parameter cast to its command-line type."""
+    return {key: PARAMETER_TYPES[key](value) if key in PARAMETER_TYPES else value for key, value in case.items()}
+
+
+def stl_ext(case):
+    """Returns the extension of the turbine surfaces written for a case."""
+    return ".stl.gz" if case.get("compress_level", 0) else ".stl"
+
+
+def primitives_file(case):
+    """Returns the searchablePrimitives.json written for a case, or "" when fitting is off."""
+    return os.path.join(case["output_folder"], "searchablePrimitives.json") if case.get("fit_tolerance", 0) else ""
+
+
+def stage_prepare_geometry(case):
+    load_runner("prepare_geometry").copy_stls(
+        stl_folder=case.get("stl_folder", "Geometry"),
+        output_folder=os.path.join(case["output_folder"], ""),
+        nturb=case["nturb"],
+        dx=case["dx"],
+        dy=case["dy"],
+        diameter=case["diameter"],
+        stl_format=case.get("stl_format", "ascii"),
+        cache_dir=case.get("cache_dir", ".geometry_cache"),
+        jobs=case.get("jobs", 1),
+        compress_level=case.get("compress_level", 0),
+        merge_refinement=case.get("merge_refinement", False),
+        decimate_cell_size=case.get("decimate_cell_size", 0),
+        fit_tolerance=case.get("fit_tolerance", 0),
+        feature_angle=case.get("feature_angle", 0),
+        layout=case.get("layout", "line"),
+    )
+
+
+def stage_blockmeshdict(case):
+    load_runner("generate_blockmeshdict").generate_blockMeshDict(
+        nturb=case["nturb"],
+        dx=case["dx"],
+        dy=case["dy"],
+        diameter=case["diameter"],
+        max_cells=case["max_cells"],
+        output_folder=case["output_folder"],
+        core_margin=case.get("core_margin", 0),
+        layout=case.get("layout", "line"),
+        stl_folder=case.get("stl_folder", "Geometry"),
+        cache_dir=case.get("cache_dir", ".geometry_cache"),
+        margins=case.get("domain_margins"),
+    )
+
+
+def stage_decomposepardict(case):
+    load_runner("generate_decomposepardict").generate_decomposeParDict(
+        os.path.join(case["output_folder"], ""), case["n_subdomains"], case.get("mesh_subdomains", 0)
+    )
+
+
+def stage_snappyhexmeshdict(case):
+    load_runner("generate_snappyhexmeshdict").generate_snappy_hex_mesh_dict(
+        nturb=case["nturb"],
+        dx=case["dx"],
+        dy=case["dy"],
+        diameter=case["diameter"],
+        output_folder=case["output_folder"],
+        stl_ext=stl_ext(case),
+        merge_refinement=case.get("merge_refinement", False),
+        primitives_file=primitives_file(case),
+        max_level=case.get("max_level", 0),
+        layout=case.get("layout", "line"),
+    )
+
+
+def stage_dynamicmeshdict(case):
+    load_runner("generate_dynamicmeshdict").generate_dynamicmeshdict(
+        nturb=case["nturb"],
+        dx=case["dx"],
+        dy=case["dy"],
+        rps=case["rps"],
+        output_folder=case["output_folder"],
+        diameter=case["diameter"],
+        layout=case.get("layout", "line"),
+    )
+
+
+def stage_turbulence_properties(case):
+    load_runner("generate_turbulence_properties").generate_turb_prop(case["output_folder"])
+
+
+def stage_transport_properties(case):
+    load_runner("generate_transportProperties").generate_tran_prop(case["output_folder"])
+
+
+def stage_createpatchdict(case):
+    load_runner("generate_createpatchdict").generate_createpatchdict(nturb=case["nturb"], output_folder=case["output_folder"])
+
+
+def stage_feature_extract(case):
+    # prepare_geometry already wrote the .eMesh files
+    if case.get("feature_angle", 0):
+        return
+    load_runner("generate_feature_extract").generate_surf_feat_ext_dict(
+        nturb=case["nturb"],
+        output_folder=case["output_folder"],
+        stl_ext=stl_ext(case),
+        merge_refinement=case.get("merge_refinement", False),
+    )
+
+
+def stage_fvfiles(case):
+    fv_files = load_runner("generate_fvFiles")
+    fv_files.generate_fvSolution(case["output_folder"])
+    fv_files.generate_fvSchemes(case["output_folder"])
+
+
+def stage_bc(case):
+    bc = load_runner("generate_bc")
+    bc.generate_U(nturb=case["nturb"], vel=case["vel"], output_folder=case["output_folder"])
+    bc.generate_p(nturb=case["nturb"], p=case["p"], output_folder=case["output_folder"])
+    bc.generate_omega(nturb=case["nturb"], omega=case["omega"], output_folder=case["output_folder"])
+    bc.generate_k(nturb=case["nturb"], k=case["k"], output_folder=case["output_folder"])
+    bc.generate_nut(nturb=case["nturb"], nut=case["nut"], output_folder=case["output_folder"])
+
+
+def stage_controldict(case):
+    load_runner("generate_controldict").generate_controldict(case["output_folder"])
+
+
+def geometry_sources(case):
+    """Returns the absolute paths of the base STL files prepare_geometry reads."""
+    stl_folder = os.path.abspath(case.get("stl_folder", "Geometry"))
+    if not os.path.isdir(stl_folder):
+        return []
+    return [os.path.join(stl_folder, name) for name in sorted(os.listdir(stl_folder)) if name.endswith(".stl")]
+
+
+class Stage:
+    """A generator stage: the case parameters its output depends on and the files it reads and writes.
+
+    inputs and outputs are functions of the case returning paths relative to
+    its output_folder (absolute paths stay as they are); a folder output
+    covers every file below it. folder holds the generator's code.
+    """
+
+    __slots__ = ("name", "folder", "run", "parameters", "inputs", "outputs")
+
+    def __init__(self, name, folder, run, parameters, outputs, inputs=lambda case: []):
+        self.name = name
+        self.folder = folder
+        self.run = run
+        self.parameters = parameters
+        self.outputs = outputs
+        self.inputs = inputs
+
+
+# Generator stages in the order runner_all.py has always run them, which is a
+# valid serial order of the dependency graph
+STAGES = [
+    Stage(
+        "prepare_geometry", "prepare_geometry", stage_prepare_geometry,
+        ["nturb", "dx", "dy", "diameter", "stl_format", "compress_level",
+         "merge_refinement", "decimate_cell_size", "fit_tolerance", "feature_angle", "layout"],
+        outputs=lambda case: [os.path.join("constant", "triSurface"), *(["searchablePrimitives.json"] if primitives_file(case) else [])],
+        inputs=geometry_sources,
+    ),
+    Stage(
+        "blockmeshdict", "generate_blockmeshdict", stage_blockmeshdict,
+        ["nturb", "dx", "dy", "diameter", "max_cells", "core_margin", "layout", "domain_margins"],
+        outputs=lambda case: [os.path.join("system", "blockMeshDict")],
+        inputs=geometry_sources,
+    ),
+    Stage(
+        "decomposepardict", "generate_decomposepardict", stage_decomposepardict,
+        ["n_subdomains", "mesh_subdomains"],
+        outputs=lambda case: [os.path.join("system", "decomposeParDict"), os.path.join("system", "decomposeParDict.mesh")],
+    ),
+    Stage(
+        "snappyhexmeshdict", "generate_snappyhexmeshdict", stage_snappyhexmeshdict,
+        ["nturb", "dx", "dy", "diameter", "compress_level", "merge_refinement", "fit_tolerance", "max_level", "layout"],
+        outputs=lambda case: [os.path.join("system", "snappyHexMeshDict")],
+        inputs=lambda case: ["searchablePrimitives.json"] if primitives_file(case) else [],
+    ),
+    Stage(
+        "dynamicmeshdict", "generate_dynamicmeshdict", stage_dynamicmeshdict,
+        ["nturb", "dx", "dy", "rps", "diameter", "layout"],
+        outputs=lambda case: [os.path.join("constant", "dynamicMeshDict")],
+    ),
+    Stage(
+        "turb_prop", "generate_turbulence_properties", stage_turbulence_properties,
+        [],
+        outputs=lambda case: [os.path.join("constant", "turbulenceProperties")],
+    ),
+    Stage(
+        "tran_prop", "generate_transportProperties", stage_transport_properties,
+        [],
+        outputs=lambda case: [os.path.join("constant", "transportProperties")],
+    ),
+    Stage(
+        "createpatch", "generate_createpatchdict", stage_createpatchdict,
+        ["nturb"],
+        outputs=lambda case: [os.path.join("system", "createPatchDict")],
+    ),
+    Stage(
+        "surf_feat_ext", "generate_feature_extract", stage_feature_extract,
+        ["nturb", "compress_level", "merge_refinement", "feature_angle"],
+        # Declared with feature_angle too, when the stage writes nothing: the
+        # dictionaries of an earlier run without it are then cleared
+        outputs=lambda case: [
+            os.path.join("system", "surfaceFeatureExtractDict"),
+            os.path.join("system", "surfaceFeatureExtractDictDefaults"),
+        ],
+    ),
+    Stage(
+        "fvFiles", "generate_fvFiles", stage_fvfiles,
+        [],
+        outputs=lambda case: [os.path.join("system", "fvSolution"), os.path.join("system", "fvSchemes")],
+    ),
+    Stage(
+        "bc", "generate_bc", stage_bc,
+        ["nturb", "vel", "p", "omega", "k", "nut"],
+        outputs=lambda case: [os.path.join("0", field) for field in ("U", "p", "omega", "k", "nut")],
+    ),
+    Stage(
+        "controldict", "generate_controldict", stage_controldict,
+        [],
+        outputs=lambda case: [os.path.join("system", "controlDict")],
+    ),
+]
+
+
+def _covers(output, path):
+    """True if path is the output or lies below it"""
+    return path == output or path.startswith(os.path.join(output, ""))
+
+
+def stage_dependencies(stages, case):
+    """Returns, per stage name, the names of the given stages that write a file it reads."""
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage.name] = {
+            other.name
+            for other in stages if other is not stage
+            for output in other.outputs(case)
+            for path in stage.inputs(case) if _covers(output, path)
+        }
+    return dependencies
+
+
+def _hash_file(digest, path, name):
+    """Feeds a file's name and contents into digest; a missing file hashes as missing"""
+    digest.update(name.encode())
+    if not os.path.isfile(path):
+        digest.update(b"\0missing")
+        return
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def _imported_names(path):
+    """The top-level module names a .py file imports, also inside functions"""
+    with open(path, "r") as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            yield from (alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            yield node.module.split(".")[0]
+
+
+def stage_modules(stage):
+    """Returns the .py files of a stage's folder and the repository modules they import, directly or not.
+
+    An import resolves to a file next to the importing one, at the
+    repository root, e.g. foam_writer.py, or in a stage folder, as
+    load_runner puts those on sys.path (turbine_layout reads the STL bounds
+    through prepare_geometry's stl_cache); the first one found counts.
+    """
+    search = [REPO_ROOT] + [os.path.join(REPO_ROOT, other.folder) for other in STAGES]
+    code_folder = os.path.join(REPO_ROOT, stage.folder)
+    pending = [os.path.join(code_folder, name) for name in sorted(os.listdir(code_folder)) if name.endswith(".py")]
+    found = set(pending)
+    while pending:
+        path = pending.pop()
+        for name in _imported_names(path):
+            for folder in [os.path.dirname(path)] + search:
+                module = os.path.join(folder, f"{name}.py")
+                if os.path.isfile(module):
+                    if module not in found:
+                        found.add(module)
+                        pending.append(module)
+                    break
+    return sorted(found)
+
+
+def stage_key(stage, case):
+    """Returns the sha256 of a stage's parameters, input files and generator code for a case.
+
+    The code is pipeline.py and the stage_modules of the stage, so editing a
+    shared module such as foam_writer.py rebuilds every stage using it.
+
+    Files are named relative to the case, so cases with the same parameters
+    and inputs get the same key wherever their output_folder is.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({key: case.get(key) for key in stage.parameters}, sort_keys=True).encode())
+    for path in stage.inputs(case):
+        _hash_file(digest, os.path.join(case["output_folder"], path), path)
+
+    _hash_file(digest, os.path.abspath(__file__), "pipeline.py")
+    for path in stage_modules(stage):
+        _hash_file(digest, path, os.path.relpath(path, REPO_ROOT))
+    return digest.hexdigest()
+
+
+def load_manifest(output_folder):
+    """Returns the stage keys recorded in a case folder, or {} if there are none."""
+    try:
+        with open(os.path.join(output_folder, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_folder, manifest):
+    """Writes the stage keys of a case folder, replacing the old manifest in one rename."""
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _run_stage(stage, case, manifest, store):
+    """Runs, links or skips one stage as described in run_stage; returns which it did"""
+    output_folder = case["output_folder"]
+    key = stage_key(stage, case) if manifest is not None or store is not None else None
+
+    if manifest is not None:
+        outputs = [os.path.join(output_folder, path) for path in stage.outputs(case)]
+        if manifest.get(stage.name) == key and all(os.path.exists(path) for path in outputs):
+            print(f"(I) {stage.name} up to date, skipped")
+            return "skipped"
+        # Forget the old key first, so a failed run is never taken as up to date
+        manifest.pop(stage.name, None)
+
+    if on_disk(output_folder):
+        clear_outputs(output_folder, stage.outputs(case))
+    if store is not None and store.materialize(key, output_folder):
+        print(f"(I) {stage.name} linked from store: {store.root}")
+        status = "linked"
+    else:
+        stage.run(case)
+        if store is not None:
+            store.ingest(key, output_folder, stage.outputs(case))
+        status = "ran"
+
+    if manifest is not None:
+        manifest[stage.name] = key
+    return status
+
+
+def run_stage(stage, case, manifest=None, store=None, profile=False):
+    """Runs one stage, or skips it when the manifest holds its current key and its outputs exist.
+
+    With an ArtifactStore the outputs of a key already stored are linked in
+    instead of generated, and newly generated outputs are added to the store.
+    Without a manifest or store the stage always runs.
+    Returns the stage's report record: status (ran, linked or skipped),
+    timings and peak RSS from instrumentation.measure, and the number and
+    size of the files it wrote. With profile, cProfile stats are saved to
+    <output_folder>/profile/<stage>.prof.
+    """
+    output_folder = case["output_folder"]
+    profile_file = os.path.join(output_folder, "profile", f"{stage.name}.prof") if profile else ""
+    status, metrics = measure(lambda: _run_stage(stage, case, manifest, store), profile_file)
+
+    sizes = output_sizes(output_folder, stage.outputs(case))
+    written = sum(sizes.values()) if status == "ran" else 0
+    return {"stage": stage.name, "status": status, **metrics, "files": len(sizes), "bytes_written": written}
+
+
+class StageOutput:
+    """Stands in for sys.stdout while stages run on threads.
+
+    What a stage prints is held until it finishes and then written in one
+    piece, so the messages of concurrent stages never interleave. Other
+    threads write through unchanged.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        held = getattr(self._local, "held", None)
+        if held is None:
+            with self._lock:
+                return self.stream.write(text)
+        held.append(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self._local, "held", None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def run(self, function, *args):
+        """Calls function(*args), holding what it prints until it returns or fails"""
+        self._local.held = []
+        try:
+            return function(*args)
+        finally:
+            held, self._local.held = self._local.held, None
+            with self._lock:
+                self.stream.write("".join(held))
+                self.stream.flush()
+
+
+def run_graph(stages, case, workers, manifest=None, store=None, profile=False, records=None):
+    """Runs stages on a thread pool, starting each as soon as the stages it reads from are done.
+
+    Stages are submitted in list order, so the long prepare_geometry starts
+    first. The first failure cancels the stages not yet started and is raised.
+    The report record of each finished stage is appended to records.
+    Each stage's messages are printed together when it finishes (see StageOutput).
+    """
+    records = [] if records is None else records
+    pending = stage_dependencies(stages, case)
+    waiting = list(stages)
+    running = {}
+
+    output = StageOutput(sys.stdout)
+    with contextlib.redirect_stdout(output), ThreadPoolExecutor(max_workers=workers) as pool:
+        while waiting or running:
+            for stage in [stage for stage in waiting if not pending[stage.name]]:
+                waiting.remove(stage)
+                running[pool.submit(output.run, run_stage, stage, case, manifest, store, profile)] = stage
+            if not running:
+                raise Exception(f"ERROR: dependency cycle between stages {[stage.name for stage in waiting]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    records.append(future.result())
+                except Exception as e:
+                    for other in running:
+                        other.cancel()
+                    raise Exception(f"ERROR: run_{stage.name} Failed") from e
+                for names in pending.values():
+                    names.discard(stage.name)
+    return records
+
+
+def run_pipeline(case, stages=None, workers=1, incremental=False, store="", profile=False, output=None):
+    """Runs the generator stages for one case inside this interpreter.
+
+    case is a dict of the runner_all.py parameters plus 'output_folder'.
+    stages restricts the run to the named stages, e.g. to skip
+    prepare_geometry when only the dictionaries change. Each runner.py is
+    imported once per process, so repeated cases cost no interpreter startup.
+    With workers > 1 independent stages run concurrently; see run_graph.
+    With incremental, stages whose parameters, input files and code are
+    unchanged since the last run into this output_folder are skipped; see
+    run_stage. store is the folder of an ArtifactStore shared with other
+    cases, "" for none.
+    output is a case_output backend, e.g. MemoryOutput or TarOutput, that
+    receives every file written under output_folder instead of the disk;
+    incremental runs and the store need the files on disk.
+    Every stage is measured, and the records go to pipeline_report.json and
+    .csv in the output_folder, also when a stage fails; with profile each
+    stage also leaves a cProfile dump in <output_folder>/profile, and the
+    stages run one at a time: only one profiler may be active per process
+    (Python 3.12+ raises otherwise), and it only sees its own thread anyway.
+    Returns the records.
+    """
+    case = normalize_case(case)
+    if profile and workers > 1:
+        print("(I) profiling runs the stages one at a time")
+        workers = 1
+    if output is not None and (incremental or store):
+        raise Exception("ERROR: incremental runs and the artifact store need the case written to disk")
+    if output is None:
+        os.makedirs(case["output_folder"], exist_ok=True)
+    selected = [stage for stage in STAGES if stages is None or stage.name in stages]
+    manifest = load_manifest(case["output_folder"]) if incremental else None
+    store = ArtifactStore(store) if store else None
+    records = []
+
+    with output_to(case["output_folder"], output) if output is not None else contextlib.nullcontext():
+        try:
+            if workers > 1:
+                run_graph(selected, case, workers, manifest, store, profile, records)
+            else:
+                for stage in selected:
+                    try:
+                        records.append(run_stage(stage, case, manifest, store, profile))
+                    except Exception as e:
+                        raise Exception(f"ERROR: run_{stage.name} Failed") from e
+        finally:
+            if manifest is not None:
+                save_manifest(case["output_folder"], manifest)
+            order = [stage.name for stage in selected]
+            records.sort(key=lambda record: order.index(record["stage"]))
+            report_file = write_report(case["output_folder"], records)
+            print(f"(I) pipeline report written to: {report_file}")
+    return records
@@ -1,54 +1,192 @@
 import os
-import shutil
+import sys
+import json
 import argparse
+from stl_io import write_stl, replicate
+from stl_cache import load_surface
+from stl_shared import write_copies_parallel
+from stl_decimate import cluster_decimate, is_closed
+from stl_fit import fit_primitive, translate_primitive
+from stl_features import extract_features, merge_features, write_emesh
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import write_blocks
+from case_output import on_disk
+from turbine_layout import TURBINE_STLS, turbine_positions
+
+
+# Surfaces that only mark refinement volumes or feature edges, never mesh patches
+REFINEMENT_ONLY_STLS = [
+    "AMI_Refinement",
+    "AMI_Refinement_Additional",
+    "BladeWakeRefinement",
+    "Features",
+    "HubRefinement",
+    "LeadingEdge",
+    "TipTrailingEdge",
+]
+
+# Surfaces read by surfaceFeatureExtract, which need their STL even when a primitive fits
+FEATURE_STLS = ["BladesAndHub", "AMI_Refinement_Additional", "Features", "HubRefinement"]
+
+# Refinement surfaces that may be replaced by a searchableBox/searchableCylinder: only those
+# a snappyHexMeshDict refinementRegion uses, as replacing any other would change nothing
+PRIMITIVE_CANDIDATES = ["BladeWakeRefinement"]
+
+# Finest snappyHexMeshDict level each refinement-only surface is used with
+REFINEMENT_LEVELS = {
+    "AMI_Refinement": 4,
+    "AMI_Refinement_Additional": 4,
+    "BladeWakeRefinement": 4,
+    "Features": 6,
+    "HubRefinement": 6,
+    "LeadingEdge": 5,
+    "TipTrailingEdge": 9,
+}
+
+
+def copy_stls(stl_folder, output_folder, nturb, dx, dy, diameter, stl_format="ascii", cache_dir=None, cache_size_mb=1024, jobs=1, compress_level=0, merge_refinement=False,
+              decimate_cell_size=0, decimate_fraction=0.5, fit_tolerance=0,
+              feature_angle=0, feature_min_elem=10, layout="line"):
+    """Copies and modifies STL files for multi-turbine setup.
+
+    A compress_level of 1-9 writes gzip-compressed .stl.gz files, which OpenFOAM reads directly.
+    With merge_refinement each refinement-only surface is written once, e.g.
+    LeadingEdge.stl, holding every turbine's copy as region LeadingEdge_<i>.
+    A decimate_cell_size > 0 (the background blockMesh cell size) simplifies the
+    refinement-only surfaces to decimate_fraction of the cell size at their level.
+    A fit_tolerance > 0 replaces candidate surfaces that fit a bounding box or
+    cylinder within that volume fraction by per-turbine primitives written to
+    searchablePrimitives.json in the case folder; see write_primitives.
+    A feature_angle > 0 writes the .eMesh files surfaceFeatureExtract would
+    produce with that includedAngle; see write_features.
+    The copies are placed by turbine_layout.turbine_positions with layout.
+    """
+    if merge_refinement and stl_format == "binary":
+        # Binary STL has no solid names: the regions would be patch<i>, not the <surface>_<i> snappyHexMeshDict refers to
+        raise Exception("ERROR: merge_refinement needs stl_format ascii, binary STL cannot name the per-turbine regions")
 
-def copy_stls(stl_folder, output_folder, nturb, dx, dy, diameter):
-    """Copies and modifies STL files for multi-turbine setup."""
     D = diameter
-    stl_files = [
-        "BladesAndHub.stl",
-        "AMI.stl",
-        "AMI_Refinement.stl",
-        "AMI_Refinement_Additional.stl",
-        "BladeWakeRefinement.stl",
-        "Features.stl",
-        "HubRefinement.stl",
-        "LeadingEdge.stl",
-        "TipTrailingEdge.stl",
-    ]
+    extension = ".stl.gz" if compress_level else ".stl"
 
+    case_folder = output_folder
     output_folder += 'constant/triSurface/'
-    os.makedirs(output_folder, exist_ok=True)
 
-    for i in range(nturb):
-        x_offset = (i % 2) * dx * D  # Alternate turbines in crosswind direction
-        y_offset = i * dy * D       # Spacing in downstream direction
+    # Parse every base surface once; each turbine copy is then a single offset add
+    surfaces = {}
+    for stl_file in TURBINE_STLS:
+        src_file = os.path.join(stl_folder, stl_file)
+        if not os.path.exists(src_file):
+            print(f"Warning: {stl_file} not found in {stl_folder}")
+            continue
+        surfaces[stl_file] = load_surface(src_file, cache_dir=cache_dir, max_bytes=cache_size_mb * 1024 ** 2)
+
+    # Every turbine copy sits at its hub position, as the dictionaries place it
+    offsets = turbine_positions(nturb, dx, dy, D, layout)
+
+    if fit_tolerance > 0:
+        fitted = write_primitives(surfaces, offsets, fit_tolerance, os.path.join(case_folder, "searchablePrimitives.json"))
+        for stem in fitted:
+            if stem not in FEATURE_STLS:
+                del surfaces[f"{stem}.stl"]
 
-        for stl_file in stl_files:
-            src_file = os.path.join(stl_folder, stl_file)
-            if not os.path.exists(src_file):
-                print(f"Warning: {stl_file} not found in {stl_folder}")
+    if decimate_cell_size > 0:
+        for stl_file, surface in surfaces.items():
+            stem = stl_file.split('.')[0]
+            # Feature surfaces keep their edges where surfaceFeatureExtract and snappy expect them
+            if stem not in REFINEMENT_LEVELS or stem in FEATURE_STLS:
                 continue
+            tolerance = decimate_fraction * decimate_cell_size / 2 ** REFINEMENT_LEVELS[stem]
+            decimated = cluster_decimate(surface, tolerance)
+            if is_closed(surface) and not is_closed(decimated):
+                print(f"Warning: decimating {stem} would open its closed surface, it is kept as it is")
+                continue
+            surfaces[stl_file] = decimated
+            print(f"    (II) {stem}: {surface.n_facets} -> {surfaces[stl_file].n_facets} facets (tolerance {tolerance:.2e}m)")
+
+    if feature_angle > 0:
+        write_features(surfaces, offsets, output_folder, feature_angle, feature_min_elem, merge_refinement)
+
+    sources = {}
+    tasks = []
+    for stl_file, surface in surfaces.items():
+        stem = stl_file.split('.')[0]
+        if merge_refinement and stem in REFINEMENT_ONLY_STLS:
+            sources[stem] = replicate(surface, offsets, [f"{stem}_{i}" for i in range(nturb)])
+            dest_file = os.path.join(output_folder, f"{stem}{extension}")
+            tasks.append((stem, (0.0, 0.0, 0.0), dest_file, stl_format, compress_level))
+            continue
 
-            dest_file = os.path.join(output_folder, f"{stl_file.split('.')[0]}_{i}.stl")
-
-            with open(src_file, "r") as infile, open(dest_file, "w") as outfile:
-                for line in infile:
-                    if "vertex" in line:
-                        parts = line.split()
-                        new_coords = [
-                            float(parts[1]) + x_offset,
-                            float(parts[2]) + y_offset,
-                            float(parts[3]),
-                        ]
-                        outfile.write(f"    vertex {' '.join(map(str, new_coords))}\n")
-                    else:
-                        outfile.write(line)
+        sources[stl_file] = surface
+        for i, offset in enumerate(offsets):
+            dest_file = os.path.join(output_folder, f"{stem}_{i}{extension}")
+            tasks.append((stl_file, offset, dest_file, stl_format, compress_level))
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(tasks))
+    if not on_disk(output_folder):
+        # Pool workers cannot reach an in-memory or archive output
+        jobs = 1
+
+    if jobs > 1:
+        write_copies_parallel(sources, tasks, jobs)
+    else:
+        for key, offset, dest_file, _, _ in tasks:
+            write_stl(sources[key].translated(offset), dest_file, stl_format=stl_format, compress_level=compress_level)
 
     print(f"(I) STL files copied and adjusted for {nturb} turbines in {output_folder}.")
 
 
+def write_primitives(surfaces, offsets, tolerance, output_file):
+    """Fits bounding primitives to the candidate surfaces and writes one translated copy per turbine as JSON.
+
+    The file maps each fitted surface name to a list of snappyHexMeshDict
+    searchable entries, one per turbine; generate_snappyhexmeshdict reads it
+    with --primitives. Returns the names of the fitted surfaces.
+    """
+    primitives = {}
+    for stem in PRIMITIVE_CANDIDATES:
+        surface = surfaces.get(f"{stem}.stl")
+        if surface is None:
+            continue
+        primitive = fit_primitive(surface, tolerance)
+        if primitive is None:
+            print(f"    (II) {stem}: no bounding box or cylinder within {tolerance:.0%}, keeping the STL")
+            continue
+        print(f"    (II) {stem}: fitted {primitive['type']} filling {primitive['fill']:.1%} of its volume")
+        primitives[stem] = [translate_primitive(primitive, offset) for offset in offsets]
+
+    write_blocks(output_file, [json.dumps(primitives, indent=4)])
+
+    print(f"(I) searchable primitives written to: {output_file}")
+    return list(primitives)
+
+
+def write_features(surfaces, offsets, output_folder, included_angle, min_elem, merge_refinement=False):
+    """Extracts the feature edges of each feature surface once and writes a translated .eMesh per turbine.
+
+    Replaces running surfaceFeatureExtract on every turbine copy. Merged
+    refinement surfaces get one .eMesh holding all turbines.
+    """
+    for stem in FEATURE_STLS:
+        surface = surfaces.get(f"{stem}.stl")
+        if surface is None:
+            continue
+        features = extract_features(surface, included_angle=included_angle, min_elem=min_elem)
+        copies = [features.translated(offset) for offset in offsets]
+
+        if merge_refinement and stem in REFINEMENT_ONLY_STLS:
+            write_emesh(merge_features(copies), os.path.join(output_folder, f"{stem}.eMesh"))
+        else:
+            for i, copy in enumerate(copies):
+                write_emesh(copy, os.path.join(output_folder, f"{stem}_{i}.eMesh"))
+
+        print(f"    (II) {stem}: {len(features.edges)} feature edges")
+
+    print(f"(I) feature edge meshes written to: {output_folder}")
+
+
 def get_options():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="Prepare geometry by copying STL files.")
@@ -58,6 +196,24 @@ def get_options():
     parser.add_argument("--dx", type=float, required=True, help="Downstream spacing as a multiple of turbine diameter.")
     parser.add_argument("--dy", type=float, required=True, help="Crosswind spacing as a multiple of turbine diameter.")
     parser.add_argument("--diameter", type=float, required=True, help="Turbine diameter (in meters).")
+    parser.add_argument("--stl_format", type=str, choices=["ascii", "binary"], default="ascii",
+                        help="Format of the written STL files. Binary STL drops solid names; regions are numbered instead.")
+    parser.add_argument("--cache_dir", type=str, default=".geometry_cache", help="Folder caching the parsed base STL arrays. Pass an empty string to disable.")
+    parser.add_argument("--cache_size_mb", type=int, default=1024, help="Size limit of the geometry cache in MB.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes writing turbine copies (0 uses all cores).")
+    parser.add_argument("--compress_level", type=int, choices=range(0, 10), default=0,
+                        help="gzip level for the written surfaces (1-9 writes .stl.gz, 0 writes plain .stl).")
+    parser.add_argument("--merge_refinement", action="store_true",
+                        help="Write each refinement-only surface as one file with a region per turbine instead of one file per turbine (ASCII STL only).")
+    parser.add_argument("--decimate_cell_size", type=float, default=0,
+                        help="Background mesh cell size in meters; if > 0 refinement-only surfaces are decimated relative to the cell size at their level.")
+    parser.add_argument("--decimate_fraction", type=float, default=0.5, help="Decimation tolerance as a fraction of the cell size at the surface's refinement level.")
+    parser.add_argument("--fit_tolerance", type=float, default=0,
+                        help="Replace refinement surfaces fitting a bounding box/cylinder within this volume fraction by searchable primitives (0 disables).")
+    parser.add_argument("--feature_angle", type=float, default=0,
+                        help="Write .eMesh feature edges with this includedAngle instead of running surfaceFeatureExtract (0 disables).")
+    parser.add_argument("--layout", type=str, choices=["line", "staggered"], default="line", help="Turbine layout, see turbine_layout.turbine_positions.")
+    parser.add_argument("--feature_min_elem", type=int, default=10, help="Drop feature edge segments with fewer edges (trimFeatures minElem).")
     return parser.parse_args()
 
 
@@ -70,6 +226,18 @@ def main():
         dx=args.dx,
         dy=args.dy,
         diameter=args.diameter,
+        stl_format=args.stl_format,
+        cache_dir=args.cache_dir,
+        cache_size_mb=args.cache_size_mb,
+        jobs=args.jobs,
+        compress_level=args.compress_level,
+        merge_refinement=args.merge_refinement,
+        decimate_cell_size=args.decimate_cell_size,
+        decimate_fraction=args.decimate_fraction,
+        fit_tolerance=args.fit_tolerance,
+        feature_angle=args.feature_angle,
+        feature_min_elem=args.feature_min_elem,
+        layout=args.layout,
     )
 
 
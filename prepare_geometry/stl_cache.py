@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from stl_io import Surface, read_stl
+
+
+# Bump when the on-disk layout or the parser output changes
+CACHE_VERSION = 1
+
+_ARRAYS = ("points", "facets", "normals")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Returns the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_size(entry):
+    """Returns the total size in bytes of the files in a cache entry"""
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def _load_entry(entry):
+    """Maps the arrays of a cache entry back into a Surface"""
+    arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+    with open(os.path.join(entry, "solids.json"), "r") as f:
+        solids = [tuple(solid) for solid in json.load(f)]
+    return Surface(arrays["points"], arrays["facets"], arrays["normals"], solids)
+
+
+def _store_entry(cache_dir, entry, surface):
+    """Writes a Surface into a temporary folder and renames it into place, so concurrent runs never see half an entry"""
+    tmp_entry = tempfile.mkdtemp(prefix=".tmp_", dir=cache_dir)
+    try:
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_entry, f"{name}.npy"), np.ascontiguousarray(getattr(surface, name)))
+        with open(os.path.join(tmp_entry, "solids.json"), "w") as f:
+            json.dump(surface.solids, f)
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # Another process stored the same entry first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+
+def evict(cache_dir, max_bytes):
+    """Removes least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if name.startswith(".tmp_") or not os.path.isdir(entry):
+            continue
+        try:
+            entries.append((os.path.getmtime(entry), _entry_size(entry), entry))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def load_surface(path, cache_dir=None, max_bytes=1 << 30):
+    """Reads an STL into a Surface through a content-addressed cache of parsed arrays.
+
+    Entries are keyed on the sha256 of the file, so an edited STL is parsed again
+    while unchanged ones are memory-mapped straight from the .npy files. Hits
+    refresh the entry's mtime, which orders the LRU eviction down to max_bytes.
+    """
+    if not cache_dir:
+        return read_stl(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, f"v{CACHE_VERSION}-{file_hash(path)}")
+
+    if os.path.isdir(entry):
+        try:
+            surface = _load_entry(entry)
+            os.utime(entry)
+            return surface
+        except (OSError, ValueError):
+            # Damaged entry: drop it and parse again
+            shutil.rmtree(entry, ignore_errors=True)
+
+    surface = read_stl(path)
+    _store_entry(cache_dir, entry, surface)
+    evict(cache_dir, max_bytes)
+    return surface
@@ -0,0 +1,69 @@
+import numpy as np
+from stl_io import Surface, facet_normals, solid_index
+
+
+def cluster_decimate(surface, tolerance):
+    """Simplifies a surface by merging all points that fall in the same cubic cell of size tolerance.
+
+    Every point moves by less than tolerance * sqrt(3). Facets that collapse
+    to an edge or a point, and facets duplicated by the merge, are removed.
+    Corner order is kept, so the surviving facets keep their orientation.
+    """
+    if surface.n_facets == 0 or tolerance <= 0:
+        return surface
+
+    points = np.asarray(surface.points)
+    keys = np.floor((points - points.min(axis=0)) / tolerance).astype(np.int64)
+    _, cluster, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.reshape(-1)
+
+    # Each cluster is represented by the mean of its points
+    merged = np.zeros((len(counts), 3), dtype=np.float64)
+    np.add.at(merged, cluster, points)
+    merged /= counts[:, np.newaxis]
+
+    facets = cluster[surface.facets]
+    keep = (facets[:, 0] != facets[:, 1]) & (facets[:, 1] != facets[:, 2]) & (facets[:, 0] != facets[:, 2])
+
+    # Facets that now share all three corners cancel pairwise when their
+    # orientations are opposite (a collapsed sliver), otherwise one is kept.
+    # Merged clusters can still pinch a closed surface into edges of more than
+    # two facets; see is_closed
+    order = np.argsort(facets, axis=1)
+    parity = (order[:, 0] > order[:, 1]).astype(np.int64) + (order[:, 0] > order[:, 2]) + (order[:, 1] > order[:, 2])
+    orientation = np.where(keep, 1 - 2 * (parity % 2), 0)
+    _, first, group = np.unique(np.sort(facets, axis=1), axis=0, return_index=True, return_inverse=True)
+    net = np.zeros(len(first), dtype=np.int64)
+    np.add.at(net, group.reshape(-1), orientation)
+    net = net[group.reshape(-1)]
+    survivor = np.zeros(len(facets), dtype=bool)
+    survivor[first] = True
+    keep &= survivor & (net != 0)
+
+    # The survivor takes the orientation of the group's majority
+    flip = keep & (orientation * net < 0)
+    facets[flip] = facets[flip][:, [0, 2, 1]]
+
+    facets = facets[keep]
+    solids_of_facets = solid_index(surface)[keep]
+
+    # Compact the point table to the points still in use
+    used, facets = np.unique(facets, return_inverse=True)
+    facets = facets.reshape(-1, 3).astype(np.int64)
+    merged = merged[used]
+
+    counts = np.bincount(solids_of_facets, minlength=len(surface.solids))
+    stops = np.cumsum(counts)
+    solids = [(name, int(stop - count), int(stop)) for (name, _, _), count, stop in zip(surface.solids, counts, stops)]
+
+    return Surface(merged, facets, facet_normals(merged, facets), solids)
+
+
+def is_closed(surface):
+    """Returns True when every edge of the surface is shared by exactly two facets."""
+    facets = np.asarray(surface.facets)
+    if len(facets) == 0:
+        return False
+    half_edges = np.sort(np.concatenate((facets[:, [0, 1]], facets[:, [1, 2]], facets[:, [2, 0]])), axis=1)
+    _, counts = np.unique(half_edges, axis=0, return_counts=True)
+    return bool(np.all(counts == 2))
@@ -0,0 +1,143 @@
+import os
+import sys
+import numpy as np
+from stl_io import facet_normals, solid_index
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import foam_header, write_blocks
+
+
+class FeatureEdges:
+    """Feature edges of a surface: the points they use and (n_edges, 2) indices into them."""
+
+    __slots__ = ("points", "edges")
+
+    def __init__(self, points, edges):
+        self.points = points
+        self.edges = edges
+
+    def translated(self, offset):
+        """Returns a copy moved by offset."""
+        return FeatureEdges(self.points + np.asarray(offset, dtype=np.float64), self.edges)
+
+
+def surface_edges(surface):
+    """Returns the unique edges of a surface and, per edge, the facets using it.
+
+    edges       -- (n_edges, 2) sorted point index pairs
+    edge_facets -- facet indices ordered by edge
+    offsets     -- edge_facets[offsets[e]:offsets[e + 1]] are the facets of edge e
+    """
+    facets = np.asarray(surface.facets)
+    half_edges = np.concatenate((facets[:, [0, 1]], facets[:, [1, 2]], facets[:, [2, 0]]))
+    half_edges.sort(axis=1)
+    owner = np.tile(np.arange(len(facets)), 3)
+
+    edges, edge_of_half, counts = np.unique(half_edges, axis=0, return_inverse=True, return_counts=True)
+    edge_of_half = edge_of_half.reshape(-1)
+    order = np.argsort(edge_of_half, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return edges, owner[order], offsets
+
+
+def find_feature_edges(surface, included_angle=150):
+    """Returns a boolean mask over surface_edges marking feature edges, as surfaceFeatureExtract does.
+
+    An edge is a feature when the normals of its two facets are further apart
+    than 180 - included_angle degrees, when its facets lie in different
+    regions, or when it does not have exactly two facets.
+    """
+    edges, edge_facets, offsets = surface_edges(surface)
+    counts = np.diff(offsets)
+    feature = counts != 2
+
+    manifold = np.flatnonzero(counts == 2)
+    first = edge_facets[offsets[manifold]]
+    second = edge_facets[offsets[manifold] + 1]
+
+    normals = facet_normals(np.asarray(surface.points), np.asarray(surface.facets))
+    min_cos = np.cos(np.radians(180.0 - included_angle))
+    sharp = np.einsum("ij,ij->i", normals[first], normals[second]) < min_cos
+
+    # Solids with the same name form one region, as in OpenFOAM's STL reader
+    names = [name for name, _, _ in surface.solids]
+    region_of_solid = np.array([names.index(name) for name in names], dtype=np.int64)
+    region = region_of_solid[solid_index(surface)]
+    region_change = region[first] != region[second]
+
+    feature[manifold] = sharp | region_change
+    return edges, feature
+
+
+def label_segments(edges):
+    """Labels feature-edge segments: chains of edges joined at points used by exactly two of them.
+
+    Returns one label per edge; edges of the same segment share the label.
+    """
+    n_edges = len(edges)
+    labels = np.arange(n_edges)
+    if n_edges == 0:
+        return labels
+
+    ends = edges.ravel()
+    degree = np.bincount(ends)
+
+    # Pair up the two edges meeting at each point of degree two
+    order = np.argsort(ends, kind="stable")
+    sorted_points = ends[order]
+    sorted_edges = order // 2
+    starts = np.flatnonzero(np.concatenate(([True], sorted_points[1:] != sorted_points[:-1])))
+    through = starts[degree[sorted_points[starts]] == 2]
+    a = sorted_edges[through]
+    b = sorted_edges[through + 1]
+
+    # Propagate the smallest label along each chain, with pointer jumping
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def extract_features(surface, included_angle=150, min_elem=10):
+    """Extracts the feature edges of a surface, trimming segments shorter than min_elem edges.
+
+    Mirrors surfaceFeatureExtract with extractFromSurface, includedAngle and
+    trimFeatures { minElem }.
+    """
+    edges, feature = find_feature_edges(surface, included_angle)
+    edges = edges[feature]
+
+    if min_elem > 0 and len(edges):
+        labels = label_segments(edges)
+        sizes = np.bincount(labels, minlength=len(edges))
+        edges = edges[sizes[labels] >= min_elem]
+
+    used, local = np.unique(edges, return_inverse=True)
+    return FeatureEdges(np.asarray(surface.points)[used], local.reshape(-1, 2))
+
+
+def merge_features(features):
+    """Returns one FeatureEdges holding all the given ones."""
+    shifts = np.cumsum([0] + [len(f.points) for f in features[:-1]])
+    points = np.concatenate([f.points for f in features])
+    edges = np.concatenate([f.edges + shift for f, shift in zip(features, shifts)])
+    return FeatureEdges(points, edges)
+
+
+def write_emesh(features, path):
+    """Writes FeatureEdges as an OpenFOAM featureEdgeMesh (.eMesh) file."""
+    name = path.replace("\\", "/").split("/")[-1]
+    point_lines = ("(%.9g %.9g %.9g)\n" * len(features.points)) % tuple(features.points.ravel().tolist())
+    edge_lines = ("(%d %d)\n" * len(features.edges)) % tuple(features.edges.ravel().tolist())
+
+    write_blocks(path, [
+        foam_header(name, "featureEdgeMesh", location="constant/triSurface") + "\n",
+        f"\n// points:\n\n{len(features.points)}\n(\n{point_lines})\n",
+        f"\n// edges:\n\n{len(features.edges)}\n(\n{edge_lines})\n",
+        "\n// ************************************************************************* //\n",
+    ])
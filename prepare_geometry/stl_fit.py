@@ -0,0 +1,77 @@
+import numpy as np
+from stl_decimate import is_closed
+
+
+def enclosed_volume(surface):
+    """Returns the volume enclosed by a closed, outward-oriented surface (divergence theorem)."""
+    triangles = surface.triangles()
+    return float(np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6.0)
+
+
+def bounding_primitives(surface):
+    """Returns the axis-aligned bounding box and the three axis-aligned bounding cylinders of a surface.
+
+    Each primitive is a dict in the form of a snappyHexMeshDict searchable
+    geometry entry plus its 'volume'.
+    """
+    points = np.asarray(surface.points)
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+
+    primitives = [{
+        "type": "searchableBox",
+        "min": lo.tolist(),
+        "max": hi.tolist(),
+        "volume": float(np.prod(hi - lo)),
+    }]
+
+    for axis in range(3):
+        others = [k for k in range(3) if k != axis]
+        centre = (lo + hi) / 2
+        radius = float(np.sqrt(((points[:, others] - centre[others]) ** 2).sum(axis=1)).max())
+        point1 = centre.copy()
+        point2 = centre.copy()
+        point1[axis] = lo[axis]
+        point2[axis] = hi[axis]
+        primitives.append({
+            "type": "searchableCylinder",
+            "point1": point1.tolist(),
+            "point2": point2.tolist(),
+            "radius": radius,
+            "volume": float(np.pi * radius ** 2 * (hi[axis] - lo[axis])),
+        })
+
+    return primitives
+
+
+def fit_primitive(surface, tolerance=0.05):
+    """Returns the tightest bounding box or cylinder of a closed surface, or None if none fits.
+
+    A primitive fits when it adds at most tolerance of its own volume to the
+    volume enclosed by the surface. The primitive always contains the surface,
+    so a 'mode inside' refinement region can only grow. An open surface
+    encloses no volume, whatever enclosed_volume sums over its facets, so
+    it gets None.
+    """
+    if not is_closed(surface):
+        return None
+    volume = enclosed_volume(surface)
+    if volume <= 0:
+        return None
+
+    best = min(bounding_primitives(surface), key=lambda primitive: primitive["volume"])
+    if volume / best["volume"] < 1 - tolerance:
+        return None
+
+    best["fill"] = volume / best["volume"]
+    return best
+
+
+def translate_primitive(primitive, offset):
+    """Returns a copy of a primitive moved by offset."""
+    offset = np.asarray(offset, dtype=np.float64)
+    moved = dict(primitive)
+    for key in ("min", "max", "point1", "point2"):
+        if key in moved:
+            moved[key] = (np.asarray(moved[key]) + offset).tolist()
+    return moved
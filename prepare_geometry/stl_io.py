@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import gzip
+import zlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from foam_writer import write_blocks
+
+
+_SOLID_RE = re.compile(r"^[ \t]*solid\b[ \t]*(.*?)[ \t]*$", re.M)
+_NORMAL_RE = re.compile(r"facet\s+normal\s+(\S+)\s+(\S+)\s+(\S+)")
+_VERTEX_RE = re.compile(r"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+# %r writes the shortest text that reads back as the exact float64, as the
+# str() of the line-by-line copy did
+_FACET_TEMPLATE = (
+    "  facet normal %r %r %r\n"
+    "    outer loop\n"
+    "      vertex %r %r %r\n"
+    "      vertex %r %r %r\n"
+    "      vertex %r %r %r\n"
+    "    endloop\n"
+    "  endfacet\n"
+)
+
+# One 50-byte binary STL facet record: normal, three corners, attribute word
+STL_BINARY_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attribute", "<u2"),
+])
+_BINARY_HEADER_SIZE = 80
+
+
+class Surface:
+    """Triangulated surface held as contiguous point, facet and normal arrays.
+
+    points  -- (n_points, 3) float64 unique vertex coordinates
+    facets  -- (n_facets, 3) int64 indices into points
+    normals -- (n_facets, 3) float64 facet normals
+    solids  -- list of (name, start, stop) facet ranges, one per STL solid
+    """
+
+    __slots__ = ("points", "facets", "normals", "solids")
+
+    def __init__(self, points, facets, normals, solids):
+        self.points = points
+        self.facets = facets
+        self.normals = normals
+        self.solids = solids
+
+    @property
+    def n_facets(self):
+        return len(self.facets)
+
+    def triangles(self):
+        """Returns the (n_facets, 3, 3) array of triangle corner coordinates."""
+        return self.points[self.facets]
+
+    def translated(self, offset):
+        """Returns a copy moved by offset; only the point array is touched."""
+        return Surface(self.points + np.asarray(offset, dtype=np.float64), self.facets, self.normals, self.solids)
+
+
+def facet_normals(points, facets):
+    """Returns the unit normals of the facets, following their corner order."""
+    a, b, c = points[facets[:, 0]], points[facets[:, 1]], points[facets[:, 2]]
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def solid_index(surface):
+    """Returns the index of the solid each facet belongs to."""
+    index = np.empty(surface.n_facets, dtype=np.int64)
+    for k, (_, start, stop) in enumerate(surface.solids):
+        index[start:stop] = k
+    return index
+
+
+def replicate(surface, offsets, names):
+    """Returns one Surface holding a translated copy of surface per offset.
+
+    Every solid of copy k is named names[k], so each copy is its own region.
+    """
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+    n_copies = len(offsets)
+    n_points = len(surface.points)
+
+    points = (surface.points[np.newaxis] + offsets[:, np.newaxis]).reshape(-1, 3)
+    shifts = n_points * np.arange(n_copies, dtype=np.int64)
+    facets = (surface.facets[np.newaxis] + shifts[:, np.newaxis, np.newaxis]).reshape(-1, 3)
+    normals = np.tile(surface.normals, (n_copies, 1))
+
+    solids = []
+    for k in range(n_copies):
+        base = k * surface.n_facets
+        solids.extend((names[k], base + start, base + stop) for _, start, stop in surface.solids)
+
+    return Surface(points, facets, normals, solids)
+
+
+def _to_array(matches):
+    """Converts a list of 3-tuples of number strings to an (n, 3) float64 array"""
+    if not matches:
+        return np.empty((0, 3), dtype=np.float64)
+    return np.array(matches, dtype=np.float64)
+
+
+def open_stl(path, mode="rb", compress_level=6):
+    """Opens an STL file, going through gzip when the name ends in .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=compress_level)
+    return open(path, mode)
+
+
+def _read_bytes(path):
+    """Returns the (decompressed) contents of an STL file"""
+    with open_stl(path, "rb") as f:
+        return f.read()
+
+
+def _is_binary(data):
+    """Returns True if the data length matches the facet count of a binary STL header"""
+    if len(data) < _BINARY_HEADER_SIZE + 4:
+        return False
+    n_facets = int(np.frombuffer(data, dtype="<u4", count=1, offset=_BINARY_HEADER_SIZE)[0])
+    return len(data) == _BINARY_HEADER_SIZE + 4 + n_facets * STL_BINARY_DTYPE.itemsize
+
+
+def _merge_points(normals, corners, solids):
+    """Builds a Surface from per-facet normals and (3 * n_facets, 3) corner coordinates"""
+    points, inverse = np.unique(corners, axis=0, return_inverse=True)
+    facets = inverse.reshape(-1, 3).astype(np.int64)
+    return Surface(points, facets, normals, solids)
+
+
+def _parse_ascii(text, path):
+    """Parses ASCII STL text holding one or more solids"""
+    headers = list(_SOLID_RE.finditer(text))
+    if not headers:
+        raise ValueError(f"{path} does not look like an ASCII STL file (no 'solid' line found)")
+
+    normals = []
+    corners = []
+    solids = []
+    start = 0
+    for k, header in enumerate(headers):
+        block_end = headers[k + 1].start() if k + 1 < len(headers) else len(text)
+        block = text[header.end():block_end]
+
+        block_normals = _to_array(_NORMAL_RE.findall(block))
+        block_corners = _to_array(_VERTEX_RE.findall(block))
+        if len(block_corners) != 3 * len(block_normals):
+            raise ValueError(f"{path}: solid '{header.group(1)}' has {len(block_normals)} facets "
+                             f"but {len(block_corners)} vertices")
+
+        normals.append(block_normals)
+        corners.append(block_corners)
+        solids.append((header.group(1), start, start + len(block_normals)))
+        start += len(block_normals)
+
+    # Merge the corners shared between facets into one point table
+    return _merge_points(np.concatenate(normals), np.concatenate(corners), solids)
+
+
+def _parse_binary(data):
+    """Parses binary STL data; runs of equal attribute words become solids named patch<attribute>"""
+    records = np.frombuffer(data, dtype=STL_BINARY_DTYPE, offset=_BINARY_HEADER_SIZE + 4)
+
+    normals = records["normal"].astype(np.float64)
+    corners = records["vertices"].astype(np.float64).reshape(-1, 3)
+
+    attributes = records["attribute"]
+    breaks = np.flatnonzero(np.diff(attributes)) + 1
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(records)]))
+    solids = [(f"patch{attributes[start]}", int(start), int(stop)) for start, stop in zip(starts, stops) if stop > start]
+    if not solids:
+        solids = [("patch0", 0, 0)]
+
+    return _merge_points(normals, corners, solids)
+
+
+def read_ascii_stl(path):
+    """Parses an ASCII STL (possibly holding several solids) into a Surface."""
+    return _parse_ascii(_read_bytes(path).decode("ascii", "replace"), path)
+
+
+def is_binary_stl(path):
+    """Returns True if the file size matches the facet count of a binary STL header."""
+    return _is_binary(_read_bytes(path))
+
+
+def read_binary_stl(path):
+    """Parses a binary STL into a Surface.
+
+    Binary STL has no solid names, so consecutive runs of the attribute word
+    become solids named patch<attribute>, as written by write_binary_stl.
+    """
+    return _parse_binary(_read_bytes(path))
+
+
+def read_stl(path):
+    """Reads an ASCII or binary STL file, optionally gzip-compressed, into a Surface."""
+    data = _read_bytes(path)
+    if _is_binary(data):
+        return _parse_binary(data)
+    return _parse_ascii(data.decode("ascii", "replace"), path)
+
+
+def _gzip_blocks(blocks, compress_level):
+    """Compresses byte blocks into one gzip stream as they come"""
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _write_stl_blocks(blocks, path, compress_level):
+    """Writes byte blocks to an STL path through the case's output backend, gzip-compressed for .gz"""
+    if path.endswith(".gz"):
+        blocks = _gzip_blocks(blocks, compress_level)
+    write_blocks(path, blocks, binary=True)
+
+
+def _ascii_stl_blocks(surface):
+    """Yields the ASCII STL of a Surface one solid at a time"""
+    triangles = surface.triangles().reshape(-1, 9)
+    records = np.hstack((surface.normals, triangles))
+    for name, start, stop in surface.solids:
+        text = f"solid {name}\n"
+        n = stop - start
+        if n:
+            text += (_FACET_TEMPLATE * n) % tuple(records[start:stop].ravel().tolist())
+        text += f"endsolid {name}\n"
+        yield text.encode("ascii", "replace")
+
+
+def write_ascii_stl(surface, path, compress_level=6):
+    """Writes a Surface as ASCII STL, formatting all facets of a solid in one pass."""
+    _write_stl_blocks(_ascii_stl_blocks(surface), path, compress_level)
+
+
+def write_binary_stl(surface, path, compress_level=6):
+    """Writes a Surface as binary STL, storing the solid index in each facet's attribute word."""
+    records = np.zeros(surface.n_facets, dtype=STL_BINARY_DTYPE)
+    records["normal"] = surface.normals
+    records["vertices"] = surface.triangles()
+    for index, (_, start, stop) in enumerate(surface.solids):
+        records["attribute"][start:stop] = index
+
+    # The header must not start with 'solid' or ASCII readers will claim the file
+    header = f"binary STL {', '.join(name for name, _, _ in surface.solids)}".encode("ascii", "replace")
+    header = header[:_BINARY_HEADER_SIZE].ljust(_BINARY_HEADER_SIZE, b" ")
+    blocks = [header, np.uint32(surface.n_facets).astype("<u4").tobytes(), records.tobytes()]
+    _write_stl_blocks(blocks, path, compress_level)
+
+
+def write_stl(surface, path, stl_format="ascii", compress_level=6):
+    """Writes a Surface to an STL file in 'ascii' or 'binary' format.
+
+    Paths ending in .gz are gzip-compressed at compress_level.
+    """
+    if stl_format == "binary":
+        write_binary_stl(surface, path, compress_level)
+    elif stl_format == "ascii":
+        write_ascii_stl(surface, path, compress_level)
+    else:
+        raise ValueError(f"Unknown STL format '{stl_format}', expected 'ascii' or 'binary'")
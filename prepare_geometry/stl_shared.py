@@ -0,0 +1,100 @@
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from stl_io import Surface, write_stl
+
+
+_ARRAYS = ("points", "facets", "normals")
+
+# The pool's workers are started by a fork server (or spawned), never forked from
+# this process: the pipeline runs this stage on a thread while other threads may
+# hold the import or stdio locks, and a forked child would inherit them held
+_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Shared base surfaces attached by each pool worker in _init_worker
+_worker_blocks = None
+_worker_surfaces = None
+
+
+def share_surfaces(surfaces):
+    """Copies the arrays of each Surface into shared memory blocks.
+
+    Returns the list of SharedMemory blocks, which the caller must close and
+    unlink when done, and a picklable description of the surfaces that
+    attach_surfaces turns back into Surface views in a worker process.
+    """
+    blocks = []
+    descriptors = {}
+    try:
+        for key, surface in surfaces.items():
+            arrays = {}
+            for name in _ARRAYS:
+                array = np.ascontiguousarray(getattr(surface, name))
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                arrays[name] = (block.name, array.shape, array.dtype.str)
+            descriptors[key] = (arrays, surface.solids)
+    except BaseException:
+        release_surfaces(blocks)
+        raise
+    return blocks, descriptors
+
+
+def attach_surfaces(descriptors):
+    """Maps shared Surface arrays described by share_surfaces without copying.
+
+    Returns the attached SharedMemory blocks, which must stay referenced while
+    the surfaces are in use, and a dict of read-only Surface views.
+    """
+    blocks = []
+    surfaces = {}
+    for key, (arrays, solids) in descriptors.items():
+        views = {}
+        for name, (block_name, shape, dtype) in arrays.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            view.flags.writeable = False
+            views[name] = view
+        surfaces[key] = Surface(views["points"], views["facets"], views["normals"], solids)
+    return blocks, surfaces
+
+
+def release_surfaces(blocks):
+    """Closes and unlinks the shared memory blocks created by share_surfaces."""
+    for block in blocks:
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker(descriptors):
+    """Attaches the shared base surfaces once per worker process"""
+    global _worker_blocks, _worker_surfaces
+    _worker_blocks, _worker_surfaces = attach_surfaces(descriptors)
+
+
+def _write_copy(task):
+    """Translates one base surface and writes it; runs inside a pool worker"""
+    key, offset, dest_file, stl_format, compress_level = task
+    write_stl(_worker_surfaces[key].translated(offset), dest_file, stl_format=stl_format, compress_level=compress_level)
+
+
+def write_copies_parallel(surfaces, tasks, jobs):
+    """Runs (surface key, offset, destination, format, compress level) tasks on a process pool.
+
+    The base arrays are placed in shared memory once, so workers map them
+    instead of receiving a pickled copy with every task.
+    """
+    blocks, descriptors = share_surfaces(surfaces)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=_CONTEXT, initializer=_init_worker, initargs=(descriptors,)) as pool:
+            chunksize = max(1, len(tasks) // (4 * jobs))
+            for _ in pool.map(_write_copy, tasks, chunksize=chunksize):
+                pass
+    finally:
+        release_surfaces(blocks)
@@ -1,10 +1,113 @@
 import subprocess
+import argparse
 import os
+import sys
+import contextlib
+from pipeline import run_pipeline, stl_ext, primitives_file
+from case_output import TarOutput
+from mesh_estimate import estimate_case, print_estimate, fit_case, fit_subdomains
+
+
+def default_case():
+    """Returns the case parameters runner_all.py generates, which sweep.py varies."""
+    nturb = 2
+    dx = 0
+    dy = 6.5
+    diameter = 1.46
+    max_cells = 135
+    max_level = 0  # cap on the snappyHexMesh refinement levels, 0 keeps them
+    cell_budget = 0  # total cells to fit max_cells (and max_level if needed) to, 0 uses max_cells as it is
+    cores = 0  # with cell_budget 0, fit max_cells to cells_per_core cells on each of this many cores instead
+    cells_per_core = 50000
+    layout = "line"  # "line" steps every turbine dx across, "staggered" alternates it between 0 and dx
+    domain_margins = None  # clearance around the turbines in diameters by side, None keeps turbine_layout.DOMAIN_MARGINS
+    core_margin = 0  # diameters of uniform cells around the turbines and wakes before the background grades out, 0 keeps one uniform block
+    n_subdomains = 570  # solver ranks
+    mesh_subdomains = 0  # snappyHexMesh ranks, 0 for n_subdomains
+    node_cores = 0  # cores per node to choose both counts from the estimated mesh as multiples of, 0 keeps them as they are
+    mesh_cells_per_core = 200000  # cells per meshing rank the chosen mesh_subdomains aims at; n_subdomains aims at cells_per_core
+    rps = 13.3
+    vel = 1.94
+    p = 0
+    omega = 0.1
+    k = 0.06
+    nut = 0
+    stl_format = "ascii"
+    jobs = os.cpu_count() or 1
+    compress_level = 0
+    merge_refinement = False
+    decimate_cell_size = 0  # background cell size in m, 0 keeps the refinement surfaces as they are
+    fit_tolerance = 0  # volume fraction a searchable primitive may add to a refinement surface, 0 keeps the STLs
+    feature_angle = 0  # includedAngle for writing .eMesh files directly, 0 leaves it to surfaceFeatureExtract
+
+    return dict(
+        output_folder="runfolder", nturb=nturb, dx=dx, dy=dy, diameter=diameter, max_cells=max_cells, core_margin=core_margin,
+        layout=layout, domain_margins=domain_margins,
+        max_level=max_level, cell_budget=cell_budget, cores=cores, cells_per_core=cells_per_core,
+        n_subdomains=n_subdomains, mesh_subdomains=mesh_subdomains, node_cores=node_cores, mesh_cells_per_core=mesh_cells_per_core, rps=rps, vel=vel, p=p, omega=omega, k=k, nut=nut,
+        stl_format=stl_format, jobs=jobs, compress_level=compress_level, merge_refinement=merge_refinement,
+        decimate_cell_size=decimate_cell_size, fit_tolerance=fit_tolerance, feature_angle=feature_angle,
+    )
+
+
+def get_options():
+    """Parse and return command-line options."""
+    parser = argparse.ArgumentParser(description="Generate the OpenFOAM run folder of the wind farm case.")
+    parser.add_argument("--profile", action="store_true", help="Save a cProfile dump per stage in runfolder/profile.")
+    parser.add_argument("--archive", type=str, default="",
+                        help="Stream the case into this .tar, .tar.gz, .tar.xz or .tar.zst archive ('-' for stdout) instead of writing runfolder.")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Print the estimated cell count, memory per rank and recommended core count before generating.")
+    return parser.parse_args()
 
 
 def main():
-    # Set paths
+    args = get_options()
+    isolate = False  # run every generator in its own python subprocess instead of in-process
+    workers = 4  # in-process stages running concurrently once their inputs exist, 1 runs them in order
+    incremental = True  # skip stages whose parameters and inputs are unchanged since the last run
 
+    with contextlib.redirect_stdout(sys.stderr) if args.archive == "-" else contextlib.nullcontext():
+        case = fit_subdomains(fit_case(default_case()))
+        if args.estimate:
+            print_estimate(estimate_case(case))
+
+    if args.archive:
+        run_archived(case, args.archive, workers=workers, profile=args.profile)
+        return
+
+    # Ensure runfolder exists
+    os.makedirs(case["output_folder"], exist_ok=True)
+
+    if isolate:
+        run_isolated(case)
+    else:
+        run_pipeline(case, workers=workers, incremental=incremental, profile=args.profile)
+
+
+def run_archived(case, archive, workers=1, profile=False):
+    """Generates the case straight into a tar archive, nothing written under output_folder.
+
+    The members are stored under the output_folder's name. With archive "-"
+    the tar stream goes to stdout and the progress messages to stderr.
+    """
+    target = sys.stdout.buffer if archive == "-" else archive
+    prefix = os.path.basename(os.path.normpath(case["output_folder"]))
+    output = TarOutput(target, prefix=prefix, compression=TarOutput.compression_of(archive))
+    try:
+        with contextlib.redirect_stdout(sys.stderr) if archive == "-" else contextlib.nullcontext():
+            run_pipeline(case, workers=workers, profile=profile, output=output)
+    finally:
+        output.close()
+    if archive != "-":
+        print(f"(I) case archive written to: {archive}")
+
+
+def run_isolated(case):
+    """
+    Runs every generator script in its own python subprocess, as a fallback when the
+    in-process pipeline must not share an interpreter with the generators.
+    """
     prepare_geometryScript = os.path.join(os.path.dirname(__file__), "prepare_geometry/runner.py")
     if not os.path.exists(prepare_geometryScript):
         raise FileNotFoundError(f"Script {prepare_geometryScript} not found. Ensure it exists in the same directory.")
@@ -17,13 +120,13 @@ def main():
     if not os.path.exists(generate_decomposepardictScript):
         raise FileNotFoundError(f"Script {generate_decomposepardictScript} not found. Ensure it exists in the same directory.")
 
-    generate_snappyHexMeshDictScript = os.path.join(os.path.dirname(__file__), "generate_snappyHexMeshDict/runner.py")
+    generate_snappyHexMeshDictScript = os.path.join(os.path.dirname(__file__), "generate_snappyhexmeshdict/runner.py")
     if not os.path.exists(generate_snappyHexMeshDictScript):
         raise FileNotFoundError(f"Script {generate_snappyHexMeshDictScript} not found. Ensure it exists in the same directory.")
 
     generate_dynamicmeshdictScript = os.path.join(os.path.dirname(__file__), "generate_dynamicmeshdict/runner.py")
     if not os.path.exists(generate_dynamicmeshdictScript):
-        raise FileNotFoundError(f"Script {generate_snappyHexMeshDictScript} not found. Ensure it exists in the same directory.")
+        raise FileNotFoundError(f"Script {generate_dynamicmeshdictScript} not found. Ensure it exists in the same directory.")
 
     generate_turbPropScript = os.path.join(os.path.dirname(__file__), "generate_turbulence_properties/runner.py")
     if not os.path.exists(generate_turbPropScript):
@@ -53,50 +156,33 @@ def main():
     if not os.path.exists(generate_controldict_script):
         raise FileNotFoundError(f"Script {generate_controldict_script} not found. Ensure it exists in the same directory.")
 
-
-    # Ensure runfolder exists
-    os.makedirs("runfolder", exist_ok=True)
-
-    nturb = 2
-    dx = 0
-    dy = 6.5
-    diameter = 1.46
-    max_cells = 135
-    n_subdomains = 570
-    rps = 13.3
-    vel = 1.94
-    p = 0
-    omega = 0.1
-    k = 0.06
-    nut = 0
-
     # running prepare geometry
     try:
-        run_preparing_geometry(geometry_script=prepare_geometryScript, nturb=nturb, dx=dx, dy=dy, diameter=diameter)
+        run_preparing_geometry(geometry_script=prepare_geometryScript, nturb=case["nturb"], dx=case["dx"], dy=case["dy"], diameter=case["diameter"], stl_format=case["stl_format"], jobs=case["jobs"], compress_level=case["compress_level"], merge_refinement=case["merge_refinement"], decimate_cell_size=case["decimate_cell_size"], fit_tolerance=case["fit_tolerance"], feature_angle=case["feature_angle"], layout=case["layout"])
     except:
         raise Exception("ERROR: run_prepare_geometry Failed")
 
     # running blockmeshdict
     try:
-        run_blockMeshDict_generator(blockmesh_script=generate_blockmeshdictScript, nturb=nturb, dx=dx, dy=dy, diameter=diameter, max_cells=max_cells)
+        run_blockMeshDict_generator(blockmesh_script=generate_blockmeshdictScript, nturb=case["nturb"], dx=case["dx"], dy=case["dy"], diameter=case["diameter"], max_cells=case["max_cells"], core_margin=case["core_margin"], layout=case["layout"], margins=case["domain_margins"])
     except:
         raise Exception("ERROR: run_blockmeshdict Failed")
 
     # running decomposepardict
     try:
-        run_decomposePar_generator(decomposePar_script=generate_decomposepardictScript, n_subdomains=n_subdomains)
+        run_decomposePar_generator(decomposePar_script=generate_decomposepardictScript, n_subdomains=case["n_subdomains"], mesh_subdomains=case["mesh_subdomains"])
     except:
         raise Exception("ERROR: run_decomposepardict Failed")
 
     # running snappyhexmeshdict
     try:
-        run_snappyHexMeshDict_generator(snappyhex_path=generate_snappyHexMeshDictScript, nturb=nturb, dx=dx, dy=dy, diameter=diameter)
+        run_snappyHexMeshDict_generator(snappyhex_path=generate_snappyHexMeshDictScript, nturb=case["nturb"], dx=case["dx"], dy=case["dy"], diameter=case["diameter"], stl_ext=stl_ext(case), merge_refinement=case["merge_refinement"], primitives_file=primitives_file(case), max_level=case["max_level"], layout=case["layout"])
     except:
         raise Exception("ERROR: run_snappyhexmesh Failed")
 
     # running dynamicMeshDict
     try:
-        run_dynamicmeshdict_generator(dynamicmesh_path=generate_dynamicmeshdictScript, nturb=nturb, dx=dx, dy=dy, rps=rps, diameter=diameter)
+        run_dynamicmeshdict_generator(dynamicmesh_path=generate_dynamicmeshdictScript, nturb=case["nturb"], dx=case["dx"], dy=case["dy"], rps=case["rps"], diameter=case["diameter"], layout=case["layout"])
     except:
         raise Exception("ERROR: run_dynamicmeshdict Failed")
 
@@ -114,15 +200,16 @@ def main():
 
     # running createPatch
     try:
-        run_createpatch_generator(createpatch_path=generate_createpatchScript, nturb=nturb)
+        run_createpatch_generator(createpatch_path=generate_createpatchScript, nturb=case["nturb"])
     except:
         raise Exception("ERROR: run_createpatch Failed")
 
-    # running surfaceFeatureExtract
-    try:
-        run_surf_feat_ext_generator(surf_feat_ext_path=generate_surf_feat_ext_script, nturb=nturb)
-    except:
-        raise Exception("ERROR: run_surf_feat_ext Failed")
+    # running surfaceFeatureExtract, unless prepare_geometry already wrote the .eMesh files
+    if not case["feature_angle"]:
+        try:
+            run_surf_feat_ext_generator(surf_feat_ext_path=generate_surf_feat_ext_script, nturb=case["nturb"], stl_ext=stl_ext(case), merge_refinement=case["merge_refinement"])
+        except:
+            raise Exception("ERROR: run_surf_feat_ext Failed")
 
     # running fvFiles
     try:
@@ -132,7 +219,7 @@ def main():
 
     # running bc
     try:
-        run_bc_generator(bc_path=generate_bc_script, nturb=nturb, vel=vel, p=p, omega=omega, k=k, nut=nut)
+        run_bc_generator(bc_path=generate_bc_script, nturb=case["nturb"], vel=case["vel"], p=case["p"], omega=case["omega"], k=case["k"], nut=case["nut"])
     except:
         raise Exception("ERROR: run_bc Failed")
 
@@ -143,8 +230,7 @@ def main():
         raise Exception("ERROR: run_controldict Failed")
 
 
-
-def run_dynamicmeshdict_generator(dynamicmesh_path, nturb, dx, dy, rps, diameter):
+def run_dynamicmeshdict_generator(dynamicmesh_path, nturb, dx, dy, rps, diameter, layout="line"):
     """
     Runs the dynamicMeshDict generator script.
     """
@@ -155,7 +241,8 @@ def run_dynamicmeshdict_generator(dynamicmesh_path, nturb, dx, dy, rps, diameter
             "--dx", str(dx),
             "--dy", str(dy),
             "--rps", str(rps),
-            "--diameter", str(diameter)
+            "--diameter", str(diameter),
+            "--layout", layout
 
         ])
 
@@ -166,17 +253,19 @@ def run_dynamicmeshdict_generator(dynamicmesh_path, nturb, dx, dy, rps, diameter
         raise
 
 
-def run_decomposePar_generator(decomposePar_script, n_subdomains):
+def run_decomposePar_generator(decomposePar_script, n_subdomains, mesh_subdomains=0):
     """
     Runs the decomposeParDict generator script.
 
     Args:
-        n_subdomains (int): Number of processors.
+        n_subdomains (int): Number of processors for solving.
+        mesh_subdomains (int): Number of processors for meshing, 0 for n_subdomains.
     """
     try:
         subprocess.run([
             "python", decomposePar_script,
-            "--n_subdomains", str(n_subdomains)
+            "--n_subdomains", str(n_subdomains),
+            "--mesh_subdomains", str(mesh_subdomains)
 
         ])
 
@@ -187,7 +276,7 @@ def run_decomposePar_generator(decomposePar_script, n_subdomains):
         raise
 
 
-def run_preparing_geometry(geometry_script, nturb, dx, dy, diameter):
+def run_preparing_geometry(geometry_script, nturb, dx, dy, diameter, stl_format="ascii", jobs=1, compress_level=0, merge_refinement=False, decimate_cell_size=0, fit_tolerance=0, feature_angle=0, layout="line"):
     """
     Runs the prepare_geometry script.
 
@@ -196,15 +285,31 @@ def run_preparing_geometry(geometry_script, nturb, dx, dy, diameter):
         dx (float): Downstream spacing as a multiple of turbine diameter.
         dy (float): Crosswind spacing as a multiple of turbine diameter.
         diameter (float): Turbine diameter (in meters).
+        stl_format (str): Format of the written STL files, "ascii" or "binary".
+        jobs (int): Number of worker processes writing turbine copies.
+        compress_level (int): gzip level for the surfaces, 0 writes uncompressed STL.
+        merge_refinement (bool): Write each refinement-only surface as one file with a region per turbine.
+        decimate_cell_size (float): Background cell size used to decimate refinement-only surfaces, 0 disables it.
+        fit_tolerance (float): Volume tolerance for replacing refinement surfaces by searchable primitives, 0 disables it.
+        feature_angle (float): includedAngle for writing .eMesh feature edges directly, 0 disables it.
+        layout (str): Turbine layout, "line" or "staggered".
     """
+    flags = ["--merge_refinement"] if merge_refinement else []
     try:
         subprocess.run([
             "python", geometry_script,
             "--nturb", str(nturb),
             "--dx", str(dx),
             "--dy", str(dy),
-            "--diameter", str(diameter)
-
+            "--diameter", str(diameter),
+            "--stl_format", stl_format,
+            "--jobs", str(jobs),
+            "--compress_level", str(compress_level),
+            "--decimate_cell_size", str(decimate_cell_size),
+            "--fit_tolerance", str(fit_tolerance),
+            "--feature_angle", str(feature_angle),
+            "--layout", layout,
+            *flags
         ])
         check=True
     except subprocess.CalledProcessError as e:
@@ -212,7 +317,7 @@ def run_preparing_geometry(geometry_script, nturb, dx, dy, diameter):
         raise
 
 
-def run_blockMeshDict_generator(blockmesh_script, nturb, dx, dy, diameter, max_cells):
+def run_blockMeshDict_generator(blockmesh_script, nturb, dx, dy, diameter, max_cells, core_margin=0, layout="line", margins=None):
     """
     Runs the blockMeshDict generator script.
 
@@ -222,7 +327,11 @@ def run_blockMeshDict_generator(blockmesh_script, nturb, dx, dy, diameter, max_c
         dy (float): Crosswind spacing as a multiple of turbine diameter.
         diameter (float): Turbine diameter (in meters).
         max_cells (int): Maximum number of cells in the largest dimension.
+        core_margin (float): Diameters of uniform cells around the turbines before grading out, 0 writes one uniform block.
+        layout (str): Turbine layout, "line" or "staggered".
+        margins (dict): Domain clearance in diameters by side (upwind, downwind, lateral, vertical), None for the defaults.
     """
+    flags = [option for side, margin in (margins or {}).items() for option in (f"--{side}_margin", str(margin))]
     try:
         subprocess.run(
             [
@@ -231,7 +340,10 @@ def run_blockMeshDict_generator(blockmesh_script, nturb, dx, dy, diameter, max_c
                 "--dx", str(dx),
                 "--dy", str(dy),
                 "--diameter", str(diameter),
-                "--max_cells", str(max_cells)
+                "--max_cells", str(max_cells),
+                "--core_margin", str(core_margin),
+                "--layout", layout,
+                *flags
             ])
 
         check=True
@@ -241,7 +353,8 @@ def run_blockMeshDict_generator(blockmesh_script, nturb, dx, dy, diameter, max_c
         raise
 
 
-def run_snappyHexMeshDict_generator(snappyhex_path, nturb, dx, dy, diameter):
+def run_snappyHexMeshDict_generator(snappyhex_path, nturb, dx, dy, diameter, stl_ext=".stl", merge_refinement=False, primitives_file="", max_level=0,
+                                    layout="line"):
     """
     Runs the snappyHexMeshDict generator script.
 
@@ -250,8 +363,14 @@ def run_snappyHexMeshDict_generator(snappyhex_path, nturb, dx, dy, diameter):
         dx (float): Downstream spacing as a multiple of turbine diameter.
         diameter (float): Turbine diameter (in meters).
         output_folder (str): Folder to save the snappyHexMeshDict.
+        stl_ext (str): Extension of the turbine surfaces, ".stl" or ".stl.gz".
+        merge_refinement (bool): Refinement-only surfaces hold one region per turbine.
+        primitives_file (str): searchablePrimitives.json replacing fitted refinement surfaces, "" for none.
+        max_level (int): Cap on the refinement levels, 0 keeps them.
+        layout (str): Turbine layout, "line" or "staggered".
     """
-
+    flags = ["--merge_refinement"] if merge_refinement else []
+    flags += ["--primitives", primitives_file] if primitives_file else []
     try:
         subprocess.run(
             [
@@ -259,7 +378,11 @@ def run_snappyHexMeshDict_generator(snappyhex_path, nturb, dx, dy, diameter):
                 "--nturb", str(nturb),
                 "--dx", str(dx),
                 "--dy", str(dy),
-                "--diameter", str(diameter)
+                "--diameter", str(diameter),
+                "--stl_ext", stl_ext,
+                "--max_level", str(max_level),
+                "--layout", layout,
+                *flags
             ],
             check=True
         )
@@ -321,16 +444,18 @@ def run_createpatch_generator(createpatch_path, nturb):
         raise
 
 
-def run_surf_feat_ext_generator(surf_feat_ext_path, nturb):
+def run_surf_feat_ext_generator(surf_feat_ext_path, nturb, stl_ext=".stl", merge_refinement=False):
     """
     Runs the surfaceFeatureExtractDict generator script.
     """
-
+    flags = ["--merge_refinement"] if merge_refinement else []
     try:
         subprocess.run(
             [
                 "python", surf_feat_ext_path,
-                "--nturb", str(nturb)
+                "--nturb", str(nturb),
+                "--stl_ext", stl_ext,
+                *flags
             ],
             check=True
         )
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pipeline import run_pipeline
+from runner_all import default_case
+from mesh_estimate import fit_case, fit_subdomains
+
+
+INDEX_NAME = "index.json"
+
+
+def get_options():
+    """Parse and return command-line options."""
+    parser = argparse.ArgumentParser(description="Generate a batch of cases, one folder each, on a process pool.")
+    parser.add_argument("--set", type=str, action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="Sweep a parameter over comma-separated values; several --set options form a grid.")
+    parser.add_argument("--grid", type=str, default="", help="JSON file mapping parameter names to lists of values, swept as a grid.")
+    parser.add_argument("--cases", type=str, default="", help="JSON file with a list of cases, each a dict of parameters overriding the defaults.")
+    parser.add_argument("--output_root", type=str, default="sweep", help="Folder receiving one case_<n> folder per case and the index.")
+    parser.add_argument("--jobs", type=int, default=0, help="Number of cases generated at once (0 uses every CPU).")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Folder of the object store whose files the cases hard-link (default <output_root>/.store, \"\" disables).")
+    parser.add_argument("--profile", action="store_true", help="Save a cProfile dump per stage in each case's profile folder.")
+    parser.add_argument("--stl_folder", type=str, default="Geometry", help="Path to folder containing the base STL files.")
+    return parser.parse_args()
+
+
+def parse_value(text):
+    """Reads a command-line value as JSON (numbers, true/false), falling back to the plain string"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def expand_grid(grid):
+    """Returns one dict per combination of a {parameter: [values]} grid, last parameter varying fastest."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def collect_cases(args):
+    """Returns the list of parameter overrides given by --cases, --grid and --set."""
+    cases = []
+    if args.cases:
+        with open(args.cases, "r") as f:
+            cases += json.load(f)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, "r") as f:
+            grid.update(json.load(f))
+    for item in args.set:
+        name, _, values = item.partition("=")
+        grid[name] = [parse_value(value) for value in values.split(",")]
+    if grid:
+        cases += expand_grid(grid)
+
+    return cases
+
+
+def generate_case(case, log_file, store="", profile=False):
+    """Generates one case into its folder, writing the generators' output to log_file; runs inside a pool worker.
+
+    Returns (status, seconds, error message).
+    """
+    start = time.perf_counter()
+    os.makedirs(case["output_folder"], exist_ok=True)
+    with open(log_file, "w") as log, contextlib.redirect_stdout(log):
+        try:
+            run_pipeline(fit_subdomains(fit_case(case)), incremental=True, store=store, profile=profile)
+        except Exception as e:
+            traceback.print_exc(file=log)
+            return "failed", time.perf_counter() - start, str(e)
+    return "done", time.perf_counter() - start, ""
+
+
+def write_index(output_root, entries):
+    """Writes the sweep index, replacing the previous one in one rename."""
+    path = os.path.join(output_root, INDEX_NAME)
+    with open(path + f".{os.getpid()}.tmp", "w") as f:
+        json.dump(entries, f, indent=1)
+    os.replace(path + f".{os.getpid()}.tmp", path)
+    return path
+
+
+def run_sweep(overrides, output_root, jobs=0, base_case=None, store=None, profile=False):
+    """Generates each case of overrides into output_root/case_<n> on a process pool and writes the index.
+
+    Each case is base_case (runner_all.default_case() if None) updated with its
+    overrides. Cases run incrementally, so re-running a sweep only rebuilds
+    what changed. Each case folder gets its generate.log, and index.json
+    records every case's folder, parameters, status and time.
+    Identical stage outputs are stored once in the store folder
+    (<output_root>/.store if None, "" disables it) and hard-linked into each
+    case, so disk use and write time grow with the distinct geometries, not
+    with the cases; see artifact_store.ArtifactStore. Each case folder also
+    gets the pipeline_report of its stages.
+    Returns the index entries.
+    """
+    base_case = default_case() if base_case is None else base_case
+    store = os.path.join(output_root, ".store") if store is None else store
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    os.makedirs(output_root, exist_ok=True)
+
+    known = set(base_case) | {"stl_folder", "cache_dir"}
+    unknown = sorted({name for override in overrides for name in override} - known)
+    if unknown:
+        raise Exception(f"ERROR: unknown case parameters {unknown}")
+
+    entries = []
+    cases = []
+    for n, override in enumerate(overrides):
+        name = f"case_{n:05d}"
+        # Each case is one worker, so prepare_geometry writes its copies serially
+        case = dict(base_case, jobs=1)
+        case.update(override)
+        case["output_folder"] = os.path.join(output_root, name)
+        entries.append({"name": name, "folder": case["output_folder"], "overrides": override, "parameters": case})
+        cases.append(case)
+
+    with ProcessPoolExecutor(max_workers=min(jobs, max(len(cases), 1))) as pool:
+        futures = {
+            pool.submit(generate_case, case, os.path.join(case["output_folder"], "generate.log"), store, profile): entry
+            for case, entry in zip(cases, entries)
+        }
+        for future in as_completed(futures):
+            entry = futures[future]
+            entry["status"], entry["seconds"], entry["error"] = future.result()
+            print(f"    (II) {entry['name']} {entry['status']} in {entry['seconds']:.2f}s {entry['overrides']}")
+
+    index_file = write_index(output_root, entries)
+    failed = [entry["name"] for entry in entries if entry["status"] != "done"]
+    print(f"(I) {len(entries) - len(failed)} of {len(entries)} cases generated, index at: {index_file}")
+    if failed:
+        raise Exception(f"ERROR: cases {failed} failed, see their generate.log")
+    return entries
+
+
+def main():
+    args = get_options()
+    overrides = collect_cases(args)
+    if not overrides:
+        sys.exit("No cases given: use --set, --grid or --cases")
+
+    base_case = default_case()
+    base_case["stl_folder"] = os.path.abspath(args.stl_folder)
+    run_sweep(overrides, args.output_root, jobs=args.jobs, base_case=base_case, store=args.store, profile=args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import contextlib
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import STAGES, load_runner, normalize_case, run_pipeline
+from foam_writer import Dimensions, FoamDict, NonUniform, format_value, serialize, write_foam_file
+from foam_parser import case_files, diff, lookup, parse, patch_text, read_foam_text, to_plain
+
+
+def make_case(output_folder, nturb):
+    """Returns the runner_all.py parameters of a dictionaries-only case."""
+    return normalize_case(dict(
+        output_folder=output_folder, nturb=nturb, dx=0, dy=6.5, diameter=1.46, max_cells=135,
+        n_subdomains=570, rps=13.3, vel=1.94, p=0, omega=0.1, k=0.06, nut=0,
+        stl_format="ascii", jobs=1, compress_level=0, merge_refinement=False,
+        decimate_cell_size=0, fit_tolerance=0, feature_angle=0,
+    ))
+
+
+@pytest.fixture(scope="module", params=[1, 3])
+def case(request, tmp_path_factory):
+    """A generated case without geometry, as (folder, nturb)"""
+    folder = str(tmp_path_factory.mktemp(f"case_{request.param}"))
+    stages = [stage.name for stage in STAGES if stage.name != "prepare_geometry"]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run_pipeline(make_case(folder, request.param), stages=stages)
+    return folder, request.param
+
+
+def test_generated_files_round_trip(case):
+    folder, _ = case
+    for name in case_files(folder):
+        tree = parse(read_foam_text(os.path.join(folder, name)))
+        assert to_plain(parse("".join(serialize(tree)))) == to_plain(tree), name
+
+
+def test_patch_changes_only_the_value(case):
+    folder, _ = case
+    for name in case_files(folder):
+        text = read_foam_text(os.path.join(folder, name))
+        tree, spans = parse(text, spans=True)
+        for key, value in tree.entries:
+            if isinstance(value, FoamDict) or key.startswith("#") or (key,) not in spans:
+                continue
+            start, end = spans[(key,)]
+            patched = patch_text(text, {key: "PATCHED"})
+            assert patched[:start] == text[:start], f"{name}: {key}"
+            assert patched[start + len("PATCHED"):] == text[end:], f"{name}: {key}"
+            assert lookup(parse(patched), key) == "PATCHED", f"{name}: {key}"
+
+
+def test_fields_parse_back_to_their_objects(case):
+    folder, nturb = case
+    bc = load_runner("generate_bc")
+    fields = {"U": bc.generate_U_field(nturb, 1.94), "p": bc.generate_p_field(nturb, 0.0),
+              "k": bc.generate_k_field(nturb, 0.06), "omega": bc.generate_omega_field(nturb, 0.1),
+              "nut": bc.generate_nut_field(nturb, 0.0)}
+    for name, field in fields.items():
+        parsed = parse(read_foam_text(os.path.join(folder, "0", name)))
+        body = FoamDict([entry for entry in parsed.entries if entry[0] != "FoamFile"])
+        assert to_plain(body) == to_plain(field), name
+
+
+@pytest.mark.parametrize("file_format, tolerance", [("ascii", 1e-8), ("binary", 0)])
+def test_nonuniform_round_trip(tmp_path, file_format, tolerance):
+    values = np.random.default_rng(0).random((1000, 3))
+    path = str(tmp_path / "U")
+    write_foam_file(path, "U", FoamDict([("dimensions", Dimensions([0, 1, -1, 0, 0, 0, 0])), ("internalField", NonUniform(values))],
+                                        key_width=16), "volVectorField", file_format, "0")
+    tree = parse(read_foam_text(path))
+    parsed = lookup(tree, "internalField").values
+    assert parsed.shape == values.shape
+    assert np.abs(parsed - values).max() <= tolerance
+    assert format_value(lookup(tree, "dimensions")) == "[0 1 -1 0 0 0 0]"
+
+
+def test_diff_pairs_repeated_keys_in_order():
+    a = parse('#include "common"\n#include "turbines"\nendTime 10;\n')
+    b = parse('#include "common"\n#include "farm"\nendTime 10;\n')
+    assert diff(a, b) == [("#include[1]", '"turbines"', '"farm"')]
+
+
+def test_diff_reports_a_removed_repeat():
+    a = parse('#include "common"\n#include "turbines"\n')
+    b = parse('#include "common"\n')
+    assert diff(a, b) == [("#include[1]", '"turbines"', None)]
+
+
+def test_diff_of_nested_dictionaries():
+    a = parse("boundaryField\n{\n    inlet\n    {\n        type fixedValue;\n    }\n}\n")
+    b = parse("boundaryField\n{\n    inlet\n    {\n        type zeroGradient;\n    }\n}\n")
+    assert diff(a, a) == []
+    assert diff(a, b) == [("boundaryField/inlet/type", "fixedValue", "zeroGradient")]
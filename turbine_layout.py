@@ -0,0 +1,96 @@
+import os
+import sys
+import numpy as np
+
+# geometry_bounds reads the STLs with prepare_geometry's stl_cache
+PREPARE_GEOMETRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prepare_geometry")
+if PREPARE_GEOMETRY not in sys.path:
+    sys.path.insert(0, PREPARE_GEOMETRY)
+
+# Turb_WakeRefinement cylinder behind each rotor, in turbine diameters
+WAKE_LENGTH = 6.5
+WAKE_DIAMETER = 1.2
+
+# Clearance between the turbines' geometry and the domain boundaries, in turbine diameters;
+# around the wake cylinder alone they give the 2.5 D wide, 5 D upwind and 10 D downwind domain
+DOMAIN_MARGINS = dict(upwind=5.0, downwind=3.5, lateral=1.9, vertical=1.9)
+
+# Base STL files placed at every turbine
+TURBINE_STLS = [
+    "BladesAndHub.stl",
+    "AMI.stl",
+    "AMI_Refinement.stl",
+    "AMI_Refinement_Additional.stl",
+    "BladeWakeRefinement.stl",
+    "Features.stl",
+    "HubRefinement.stl",
+    "LeadingEdge.stl",
+    "TipTrailingEdge.stl",
+]
+
+
+def turbine_positions(nturb, dx, dy, diameter, layout="line"):
+    """Returns the (x, y, z) hub position of every turbine, the one table all generators place turbines by.
+
+    Turbine i stands i * dy diameters downstream (y). With layout "line" it is
+    also i * dx diameters across (x); "staggered" alternates it between 0 and
+    dx diameters across.
+    """
+    if layout not in ("line", "staggered"):
+        raise Exception(f"ERROR: unknown turbine layout {layout}, expected line or staggered")
+    D = diameter
+    positions = []
+    for i in range(nturb):
+        x = (i % 2 if layout == "staggered" else i) * dx * D
+        positions.append((x, i * dy * D, 0.0))
+    return positions
+
+
+def geometry_bounds(diameter, stl_folder="", cache_dir=None):
+    """Returns the lo, hi corners of one turbine's geometry at the origin: its STLs and its wake refinement cylinder.
+
+    Only the STLs found in stl_folder count; without any the box is the wake cylinder's.
+    """
+    radius = WAKE_DIAMETER * diameter / 2
+    lo = np.array([-radius, 0.0, -radius])
+    hi = np.array([radius, WAKE_LENGTH * diameter, radius])
+
+    if stl_folder:
+        from stl_cache import load_surface
+        for stl_file in TURBINE_STLS:
+            path = os.path.join(stl_folder, stl_file)
+            if os.path.exists(path):
+                points = np.asarray(load_surface(path, cache_dir=cache_dir).points)
+                lo = np.minimum(lo, points.min(axis=0))
+                hi = np.maximum(hi, points.max(axis=0))
+    return lo, hi
+
+
+def domain_bounds(positions, geometry_lo, geometry_hi, diameter, margins=None):
+    """Returns the lo, hi corners of the domain: every turbine's geometry box plus the margins.
+
+    margins, in diameters, override DOMAIN_MARGINS by name; the flow enters at
+    lo in y (upwind) and leaves at hi (downwind).
+    The corners are rounded outwards to the millimetre.
+    """
+    margins = dict(DOMAIN_MARGINS, **(margins or {}))
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    lo = positions.min(axis=0) + geometry_lo
+    hi = positions.max(axis=0) + geometry_hi
+    clearance_lo = diameter * np.array([margins["lateral"], margins["upwind"], margins["vertical"]])
+    clearance_hi = diameter * np.array([margins["lateral"], margins["downwind"], margins["vertical"]])
+    # Rounded to 1e-6 mm first, so float noise does not push a corner out by a whole millimetre
+    lo = np.floor(np.round((lo - clearance_lo) * 1000, 6)) / 1000
+    hi = np.ceil(np.round((hi + clearance_hi) * 1000, 6)) / 1000
+    return lo, hi
+
+
+def farm_domain(nturb, dx, dy, diameter, layout="line", stl_folder="", cache_dir=None, margins=None):
+    """Returns a farm's turbine positions and domain corners as a dict of positions, lo, hi and diameter.
+
+    geometry_lo and geometry_hi hold the box of one turbine's geometry at the origin (see geometry_bounds).
+    """
+    positions = turbine_positions(nturb, dx, dy, diameter, layout)
+    geometry_lo, geometry_hi = geometry_bounds(diameter, stl_folder, cache_dir)
+    lo, hi = domain_bounds(positions, geometry_lo, geometry_hi, diameter, margins)
+    return dict(positions=positions, lo=lo, hi=hi, diameter=diameter, geometry_lo=geometry_lo, geometry_hi=geometry_hi)